@@ -0,0 +1,76 @@
+"""
+Append only file write throughput with appendfsync always and startup replay time
+
+Compares a write and fsync per command with the group commit of the commands
+executed in one event loop iteration, and the replay straight to the handlers
+with the replay through the RESP parser and the client command path
+
+    python benchmarks/aof.py [number of commands] [commands per event loop iteration]
+"""
+import os
+import sys
+import time
+import tempfile
+
+from rediserver import resp
+from rediserver.config import Config
+from rediserver.queue import CommandQueue
+from rediserver.redis import Redis
+from rediserver.server import execute_command
+
+
+def open_log(path, name):
+    config = Config(dir=path, appendonly=True, appendfsync='always', appendfilename=name)
+    # an empty file instead of a snapshot preamble, so that the parser can replay it
+    open(os.path.join(path, name), 'wb').close()
+    redis = Redis(config)
+    redis.start_aof()
+    return redis
+
+
+def write(redis, count, batch):
+    start = time.perf_counter()
+    for index in range(0, count, batch):
+        for offset in range(index, min(index + batch, count)):
+            redis.execute_single(b'SET', b'key:%d' % (offset % 1000), b'value:%d' % offset)
+        redis.aof.flush()
+    return time.perf_counter() - start
+
+
+def replay_through_parser(redis, path):
+    parser = resp.RequestParser()
+    transaction = CommandQueue(redis)
+    with open(path, 'rb') as fileobj:
+        parser.feed(fileobj.read())
+    for command, *args in parser.get_commands(sys.maxsize):
+        execute_command(transaction, command, args)
+
+
+def main(count=20000, batch=50):
+    with tempfile.TemporaryDirectory() as path:
+        redis = open_log(path, 'single.aof')
+        single = write(redis, count, 1)
+        redis.shutdown()
+
+        redis = open_log(path, 'group.aof')
+        group = write(redis, count, batch)
+        redis.shutdown()
+
+        aof_path = os.path.join(path, 'group.aof')
+        start = time.perf_counter()
+        replay_through_parser(Redis(), aof_path)
+        parsed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        Redis().load_aof(aof_path)
+        direct = time.perf_counter() - start
+
+    print('{} SET commands, appendfsync always'.format(count))
+    print('fsync per command          {:>10.0f} ops/s'.format(count / single))
+    print('group commit of {:<4}       {:>10.0f} ops/s'.format(batch, count / group))
+    print('replay through parser      {:>10.2f} s'.format(parsed))
+    print('replay to handlers         {:>10.2f} s'.format(direct))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,49 @@
+"""
+Fan-out reads and writes of many keys, a command per key compared with MGET/MSET
+
+    python benchmarks/batch.py [number of keys] [rounds]
+"""
+import sys
+import time
+
+import redis as redis_client
+
+from rediserver.test import local_redis
+
+
+def measure(func, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func()
+    return (time.perf_counter() - start) / rounds * 1000
+
+
+def main(count=100, rounds=200):
+    keys = ['key:{}'.format(index) for index in range(count)]
+    mapping = {key: 'value' for key in keys}
+
+    with local_redis() as redis:
+        client = redis_client.StrictRedis(unix_socket_path=redis.sock)
+
+        def single_sets():
+            for key in keys:
+                client.set(key, 'value')
+
+        def single_gets():
+            for key in keys:
+                client.get(key)
+
+        results = [
+            ('SET per key', measure(single_sets, rounds)),
+            ('MSET', measure(lambda: client.mset(mapping), rounds)),
+            ('GET per key', measure(single_gets, rounds)),
+            ('MGET', measure(lambda: client.mget(keys), rounds)),
+        ]
+
+    print('{} keys'.format(count))
+    for name, elapsed in results:
+        print('{:<12} {:>8.3f} ms'.format(name, elapsed))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,74 @@
+"""
+Job queue workers waiting for jobs, SPOP polling compared with BLPOP
+
+A producer pushes a job every interval to workers which either poll the queue with SPOP
+in a loop or block on it with BLPOP. Reports the CPU time used by the server and the
+workers (they share the process) and the latency from push to pickup
+
+    python benchmarks/blocking.py [workers] [jobs] [interval ms]
+"""
+import sys
+import time
+import threading
+
+import redis as redis_client
+
+from rediserver.test import local_redis
+
+
+def poll(client, pickups):
+    while True:
+        job = client.spop('jobs')
+        if job is None:
+            continue
+        if job == b'stop':
+            return
+        pickups.append(time.perf_counter() - float(job))
+
+
+def block(client, pickups):
+    while True:
+        _, job = client.blpop(['jobs'])
+        if job == b'stop':
+            return
+        pickups.append(time.perf_counter() - float(job))
+
+
+def measure(worker, push, workers, jobs, interval):
+    with local_redis() as redis:
+        client = redis_client.StrictRedis(unix_socket_path=redis.sock)
+        pickups = []
+        threads = [
+            threading.Thread(target=worker, args=(redis_client.StrictRedis(unix_socket_path=redis.sock), pickups))
+            for _ in range(workers)
+        ]
+        for thread in threads:
+            thread.start()
+
+        start = time.process_time()
+        for _ in range(jobs):
+            time.sleep(interval)
+            push(client, repr(time.perf_counter()))
+        while len(pickups) < jobs:
+            time.sleep(interval)
+        cpu = time.process_time() - start
+
+        for _ in threads:
+            push(client, 'stop')
+        for thread in threads:
+            thread.join()
+    return cpu, sum(pickups) / len(pickups) * 1000
+
+
+def main(workers=4, jobs=200, interval=10):
+    interval /= 1000
+    polling = measure(poll, lambda client, job: client.sadd('jobs', job), workers, jobs, interval)
+    blocking = measure(block, lambda client, job: client.rpush('jobs', job), workers, jobs, interval)
+
+    print('{} workers, {} jobs pushed every {:.0f} ms'.format(workers, jobs, interval * 1000))
+    print('SPOP polling  {:>6.2f} s CPU {:>8.3f} ms pickup latency'.format(*polling))
+    print('BLPOP         {:>6.2f} s CPU {:>8.3f} ms pickup latency'.format(*blocking))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
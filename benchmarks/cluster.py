@@ -0,0 +1,93 @@
+"""
+Write throughput of a single server process compared with a cluster of worker processes
+
+Every client process pipelines SET commands of keys owned by one node, the cluster
+scales with the number of cores, a single server is capped by one
+
+    python benchmarks/cluster.py [workers] [commands per client]
+"""
+import os
+import sys
+import time
+import multiprocessing
+
+import redis as redis_client
+
+from rediserver.cluster import key_hash_slot
+from rediserver.server import run_tcp, start_cluster, cluster_nodes
+from rediserver.test.server import free_ports, wait_for_port
+
+HOST = '127.0.0.1'
+PIPELINE = 100
+
+
+def node_keys(first, last, count):
+    keys = []
+    index = 0
+    while len(keys) < count:
+        key = b'key:%d' % index
+        if first <= key_hash_slot(key) <= last:
+            keys.append(key)
+        index += 1
+    return keys
+
+
+def client(port, keys, barrier):
+    connection = redis_client.StrictRedis(host=HOST, port=port)
+    barrier.wait()
+    for start in range(0, len(keys), PIPELINE):
+        with connection.pipeline(transaction=False) as pipe:
+            for key in keys[start:start + PIPELINE]:
+                pipe.set(key, b'value')
+            pipe.execute()
+
+
+def measure(ports, workers, count):
+    nodes = cluster_nodes(HOST, ports)
+    barrier = multiprocessing.Barrier(workers + 1)
+    clients = []
+    for index in range(workers):
+        _, port, first, last = nodes[index % len(nodes)]
+        keys = node_keys(first, last, count)
+        process = multiprocessing.Process(target=client, args=(port, keys, barrier))
+        process.start()
+        clients.append(process)
+
+    barrier.wait()
+    start = time.perf_counter()
+    for process in clients:
+        process.join()
+    return workers * count / (time.perf_counter() - start)
+
+
+def main(workers=None, count=20000):
+    workers = workers or os.cpu_count()
+
+    port, = free_ports(1)
+    server = multiprocessing.Process(target=run_tcp, args=(HOST, port), daemon=True)
+    server.start()
+    wait_for_port(HOST, port, server)
+    try:
+        single_rate = measure([port], workers, count)
+    finally:
+        server.terminate()
+        server.join()
+
+    ports = free_ports(workers)
+    processes = start_cluster(HOST, ports)
+    try:
+        for port, process in zip(ports, processes):
+            wait_for_port(HOST, port, process)
+        cluster_rate = measure(ports, workers, count)
+    finally:
+        for process in processes:
+            process.terminate()
+            process.join()
+
+    print('{} clients, {} cores'.format(workers, os.cpu_count()))
+    print('single server      {:>10.0f} ops/s'.format(single_rate))
+    print('cluster of {:<3}     {:>10.0f} ops/s'.format(workers, cluster_rate))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
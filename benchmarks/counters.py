@@ -0,0 +1,51 @@
+"""
+Counter throughput of INCRBY
+
+Compares counters stored as int with counters parsed from and encoded back to bytes
+on every call (kept here as a reference implementation)
+
+    python benchmarks/counters.py [number of commands] [number of counters]
+"""
+import sys
+import time
+
+from rediserver import resp
+from rediserver.redis import Redis, redis_command, MUTABLE_KEY, KEY_STRING
+
+
+class LegacyRedis(Redis):
+    @redis_command('INCRBY')
+    def execute_incrby(self, key: (MUTABLE_KEY, KEY_STRING), value):
+        try:
+            initial = int(self.keys.get(key, 0))
+            value = int(value)
+        except ValueError:
+            raise resp.Errors.NOT_INT
+
+        result = initial + value
+        self.keys[key] = str(result).encode()
+        return result
+
+
+def measure(redis, count, counters, handler=False):
+    # the handler alone, or with the dispatch checks of every command
+    incrby = redis.execute_incrby if handler else redis.lookup_command(b'INCRBY')
+    keys = [b'counter:%d' % index for index in range(counters)]
+    start = time.perf_counter()
+    for index in range(count):
+        incrby(keys[index % counters], b'1')
+    return count / (time.perf_counter() - start)
+
+
+def main(count=1000000, counters=1000):
+    print('{} INCRBY commands over {} counters'.format(count, counters))
+    for handler in (False, True):
+        legacy = measure(LegacyRedis(), count, counters, handler)
+        native = measure(Redis(), count, counters, handler)
+        name = 'handler' if handler else 'dispatch'
+        print('{:<8} bytes round trip {:>10.0f} ops/s'.format(name, legacy))
+        print('{:<8} int encoded      {:>10.0f} ops/s'.format(name, native))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
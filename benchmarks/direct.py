@@ -0,0 +1,45 @@
+"""
+Commands of a test through redis-py, over the unix socket of a local_redis server compared
+with the in process DirectRedis client
+
+    python benchmarks/direct.py [number of commands]
+"""
+import sys
+import time
+
+import redis as redis_client
+
+from rediserver.test import local_redis, DirectRedis
+
+
+def measure(client, count):
+    start = time.perf_counter()
+    for index in range(count):
+        key = 'key:%d' % (index % 100)
+        client.set(key, index)
+        client.get(key)
+    single = 2 * count / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for index in range(0, count, 100):
+        with client.pipeline() as pipeline:
+            for offset in range(100):
+                pipeline.incr('counter:%d' % offset)
+            pipeline.execute()
+    pipelined = count / (time.perf_counter() - start)
+    return single, pipelined
+
+
+def main(count=20000):
+    with local_redis() as redis:
+        socket_results = measure(redis_client.StrictRedis(unix_socket_path=redis.sock), count)
+    direct_results = measure(DirectRedis(), count)
+
+    print('{} commands'.format(count))
+    print('                  {:>12} {:>12}'.format('SET/GET', 'MULTI/EXEC'))
+    print('local_redis socket {:>10.0f}/s {:>10.0f}/s'.format(*socket_results))
+    print('DirectRedis        {:>10.0f}/s {:>10.0f}/s'.format(*direct_results))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
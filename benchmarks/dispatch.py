@@ -0,0 +1,87 @@
+"""
+Per-command dispatch overhead of the hot string commands
+
+Compares the raw handler call with the compiled dispatch and with the
+previous per-call wrapper (kept here as a reference implementation)
+
+    python benchmarks/dispatch.py
+"""
+import inspect
+import timeit
+
+from rediserver.redis import Redis, MUTABLE_KEY, KeyType
+
+
+def legacy_redis_command(command):
+    def wrapper(func):
+        info = inspect.getfullargspec(func)
+
+        mutable_keys = []
+        key_types = {}
+        for arg, annotation in info.annotations.items():
+            if not isinstance(annotation, tuple):
+                annotation = (annotation,)
+
+            for prop in annotation:
+                if prop is MUTABLE_KEY:
+                    mutable_keys.append(arg)
+                if isinstance(prop, KeyType):
+                    key_types[arg] = prop.type_
+
+        def new_func(self, *args, **kwargs):
+            values = {}
+            values.update(kwargs)
+            for index, arg_value in enumerate(args, start=1):
+                if index >= len(info.args):
+                    break
+                values[info.args[index]] = arg_value
+
+            for key in mutable_keys:
+                self.on_change(values[key])
+
+            for key, key_type in key_types.items():
+                self.assert_key_type(values[key], key_type)
+
+            return func(self, *args, **kwargs)
+
+        return new_func
+    return wrapper
+
+
+def legacy_execute_map(redis):
+    execute_map = {}
+    for name, spec in redis.command_specs.items():
+        execute_map[name.decode()] = legacy_redis_command(spec.name)(spec.func).__get__(redis)
+    return execute_map
+
+
+COMMANDS = [
+    (b'GET', (b'key',)),
+    (b'SET', (b'key', b'value')),
+    (b'INCRBY', (b'counter', b'1')),
+]
+
+
+def main(number=200000):
+    redis = Redis()
+    legacy = legacy_execute_map(redis)
+
+    def run_legacy(command, args):
+        return legacy[command.decode().upper()](*args)
+
+    print('{:<8} {:>10} {:>10} {:>10} {:>12} {:>12}'.format(
+        'command', 'raw ns', 'legacy ns', 'new ns', 'legacy ovh', 'new ovh'))
+
+    for command, args in COMMANDS:
+        func = redis.command_specs[command].func
+        raw = timeit.timeit(lambda: func(redis, *args), number=number)
+        old = timeit.timeit(lambda: run_legacy(command, args), number=number)
+        new = timeit.timeit(lambda: redis.execute_single(command, *args), number=number)
+
+        raw, old, new = (value / number * 1e9 for value in (raw, old, new))
+        print('{:<8} {:>10.0f} {:>10.0f} {:>10.0f} {:>12.0f} {:>12.0f}'.format(
+            command.decode(), raw, old, new, old - raw, new - raw))
+
+
+if __name__ == '__main__':
+    main()
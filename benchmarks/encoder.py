@@ -0,0 +1,76 @@
+"""
+Reply encoding throughput for large EXEC and multibulk replies
+
+Compares the ReplyEncoder with the previous fragment list based encoder
+(kept here as a reference implementation)
+
+    python benchmarks/encoder.py
+"""
+import time
+
+from rediserver import resp
+
+
+def legacy_resp_dumps(value):
+    if value is resp.OK:
+        return [b'+OK']
+
+    if value is resp.NIL:
+        return [b'$-1']
+
+    if isinstance(value, int):
+        return [b':' + str(value).encode()]
+
+    if isinstance(value, bytes):
+        return [b'$' + str(len(value)).encode(), value]
+
+    if isinstance(value, (list, tuple)):
+        result = [b'*' + str(len(value)).encode()]
+        for item in value:
+            result.extend(legacy_resp_dumps(item))
+        return result
+
+    raise NotImplementedError()
+
+
+def legacy_dump_response(value):
+    return resp.SYM_CRLF.join(legacy_resp_dumps(value)) + resp.SYM_CRLF
+
+
+def encoder_dump_response(value):
+    encoder = resp.ReplyEncoder()
+    encoder.write(value)
+    return encoder.take()
+
+
+REPLIES = [
+    ('EXEC 10k mixed replies', [
+        item for index in range(2500)
+        for item in (resp.OK, index, b'value:%d' % index, None)
+    ]),
+    ('SMEMBERS 100k members', [b'member:%d' % index for index in range(100000)]),
+    ('SCAN 1k pages', [[b'%d' % index, [b'key:%d' % key for key in range(100)]] for index in range(1000)]),
+]
+
+
+def measure(func, value, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(value)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    print('{:<24} {:>12} {:>12}'.format('reply', 'legacy ms', 'encoder ms'))
+    for name, value in REPLIES:
+        assert legacy_dump_response(value) == encoder_dump_response(value)
+        legacy = measure(legacy_dump_response, value)
+        encoder = measure(encoder_dump_response, value)
+        print('{:<24} {:>12.2f} {:>12.2f}'.format(name, legacy * 1000, encoder * 1000))
+
+
+if __name__ == '__main__':
+    main()
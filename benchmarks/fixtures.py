@@ -0,0 +1,67 @@
+"""
+Seeding a test server with a dataset: commands sent by a client in round trips compared
+with importing a snapshot fixture file and cloning a preloaded template
+
+    python benchmarks/fixtures.py [number of keys] [number of servers]
+"""
+import os
+import sys
+import time
+
+from tempfile import TemporaryDirectory
+
+import redis as redis_client
+
+from rediserver import snapshot
+from rediserver.test import DirectRedis, local_redis, load_template
+
+
+def seed(client, count):
+    for index in range(count):
+        if index % 2:
+            client.set('string:{}'.format(index), 'value')
+        else:
+            client.sadd('set:{}'.format(index), 'a', 'b', 'c')
+
+
+def round_trips(count, servers, path, template):
+    for _ in range(servers):
+        with local_redis() as redis:
+            seed(redis_client.StrictRedis(unix_socket_path=redis.sock), count)
+            assert len(redis) == count
+
+
+def import_file(count, servers, path, template):
+    for _ in range(servers):
+        with local_redis(fixture=path) as redis:
+            assert len(redis) == count
+
+
+def clone_template(count, servers, path, template):
+    for _ in range(servers):
+        with local_redis(template=template) as redis:
+            assert len(redis) == count
+
+
+def main(count=20000, servers=5):
+    with TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'fixture.rdb')
+        source = DirectRedis()
+        seed(source, count)
+        snapshot.save(path, source.server.keys)
+        template = load_template(path)
+
+        results = []
+        for name, func in (('round trips', round_trips), ('import file', import_file),
+                           ('clone template', clone_template)):
+            start = time.perf_counter()
+            func(count, servers, path, template)
+            results.append((name, (time.perf_counter() - start) / servers * 1000))
+
+    print('{} keys, {} servers'.format(count, servers))
+    for name, elapsed in results:
+        print('{:<15} {:>9.1f} ms per server'.format(name, elapsed))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
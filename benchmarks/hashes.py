@@ -0,0 +1,49 @@
+"""
+Memory used by small hashes in the compact bytes encoding and in the dict encoding
+
+Every encoding is measured in a separate process by the growth of its peak resident memory
+
+    python benchmarks/hashes.py [number of hashes] [fields per hash]
+"""
+import sys
+import resource
+import multiprocessing
+
+from rediserver.hashes import Hash
+
+
+def peak_memory():
+    # kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def build(max_entries, count, fields, result):
+    start = peak_memory()
+    hashes = []
+    for index in range(count):
+        value = Hash()
+        for field in range(fields):
+            value.set(b'field:%d' % field, b'value:%d:%d' % (index, field), max_entries)
+        hashes.append(value)
+    result.put((peak_memory() - start, hashes[0].encoding))
+
+
+def measure(max_entries, count, fields):
+    result = multiprocessing.Queue()
+    process = multiprocessing.Process(target=build, args=(max_entries, count, fields, result))
+    process.start()
+    size, encoding = result.get()
+    process.join()
+    return size, encoding
+
+
+def main(count=1000000, fields=10):
+    print('{} hashes of {} fields'.format(count, fields))
+    for max_entries in (128, 0):
+        size, encoding = measure(max_entries, count, fields)
+        print('{:<10} {:>8.0f} MB {:>6.0f} bytes per hash'.format(
+            encoding.decode(), size / 1024 / 1024, size / count))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
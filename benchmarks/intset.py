@@ -0,0 +1,52 @@
+"""
+Memory used by sets of integer IDs in the intset encoding and as sets of bytes
+
+Every encoding is measured in a separate process by the growth of its peak resident memory
+
+    python benchmarks/intset.py [number of sets] [members per set]
+"""
+import sys
+import random
+import resource
+import multiprocessing
+
+from rediserver.intset import IntSet
+
+
+def peak_memory():
+    # kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def build(encoding, count, members, result):
+    rng = random.Random(0)
+    start = peak_memory()
+    sets = []
+    for _ in range(count):
+        values = IntSet() if encoding == 'intset' else set()
+        for _ in range(members):
+            member = b'%d' % rng.randrange(10 ** 9)
+            values.add(member)
+        sets.append(values)
+    result.put(peak_memory() - start)
+
+
+def measure(encoding, count, members):
+    result = multiprocessing.Queue()
+    process = multiprocessing.Process(target=build, args=(encoding, count, members, result))
+    process.start()
+    size = result.get()
+    process.join()
+    return size
+
+
+def main(count=10000, members=500):
+    print('{} sets of {} integer members'.format(count, members))
+    for encoding in ('intset', 'hashtable'):
+        size = measure(encoding, count, members)
+        print('{:<10} {:>8.0f} MB {:>6.1f} bytes per member'.format(
+            encoding, size / 1024 / 1024, size / count / members))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
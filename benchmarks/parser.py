@@ -0,0 +1,107 @@
+"""
+Request parsing throughput over realistic multibulk payloads
+
+Compares the incremental RequestParser with the previous StreamReader based
+recursive parser (kept here as a reference implementation)
+
+    python benchmarks/parser.py
+"""
+import asyncio
+import time
+
+from rediserver import resp
+
+CHUNK_SIZE = 64 * 1024
+
+
+def pack(*args):
+    result = [b'*' + str(len(args)).encode()]
+    for arg in args:
+        result.extend([b'$' + str(len(arg)).encode(), arg])
+    return resp.SYM_CRLF.join(result) + resp.SYM_CRLF
+
+
+async def legacy_read_command(reader):
+    data = await reader.readuntil(resp.SYM_CRLF)
+
+    type_ = chr(data[0])
+    data = data[1:-len(resp.SYM_CRLF)]
+
+    if type_ == '$':
+        length = int(data)
+        string = await reader.readexactly(length)
+        await reader.readexactly(len(resp.SYM_CRLF))
+        return string
+    if type_ == '*':
+        length = int(data)
+        return [
+            await legacy_read_command(reader) for _ in range(length)
+        ]
+
+    raise NotImplementedError()
+
+
+def chunks(data):
+    return [data[pos:pos + CHUNK_SIZE] for pos in range(0, len(data), CHUNK_SIZE)]
+
+
+def run_parser(data, count):
+    parser = resp.RequestParser()
+    parsed = 0
+    for chunk in chunks(data):
+        parser.feed(chunk)
+        while True:
+            commands = parser.get_commands(1024)
+            if not commands:
+                break
+            parsed += len(commands)
+    assert parsed == count
+
+
+def run_legacy(data, count):
+    loop = asyncio.new_event_loop()
+
+    async def parse():
+        reader = asyncio.StreamReader(loop=loop)
+        for chunk in chunks(data):
+            reader.feed_data(chunk)
+        for _ in range(count):
+            await legacy_read_command(reader)
+
+    loop.run_until_complete(parse())
+    loop.close()
+
+
+PAYLOADS = [
+    ('10k SET small keys', b''.join(
+        pack(b'SET', 'key:{}'.format(i).encode(), b'value') for i in range(10000)
+    ), 10000),
+    ('10x SET 1 MB values', b''.join(
+        pack(b'SET', 'key:{}'.format(i).encode(), b'x' * 1024 * 1024) for i in range(10)
+    ), 10),
+    ('SADD 10k members', pack(
+        b'SADD', b'key', *['member:{}'.format(i).encode() for i in range(10000)]
+    ), 1),
+]
+
+
+def measure(func, data, count, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(data, count)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    print('{:<22} {:>12} {:>12}'.format('payload', 'legacy ms', 'parser ms'))
+    for name, data, count in PAYLOADS:
+        legacy = measure(run_legacy, data, count)
+        parser = measure(run_parser, data, count)
+        print('{:<22} {:>12.2f} {:>12.2f}'.format(name, legacy * 1000, parser * 1000))
+
+
+if __name__ == '__main__':
+    main()
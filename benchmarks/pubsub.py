@@ -0,0 +1,67 @@
+"""
+PUBLISH throughput with many subscribers and pattern subscriptions
+
+Compares the message encoded once and patterns looked up by their literal prefix with
+the message encoded per subscriber and every pattern tested against every message
+(kept here as a reference implementation)
+
+    python benchmarks/pubsub.py [number of messages] [subscribers] [patterns]
+"""
+import sys
+import time
+
+from rediserver import resp
+from rediserver.pubsub import PubSub
+from rediserver.pattern import compile_pattern
+
+
+class Subscriber:
+    def __init__(self):
+        self.channels = set()
+        self.patterns = set()
+        self.received = 0
+
+    def deliver(self, data):
+        self.received += len(data)
+        return True
+
+
+class LegacyPubSub(PubSub):
+    def publish(self, channel, message):
+        receivers = 0
+        for subscriber in self.channels.get(channel, ()):
+            subscriber.deliver(resp.dump_response([b'message', channel, message]))
+            receivers += 1
+        for pattern, subscribers in self.patterns.items():
+            if compile_pattern(pattern)(channel):
+                for subscriber in subscribers:
+                    subscriber.deliver(resp.dump_response([b'pmessage', pattern, channel, message]))
+                    receivers += 1
+        return receivers
+
+
+def measure(pubsub, count, subscribers, patterns):
+    for _ in range(subscribers):
+        pubsub.subscribe(Subscriber(), b'events')
+    for index in range(patterns):
+        pubsub.psubscribe(Subscriber(), b'user:%d:*' % index)
+
+    message = b'x' * 100
+    start = time.perf_counter()
+    for index in range(count):
+        pubsub.publish(b'events', message)
+        pubsub.publish(b'user:%d:login' % (index % patterns), message)
+    return 2 * count / (time.perf_counter() - start)
+
+
+def main(count=5000, subscribers=100, patterns=1000):
+    legacy = measure(LegacyPubSub(), count, subscribers, patterns)
+    indexed = measure(PubSub(), count, subscribers, patterns)
+
+    print('{} subscribers of a channel, {} pattern subscriptions'.format(subscribers, patterns))
+    print('encode per subscriber, scan patterns {:>10.0f} messages/s'.format(legacy))
+    print('encode once, pattern index           {:>10.0f} messages/s'.format(indexed))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,74 @@
+"""
+Primary write throughput with an attached replica
+
+Compares the command stream batched per event loop iteration with a write
+to the replica connection per command (kept here as a reference implementation)
+
+    python benchmarks/replication.py [number of commands] [commands per event loop iteration]
+"""
+import sys
+import time
+import socket
+import asyncio
+
+from rediserver import aof
+from rediserver.redis import Redis
+from rediserver.replication import Replication
+
+
+class LegacyReplication(Replication):
+    def feed(self, command, args):
+        data = bytearray()
+        aof.encode_command(data, command, args)
+        self.backlog.append(data)
+        self.offset += len(data)
+        for writer in self.replicas:
+            writer.write(data)
+
+
+async def drain(reader):
+    while await reader.read(1024 * 1024):
+        pass
+
+
+async def measure(replication_class, count, batch):
+    loop = asyncio.get_event_loop()
+    redis = Redis()
+    redis.replication = replication_class(redis)
+    redis.replication.start(loop)
+
+    primary_socket, replica_socket = socket.socketpair()
+    _, writer = await asyncio.open_connection(sock=primary_socket)
+    reader, replica_writer = await asyncio.open_connection(sock=replica_socket)
+    drainer = loop.create_task(drain(reader))
+    redis.replication.sync(writer, None, -1)
+
+    start = time.perf_counter()
+    for index in range(0, count, batch):
+        for offset in range(index, min(index + batch, count)):
+            redis.execute_single(b'SET', b'key:%d' % (offset % 1000), b'value:%d' % offset)
+        # the next event loop iteration
+        await asyncio.sleep(0)
+        await writer.drain()
+    elapsed = time.perf_counter() - start
+
+    writer.close()
+    await drainer
+    replica_writer.close()
+    return count / elapsed
+
+
+def main(count=200000, batch=100):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    legacy = loop.run_until_complete(measure(LegacyReplication, count, batch))
+    batched = loop.run_until_complete(measure(Replication, count, batch))
+    loop.close()
+
+    print('{} SET commands, {} per event loop iteration'.format(count, batch))
+    print('write per command     {:>10.0f} ops/s'.format(legacy))
+    print('batched per iteration {:>10.0f} ops/s'.format(batched))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
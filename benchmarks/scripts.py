@@ -0,0 +1,74 @@
+"""
+EVALSHA throughput of a rate limiter script
+
+Compares the script runtime with per call KEYS/ARGV tables and redis.call going through
+execute_single (kept here as a reference implementation)
+
+    python benchmarks/scripts.py [number of calls]
+"""
+import sys
+import time
+
+from lupa import LuaRuntime
+
+from rediserver.redis import Redis
+from rediserver.scripting import script_sha
+
+RATE_LIMITER = b"""
+local current = redis.call('INCRBY', KEYS[1], 1)
+if current == 1 then
+    redis.call('PEXPIRE', KEYS[1], ARGV[1])
+end
+if current > tonumber(ARGV[2]) then
+    return 0
+end
+return 1
+"""
+
+
+class LegacyScripts:
+    def __init__(self, redis):
+        self.lua = LuaRuntime(encoding=None, unpack_returned_tuples=True)
+        self.scripts = {}
+
+        class RedisProxy:
+            def call(self, command, *args):
+                return redis.execute_single(command, *args)
+
+        self.proxy = RedisProxy()
+
+    def load(self, script):
+        sha = script_sha(script)
+        self.scripts[sha] = self.lua.eval('function(redis, KEYS, ARGV) {} end'.format(script.decode()))
+        return sha
+
+    def evalsha(self, sha, num_keys, *args):
+        num_keys = int(num_keys)
+        keys = args[:num_keys]
+        vals = args[num_keys:]
+        return self.scripts[sha](self.proxy, self.lua.table(*keys), self.lua.table(*vals))
+
+
+def measure(evalsha, sha, count):
+    start = time.perf_counter()
+    for index in range(count):
+        evalsha(sha, b'1', b'rate:%d' % (index % 100), b'60000', b'1000000')
+    return count / (time.perf_counter() - start)
+
+
+def main(count=100000):
+    redis = Redis()
+    legacy = LegacyScripts(redis)
+    legacy_rate = measure(legacy.evalsha, legacy.load(RATE_LIMITER), count)
+
+    redis = Redis()
+    sha = redis.load_script(RATE_LIMITER)
+    rate = measure(redis.execute_evalsha, sha, count)
+
+    print('{} EVALSHA calls of a rate limiter script'.format(count))
+    print('legacy runtime {:>10.0f} ops/s'.format(legacy_rate))
+    print('script runtime {:>10.0f} ops/s'.format(rate))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,51 @@
+"""
+Startup load time of a snapshot compared with replaying the commands that built the keyspace
+
+    python benchmarks/snapshot.py [number of keys]
+"""
+import os
+import sys
+import time
+import tempfile
+
+from rediserver.config import Config
+from rediserver.redis import Redis
+
+
+def build(redis, count):
+    for index in range(count):
+        key = b'key:%d' % index
+        if index % 10:
+            redis.execute_single(b'SET', key, b'value:%d' % index)
+        else:
+            redis.execute_single(b'SADD', key, *[b'member:%d' % member for member in range(10)])
+
+
+def main(count=500000):
+    with tempfile.TemporaryDirectory() as path:
+        config = Config(dir=path, dbfilename='dump.rdb')
+        redis = Redis(config)
+
+        start = time.perf_counter()
+        build(redis, count)
+        replay = time.perf_counter() - start
+
+        start = time.perf_counter()
+        redis.save()
+        save = time.perf_counter() - start
+        size = os.path.getsize(redis.snapshot_path())
+
+        loaded = Redis(config)
+        start = time.perf_counter()
+        loaded.load_snapshot()
+        load = time.perf_counter() - start
+        assert len(loaded.keys) == count
+
+    print('{} keys, snapshot {:.1f} MB'.format(count, size / 1024 / 1024))
+    print('replay commands {:>8.2f} s'.format(replay))
+    print('save snapshot   {:>8.2f} s'.format(save))
+    print('load snapshot   {:>8.2f} s'.format(load))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
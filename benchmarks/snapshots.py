@@ -0,0 +1,74 @@
+"""
+Cost of reading the keyspace of the test server between writes, the deep copy of every
+value the dict property used to make compared with the frozen snapshot refreshed with the
+changed keys only
+
+    python benchmarks/snapshots.py [number of keys] [number of reads]
+"""
+import sys
+import time
+
+from copy import deepcopy
+
+import redis as redis_client
+
+from rediserver.test import local_redis
+
+
+def copy_value(value):
+    if type(value) is int:
+        return b'%d' % value
+    return deepcopy(value)
+
+
+def populate(client, count):
+    pipeline = client.pipeline(transaction=False)
+    for index in range(count):
+        kind = index % 4
+        if kind == 0:
+            pipeline.set('string:{}'.format(index), 'value')
+        elif kind == 1:
+            pipeline.rpush('list:{}'.format(index), 'a', 'b', 'c')
+        elif kind == 2:
+            pipeline.sadd('set:{}'.format(index), 'a', 'b', 'c')
+        else:
+            pipeline.hset('hash:{}'.format(index), mapping={'a': '1', 'b': '2'})
+        if index % 1000 == 999:
+            pipeline.execute()
+    pipeline.execute()
+
+
+def measure(redis, client, reads, read):
+    start = time.perf_counter()
+    for index in range(reads):
+        client.incr('counter')
+        snapshot = read(redis)
+        assert snapshot[b'counter'] == b'%d' % (index + 1)
+    return (time.perf_counter() - start) / reads * 1000
+
+
+def legacy(redis):
+    # unsynchronized deep copy from the calling thread
+    return {key: copy_value(value) for key, value in redis.instance.keys.items()}
+
+
+def frozen(redis):
+    return redis.dict
+
+
+def main(count=100000, reads=20):
+    results = []
+    with local_redis() as redis:
+        client = redis_client.StrictRedis(unix_socket_path=redis.sock)
+        populate(client, count)
+        for name, read in (('deepcopy', legacy), ('frozen snapshot', frozen)):
+            client.delete('counter')
+            results.append((name, measure(redis, client, reads, read)))
+
+    print('{} keys, a write before each read'.format(count))
+    for name, elapsed in results:
+        print('{:<16} {:>9.3f} ms per read'.format(name, elapsed))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,47 @@
+"""
+Per test setup cost of the test server, a fresh server per test compared with
+a shared server reset between tests
+
+    python benchmarks/test_server.py [number of tests]
+"""
+import sys
+import time
+
+import redis as redis_client
+
+from rediserver.test import local_redis
+
+
+def run_test(redis):
+    client = redis_client.StrictRedis(unix_socket_path=redis.sock)
+    client.set('key', 'value')
+    client.script_load('return 1')
+
+
+def fresh(count):
+    start = time.perf_counter()
+    for _ in range(count):
+        with local_redis() as redis:
+            run_test(redis)
+    return (time.perf_counter() - start) / count * 1000
+
+
+def shared(count):
+    start = time.perf_counter()
+    with local_redis() as redis:
+        for _ in range(count):
+            redis.reset()
+            run_test(redis)
+    return (time.perf_counter() - start) / count * 1000
+
+
+def main(count=200):
+    results = [('server per test', fresh(count)), ('shared server reset', shared(count))]
+
+    print('{} tests'.format(count))
+    for name, elapsed in results:
+        print('{:<20} {:>8.3f} ms per test, {:>6.1f} s per 8000 tests'.format(name, elapsed, elapsed * 8))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,57 @@
+"""
+Leaderboard queries on a large sorted set
+
+Compares the skiplist encoding with a dict of scores sorted on every rank and range
+query (kept here as a reference implementation)
+
+    python benchmarks/zset.py [number of members] [number of queries]
+"""
+import sys
+import time
+import random
+
+from rediserver.zset import SortedSet
+
+
+class LegacySortedSet:
+    def __init__(self):
+        self.dict = {}
+
+    def add(self, member, score):
+        self.dict[member] = score
+
+    def ordered(self):
+        return sorted(self.dict.items(), key=lambda item: (item[1], item[0]))
+
+    def rank(self, member):
+        return self.ordered().index((member, self.dict[member]))
+
+    def slice(self, start, stop):
+        return self.ordered()[start:stop]
+
+
+def measure(zset, members, queries):
+    for member in members:
+        zset.add(member, random.randrange(1000000))
+
+    start = time.perf_counter()
+    for index in range(queries):
+        member = members[index % len(members)]
+        zset.add(member, random.randrange(1000000))
+        rank = zset.rank(member)
+        zset.slice(max(rank - 5, 0), rank + 5)
+    return queries / (time.perf_counter() - start)
+
+
+def main(size=20000, queries=100):
+    members = [b'player:%d' % index for index in range(size)]
+    legacy = measure(LegacySortedSet(), members, queries)
+    skiplist = measure(SortedSet(), members, queries)
+
+    print('{} members, ZINCRBY + ZRANK + ZRANGE around the rank'.format(size))
+    print('sort per query {:>10.0f} ops/s'.format(legacy))
+    print('skiplist       {:>10.0f} ops/s'.format(skiplist))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
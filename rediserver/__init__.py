@@ -1 +1 @@
-from .server import run_tcp, run_sock
+from .server import run_tcp, run_sock, run_cluster, run_replicated
@@ -0,0 +1,168 @@
+"""
+Append only file, every change of the keyspace is logged as a RESP command
+
+The rewrite replaces the log by a snapshot of the keyspace (see snapshot.py),
+the commands appended after the snapshot preamble are replayed on top of it
+"""
+import os
+import time
+import mmap
+
+FSYNC_POLICIES = ('always', 'everysec', 'no')
+
+_STAR = ord(b'*')
+_DOLLAR = ord(b'$')
+
+
+class AofError(Exception):
+    pass
+
+
+def encode_command(out, command, args):
+    """
+    Append the command as a RESP array of bulk strings to the buffer
+    """
+    out += b'*%d\r\n$%d\r\n' % (len(args) + 1, len(command))
+    out += command
+    out += b'\r\n'
+    for arg in args:
+        if not isinstance(arg, bytes):
+            # arguments of script calls and rewritten commands may be numbers
+            arg = arg.encode() if isinstance(arg, str) else str(arg).encode()
+        out += b'$%d\r\n' % len(arg)
+        out += arg
+        out += b'\r\n'
+
+
+def read_commands(data, pos=0):
+    """
+    Iterate over the logged commands starting at the position, yields (args, end position)
+    where args[0] is the command name. A command truncated by the end of the data stops the iteration
+    """
+    size = len(data)
+    while pos < size:
+        if data[pos] != _STAR:
+            raise AofError('Bad file format at offset {}'.format(pos))
+        end = data.find(b'\r\n', pos)
+        if end < 0:
+            return
+        count = int(data[pos + 1:end])
+        pos = end + 2
+
+        args = []
+        for _ in range(count):
+            end = data.find(b'\r\n', pos)
+            if end < 0:
+                return
+            if data[pos] != _DOLLAR:
+                raise AofError('Bad file format at offset {}'.format(pos))
+            start = end + 2
+            pos = start + int(data[pos + 1:end]) + 2
+            if pos > size:
+                return
+            args.append(data[start:pos - 2])
+
+        yield args, pos
+
+
+def map_file(path):
+    """
+    Memory map of the file contents, None for an empty file
+    """
+    with open(path, 'rb') as fileobj:
+        if os.fstat(fileobj.fileno()).st_size == 0:
+            return None
+        return mmap.mmap(fileobj.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class AppendOnlyFile:
+    """
+    Commands are buffered while they are executed and written with a single write per
+    event loop iteration (group commit), the fsync policy decides when the data hits the disk
+    """
+
+    def __init__(self, path, fsync='everysec'):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError('Unknown appendfsync policy {}'.format(fsync))
+
+        self.path = path
+        self.fsync_policy = fsync
+        self.buffer = bytearray()
+        # commands written while a background rewrite runs, they are appended to the rewritten file
+        self.rewrite_buffer = None
+        self.last_fsync = time.monotonic()
+        self.unsynced = False
+        self.file = None
+        self.size = 0
+        # size after the last rewrite, the automatic rewrite triggers on the growth relative to it
+        self.base_size = 0
+        self.open()
+
+    def open(self):
+        self.file = open(self.path, 'ab', buffering=0)
+        self.size = self.base_size = os.fstat(self.file.fileno()).st_size
+
+    def feed(self, command, args):
+        encode_command(self.buffer, command, args)
+
+    def flush(self):
+        """
+        Write the buffered commands at once, returns when the policy is satisfied
+        """
+        if self.buffer:
+            data = self.buffer
+            self.buffer = bytearray()
+
+            view = memoryview(data)
+            while view:
+                view = view[self.file.write(view):]
+            self.size += len(data)
+            if self.rewrite_buffer is not None:
+                self.rewrite_buffer += data
+
+            if self.fsync_policy == 'always':
+                self.fsync()
+                return
+            self.unsynced = True
+
+        if self.unsynced and self.fsync_policy == 'everysec' and time.monotonic() - self.last_fsync >= 1:
+            self.fsync()
+
+    def fsync(self):
+        os.fsync(self.file.fileno())
+        self.last_fsync = time.monotonic()
+        self.unsynced = False
+
+    def close(self):
+        self.flush()
+        if self.unsynced and self.fsync_policy != 'no':
+            self.fsync()
+        self.file.close()
+
+    def start_rewrite(self):
+        self.flush()
+        self.rewrite_buffer = bytearray()
+
+    def abort_rewrite(self):
+        self.rewrite_buffer = None
+
+    def finish_rewrite(self, temp_path):
+        """
+        Append the commands logged during the rewrite to the rewritten file and switch to it
+        """
+        self.flush()
+        with open(temp_path, 'ab') as fileobj:
+            fileobj.write(self.rewrite_buffer)
+            fileobj.flush()
+            os.fsync(fileobj.fileno())
+
+        os.replace(temp_path, self.path)
+        self.rewrite_buffer = None
+        self.file.close()
+        self.open()
+        self.unsynced = False
+
+    def rewrite_needed(self, percentage, min_size):
+        if not percentage or self.size < min_size:
+            return False
+        return self.size >= self.base_size * (100 + percentage) / 100
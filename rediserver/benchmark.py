@@ -0,0 +1,433 @@
+"""
+Throughput and latency benchmark, like redis-benchmark
+
+    python -m rediserver.benchmark [-t set,get] [-c 1,50] [-P 1,16] [-d 3,1024] [-n 100000]
+                                   [-r keyspace] [--host host --port port | --socket path]
+                                   [--json results.json] [--compare baseline.json]
+
+Every combination of test, number of clients, pipeline depth and value size is run
+against a server started in a separate process (run_sock on a temporary socket, or
+run_tcp with --port), or against a running server with --host. The clients share an
+event loop of this process, each keeps a pipeline of requests in flight and measures
+the time from sending it to the last reply. A request of the multi test is a whole
+MULTI/SET/INCR/EXEC transaction.
+
+Results are written as JSON with --json. --compare matches the results with the ones
+of a baseline file by (test, clients, pipeline, size) and flags a regression when the
+throughput dropped or the p99 latency grew by more than the threshold, the exit code is
+1 then. The client runs in Python too, so absolute numbers are lower than the server
+could serve, compare runs of the same machine and options
+"""
+import os
+import sys
+import time
+import json
+import random
+import socket
+import asyncio
+import hashlib
+import argparse
+import platform
+import multiprocessing
+
+from tempfile import TemporaryDirectory
+
+from .aof import encode_command
+from .server import run_sock, run_tcp
+
+RESULTS_VERSION = 1
+
+TESTS = ('set', 'get', 'incr', 'sadd', 'spop', 'evalsha', 'multi')
+
+SCRIPT = b"return redis.call('SET', KEYS[1], ARGV[1])"
+SCRIPT_SHA = hashlib.sha1(SCRIPT).hexdigest().encode()
+
+# a result is slower than the baseline when they differ by more than the threshold
+DEFAULT_THRESHOLD = 0.1
+
+_SIMPLE_REPLIES = frozenset(b'+-:')
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+def request_factory(test, size, keyspace):
+    """
+    Function returning the commands of a new request, (command, args) tuples
+    """
+    value = b'x' * size
+    if keyspace:
+        def key(prefix):
+            return b'%s:%d' % (prefix, random.randrange(keyspace))
+    else:
+        def key(prefix):
+            return prefix
+
+    if test == 'set':
+        return lambda: [(b'SET', (key(b'key'), value))]
+    if test == 'get':
+        return lambda: [(b'GET', (key(b'key'),))]
+    if test == 'incr':
+        return lambda: [(b'INCR', (key(b'counter'),))]
+    if test == 'sadd':
+        return lambda: [(b'SADD', (b'myset', key(b'element')))]
+    if test == 'spop':
+        return lambda: [(b'SPOP', (b'myset',))]
+    if test == 'evalsha':
+        return lambda: [(b'EVALSHA', (SCRIPT_SHA, b'1', key(b'key'), value))]
+    if test == 'multi':
+        return lambda: [(b'MULTI', ()), (b'SET', (key(b'key'), value)), (b'INCR', (key(b'counter'),)), (b'EXEC', ())]
+    raise BenchmarkError('Unknown test {}, the tests are {}'.format(test, ', '.join(TESTS)))
+
+
+def setup_commands(test, requests):
+    """
+    Commands run before the test, so that it doesn't depend on the tests run before
+    """
+    if test == 'evalsha':
+        return [(b'SCRIPT', (b'LOAD', SCRIPT))]
+    if test == 'spop':
+        # a member for every pop
+        members = tuple(b'element:%d' % index for index in range(requests))
+        return [(b'DEL', (b'myset',)), (b'SADD', (b'myset',) + members)]
+    return []
+
+
+async def read_reply(reader):
+    """
+    Read a reply, returns whether it is an error
+    """
+    line = await reader.readuntil(b'\r\n')
+    kind = line[0]
+    if kind in _SIMPLE_REPLIES:
+        return line[:1] == b'-'
+    length = int(line[1:-2])
+    if line[:1] == b'$':
+        if length >= 0:
+            await reader.readexactly(length + 2)
+        return False
+    if line[:1] == b'*':
+        error = False
+        for _ in range(max(length, 0)):
+            error = await read_reply(reader) or error
+        return error
+    raise BenchmarkError('Unexpected reply {!r}'.format(line))
+
+
+async def connect(address):
+    if isinstance(address, str):
+        return await asyncio.open_unix_connection(address)
+    host, port = address
+    return await asyncio.open_connection(host, port)
+
+
+async def execute(address, commands):
+    reader, writer = await connect(address)
+    try:
+        out = bytearray()
+        for command, args in commands:
+            encode_command(out, command, args)
+        writer.write(out)
+        for _ in commands:
+            if await read_reply(reader):
+                raise BenchmarkError('Command failed during the setup')
+    finally:
+        writer.close()
+
+
+class Run:
+    """
+    State shared by the clients of a run
+    """
+
+    def __init__(self, requests, make_request, pipeline):
+        self.remaining = requests
+        self.make_request = make_request
+        self.pipeline = pipeline
+        # latency of every request in seconds
+        self.latencies = []
+        self.errors = 0
+
+
+async def run_client(address, run):
+    reader, writer = await connect(address)
+    latencies = run.latencies
+    try:
+        while run.remaining > 0:
+            count = min(run.pipeline, run.remaining)
+            run.remaining -= count
+
+            out = bytearray()
+            replies = 0
+            for _ in range(count):
+                for command, args in run.make_request():
+                    encode_command(out, command, args)
+                    replies += 1
+
+            start = time.perf_counter()
+            writer.write(out)
+            for _ in range(replies):
+                if await read_reply(reader):
+                    run.errors += 1
+            elapsed = time.perf_counter() - start
+            latencies.extend([elapsed] * count)
+    finally:
+        writer.close()
+
+
+async def run_clients(address, run, clients):
+    await asyncio.gather(*[run_client(address, run) for _ in range(clients)])
+
+
+def percentile(values, fraction):
+    """
+    Value below which the fraction of the sorted values lies
+    """
+    if not values:
+        return 0.0
+    index = min(max(int(len(values) * fraction + 0.5) - 1, 0), len(values) - 1)
+    return values[index]
+
+
+def run_workload(address, test, clients, pipeline, size, requests, keyspace=0):
+    """
+    Run the requests of the test with the clients in parallel, returns the result dict
+    """
+    loop = asyncio.new_event_loop()
+    try:
+        setup = setup_commands(test, requests)
+        if setup:
+            loop.run_until_complete(execute(address, setup))
+
+        run = Run(requests, request_factory(test, size, keyspace), pipeline)
+        start = time.perf_counter()
+        loop.run_until_complete(run_clients(address, run, clients))
+        elapsed = time.perf_counter() - start
+    finally:
+        loop.close()
+
+    latencies = sorted(run.latencies)
+    return {
+        'test': test,
+        'clients': clients,
+        'pipeline': pipeline,
+        'size': size,
+        'requests': requests,
+        'errors': run.errors,
+        'seconds': round(elapsed, 6),
+        'ops_per_sec': round(requests / elapsed, 2),
+        'p50_ms': round(percentile(latencies, 0.5) * 1000, 4),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 4),
+        'p999_ms': round(percentile(latencies, 0.999) * 1000, 4),
+    }
+
+
+def run_benchmark(address, tests=TESTS, clients=(50,), pipelines=(1,), sizes=(3,), requests=100000,
+                  keyspace=0, report=None):
+    """
+    Run every combination of the options, report is called with each result
+    """
+    results = []
+    for test in tests:
+        # an unknown test fails before anything runs
+        request_factory(test, 0, keyspace)
+    for test in tests:
+        for size in sizes:
+            for client_count in clients:
+                for pipeline in pipelines:
+                    result = run_workload(address, test, client_count, pipeline, size, requests, keyspace)
+                    results.append(result)
+                    if report is not None:
+                        report(result)
+    return results
+
+
+def result_key(result):
+    return result['test'], result['clients'], result['pipeline'], result['size']
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Match the results with the baseline ones, returns (result, baseline result or None, status) tuples,
+    the status is 'ok', 'regression', 'improvement' or 'new'
+    """
+    baseline_results = {result_key(result): result for result in baseline}
+    comparison = []
+    for result in results:
+        base = baseline_results.get(result_key(result))
+        if base is None:
+            status = 'new'
+        elif (result['ops_per_sec'] < base['ops_per_sec'] * (1 - threshold)
+              or result['p99_ms'] > base['p99_ms'] * (1 + threshold)):
+            status = 'regression'
+        elif result['ops_per_sec'] > base['ops_per_sec'] * (1 + threshold):
+            status = 'improvement'
+        else:
+            status = 'ok'
+        comparison.append((result, base, status))
+    return comparison
+
+
+def save_results(path, results, options=None):
+    data = {
+        'version': RESULTS_VERSION,
+        'time': int(time.time()),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'options': options or {},
+        'results': results,
+    }
+    with open(path, 'w') as fileobj:
+        json.dump(data, fileobj, indent=2, sort_keys=True)
+
+
+def load_results(path):
+    with open(path) as fileobj:
+        data = json.load(fileobj)
+    if data.get('version') != RESULTS_VERSION:
+        raise BenchmarkError('Unsupported results version {}'.format(data.get('version')))
+    return data['results']
+
+
+def format_result(result):
+    return '{:<8} clients {:>4} pipeline {:>4} size {:>6}: {:>10.0f} ops/s  p50 {:.3f} p99 {:.3f} p999 {:.3f} ms{}'.format(
+        result['test'].upper(), result['clients'], result['pipeline'], result['size'], result['ops_per_sec'],
+        result['p50_ms'], result['p99_ms'], result['p999_ms'],
+        '  {} errors'.format(result['errors']) if result['errors'] else '')
+
+
+def format_comparison(result, base, status):
+    line = format_result(result)
+    if base is None:
+        return '{}  [new]'.format(line)
+    return '{}  [{}: {:+.1f}% ops/s, {:+.1f}% p99]'.format(
+        line, status, change(base['ops_per_sec'], result['ops_per_sec']), change(base['p99_ms'], result['p99_ms']))
+
+
+def change(before, after):
+    return (after - before) / before * 100 if before else 0.0
+
+
+def wait_for_server(address, process, timeout=10):
+    deadline = time.time() + timeout
+    while True:
+        try:
+            if isinstance(address, str):
+                sock = socket.socket(socket.AF_UNIX)
+                sock.settimeout(1)
+                sock.connect(address)
+                sock.close()
+            else:
+                socket.create_connection(address, timeout=1).close()
+            return
+        except OSError:
+            if process.exitcode is not None or time.time() > deadline:
+                raise BenchmarkError('Benchmark server failed to start')
+            time.sleep(0.01)
+
+
+class LocalServer:
+    """
+    Server process on a unix socket in a temporary directory, or on the local TCP port
+    """
+
+    def __init__(self, port=None):
+        self.port = port
+        self.tempdir = None
+        self.process = None
+
+    def __enter__(self):
+        if self.port is None:
+            self.tempdir = TemporaryDirectory()
+            address = os.path.join(self.tempdir.name, 'redis.sock')
+            target, args = run_sock, (address,)
+        else:
+            address = ('127.0.0.1', self.port)
+            target, args = run_tcp, address
+        self.process = multiprocessing.Process(target=target, args=args, daemon=True)
+        self.process.start()
+        try:
+            wait_for_server(address, self.process)
+        except Exception:
+            self.__exit__(None, None, None)
+            raise
+        return address
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.process.terminate()
+        self.process.join()
+        if self.tempdir is not None:
+            self.tempdir.cleanup()
+        self.process = None
+        self.tempdir = None
+
+
+def int_list(value):
+    return [int(item) for item in value.split(',')]
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog='python -m rediserver.benchmark', description=__doc__.split('\n\n')[0])
+    parser.add_argument('-t', '--tests', type=lambda value: value.lower().split(','), default=list(TESTS),
+                        help='comma separated tests: {}'.format(','.join(TESTS)))
+    parser.add_argument('-c', '--clients', type=int_list, default=[50], help='comma separated client counts')
+    parser.add_argument('-P', '--pipeline', type=int_list, default=[1], help='comma separated pipeline depths')
+    parser.add_argument('-d', '--size', type=int_list, default=[3], help='comma separated value sizes in bytes')
+    parser.add_argument('-n', '--requests', type=int, default=100000, help='requests per run')
+    parser.add_argument('-r', '--keyspace', type=int, default=0,
+                        help='use random keys of this many, a single key by default')
+    parser.add_argument('--host', help='benchmark a running server instead of starting one')
+    parser.add_argument('-p', '--port', type=int, help='TCP port of the started or running server')
+    parser.add_argument('-s', '--socket', help='unix socket of a running server')
+    parser.add_argument('--json', help='write the results to the file')
+    parser.add_argument('--compare', help='compare the results with a baseline file written by --json')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD * 100,
+                        help='regression threshold in percent, 10 by default')
+    args = parser.parse_args(argv)
+    unknown = [test for test in args.tests if test not in TESTS]
+    if unknown:
+        parser.error('unknown tests {}'.format(','.join(unknown)))
+    if min(args.clients + args.pipeline) < 1 or min(args.size) < 0 or args.requests < 1:
+        parser.error('clients, pipeline and requests must be positive')
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    baseline = load_results(args.compare) if args.compare else None
+
+    def report(result):
+        print(format_result(result))
+        sys.stdout.flush()
+
+    def benchmark(address):
+        return run_benchmark(address, args.tests, args.clients, args.pipeline, args.size, args.requests,
+                             args.keyspace, report=report)
+
+    if args.socket:
+        results = benchmark(args.socket)
+    elif args.host:
+        results = benchmark((args.host, args.port or 6379))
+    else:
+        with LocalServer(args.port) as address:
+            results = benchmark(address)
+
+    if args.json:
+        options = {name: getattr(args, name) for name in ('tests', 'clients', 'pipeline', 'size', 'requests', 'keyspace')}
+        save_results(args.json, results, options)
+    if baseline is None:
+        return 0
+
+    print()
+    regressions = 0
+    for result, base, status in compare(results, baseline, args.threshold / 100):
+        print(format_comparison(result, base, status))
+        regressions += status == 'regression'
+    print('{} regressions'.format(regressions))
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
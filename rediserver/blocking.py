@@ -0,0 +1,101 @@
+"""
+Blocking list pops
+
+A blocking command finding no data returns a Blocked marker instead of a reply. The
+connection (see server.on_connect) registers it in the waiter queue of each of its keys
+and awaits its future, the timeout is a timer of the event loop. Pushes signal the keys
+having waiters as ready, after the command the ready keys are served: waiters get the
+data in the order they blocked, each served pop is executed as the non blocking command
+so that it is propagated like one. Nothing polls, an idle waiter costs no CPU time
+
+Callers not able to block (MULTI/EXEC, scripts) see the marker as a nil reply
+"""
+import asyncio
+
+from collections import deque
+
+from . import resp
+
+
+def parse_timeout(value):
+    """
+    Blocking timeout in seconds, 0 blocks forever
+    """
+    try:
+        timeout = float(value)
+    except ValueError:
+        raise resp.Error('ERR', 'timeout is not a float or out of range')
+    if timeout != timeout or timeout in (float('inf'), float('-inf')):
+        raise resp.Error('ERR', 'timeout is not a float or out of range')
+    if timeout < 0:
+        raise resp.Error('ERR', 'timeout is negative')
+    return timeout
+
+
+class Blocked:
+    """
+    A blocking command waiting for data: serve(key) executes the command for the ready key
+    """
+    __slots__ = ('keys', 'timeout', 'serve', 'future')
+
+    def __init__(self, keys, timeout, serve):
+        self.keys = keys
+        self.timeout = timeout
+        self.serve = serve
+        self.future = None
+
+
+class BlockingQueues:
+    def __init__(self, redis):
+        self.redis = redis
+        # key -> deque of Blocked in blocking order
+        self.waiters = {}
+        # keys having waiters which received data since the last serve
+        self.ready = set()
+
+    def block(self, blocked):
+        blocked.future = asyncio.get_event_loop().create_future()
+        for key in blocked.keys:
+            waiters = self.waiters.get(key)
+            if waiters is None:
+                waiters = self.waiters[key] = deque()
+            waiters.append(blocked)
+        return blocked.future
+
+    def unblock(self, blocked):
+        for key in blocked.keys:
+            waiters = self.waiters.get(key)
+            if waiters is None:
+                continue
+            try:
+                waiters.remove(blocked)
+            except ValueError:
+                pass
+            if not waiters:
+                del self.waiters[key]
+
+    def signal(self, key):
+        """
+        Called on pushes, cheap for keys nobody waits for
+        """
+        if key in self.waiters:
+            self.ready.add(key)
+
+    def serve(self):
+        redis = self.redis
+        while self.ready:
+            key = self.ready.pop()
+            waiters = self.waiters.get(key)
+            while waiters:
+                redis.expire_if_needed(key)
+                if type(redis.keys.get(key)) is not deque:
+                    break
+                blocked = waiters[0]
+                self.unblock(blocked)
+                if blocked.future.done():
+                    continue
+                try:
+                    reply = blocked.serve(key)
+                except resp.Error as e:
+                    reply = e
+                blocked.future.set_result(reply)
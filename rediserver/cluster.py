@@ -0,0 +1,218 @@
+"""
+Static hash slot cluster, every node is a separate server process owning slot ranges
+
+Keys are mapped to one of the 16384 slots by CRC16 of the key or of its {hashtag},
+commands for slots owned by other nodes are answered with MOVED or ASK redirects
+"""
+import hashlib
+import binascii
+
+from . import resp
+
+CLUSTER_SLOTS = 16384
+
+# a slot with keys moving away from the node, or moving to the node from another one
+MIGRATING = b'MIGRATING'
+IMPORTING = b'IMPORTING'
+
+
+def key_hash_slot(key):
+    """
+    Slot of the key, only the part between the first { and the next } is hashed if it isn't empty
+    """
+    start = key.find(b'{')
+    if start >= 0:
+        end = key.find(b'}', start + 1)
+        if end > start + 1:
+            key = key[start + 1:end]
+    # crc_hqx is the CRC16 XMODEM variant used by Redis Cluster
+    return binascii.crc_hqx(key, 0) & (CLUSTER_SLOTS - 1)
+
+
+def split_slots(count):
+    """
+    Split the slots into count contiguous (first, last) ranges of equal size
+    """
+    bounds = [CLUSTER_SLOTS * index // count for index in range(count + 1)]
+    return [(bounds[index], bounds[index + 1] - 1) for index in range(count)]
+
+
+class ClusterNode:
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        # node ids are derived from the address, so that every process computes the same ones
+        self.node_id = hashlib.sha1('{}:{}'.format(host, port).encode()).hexdigest().encode()
+        self.address = '{}:{}'.format(host, port)
+
+    def ranges(self, slots):
+        """
+        Contiguous (first, last) ranges of the slots owned by the node
+        """
+        ranges = []
+        for slot, owner in enumerate(slots):
+            if owner is not self:
+                continue
+            if ranges and ranges[-1][1] == slot - 1:
+                ranges[-1][1] = slot
+            else:
+                ranges.append([slot, slot])
+        return ranges
+
+
+class Cluster:
+    """
+    Slot map of the cluster as seen by one node, built from the config:
+    cluster_nodes is a sequence of (host, port, first slot, last slot) and
+    cluster_announce is the (host, port) of this node
+    """
+
+    def __init__(self, nodes, myself):
+        self.nodes = {}
+        # slot -> owner node
+        self.slots = [None] * CLUSTER_SLOTS
+        self.migrating = {}
+        self.importing = {}
+        # node replicated by this node, its slots are readable by READONLY connections
+        self.master = None
+
+        for host, port, first, last in nodes:
+            node = self.get_node(host, port)
+            for slot in range(first, last + 1):
+                self.slots[slot] = node
+
+        self.myself = self.get_node(*myself)
+
+    def get_node(self, host, port):
+        node = self.nodes.get((host, port))
+        if node is None:
+            node = self.nodes[(host, port)] = ClusterNode(host, port)
+        return node
+
+    def find_node(self, node_id):
+        for node in self.nodes.values():
+            if node.node_id == node_id:
+                return node
+        raise resp.Error('ERR', 'Unknown node {}'.format(node_id.decode(errors='replace')))
+
+    def route(self, keys, keyspace, asking=False, read=False):
+        """
+        Raise a redirect unless the keys are served by this node,
+        all the keys of a command must belong to a single slot.
+        Read is set for read commands of READONLY connections
+        """
+        slot = None
+        for key in keys:
+            key_slot = key_hash_slot(key)
+            if slot is None:
+                slot = key_slot
+            elif key_slot != slot:
+                raise resp.Error('CROSSSLOT', "Keys in request don't hash to the same slot")
+        if slot is None:
+            return
+
+        owner = self.slots[slot]
+        if owner is self.myself:
+            target = self.migrating.get(slot)
+            # keys already moved to the target are served there
+            if target is not None and any(key not in keyspace for key in keys):
+                raise resp.Error('ASK', '{} {}'.format(slot, target.address))
+            return
+
+        if asking and slot in self.importing:
+            return
+        if read and owner is not None and owner is self.master:
+            return
+        if owner is None:
+            raise resp.Error('CLUSTERDOWN', 'Hash slot not served')
+        raise resp.Error('MOVED', '{} {}'.format(slot, owner.address))
+
+    def shards(self):
+        """
+        (node, ranges) pairs of the nodes owning slots
+        """
+        result = []
+        for node in self.nodes.values():
+            ranges = node.ranges(self.slots)
+            if ranges:
+                result.append((node, ranges))
+        return result
+
+    def execute_slots(self):
+        result = []
+        for node, ranges in self.shards():
+            for first, last in ranges:
+                result.append([first, last, [node.host.encode(), node.port, node.node_id]])
+        return result
+
+    def execute_shards(self):
+        result = []
+        for node, ranges in self.shards():
+            description = [
+                b'id', node.node_id,
+                b'port', node.port,
+                b'ip', node.host.encode(),
+                b'endpoint', node.host.encode(),
+                b'role', b'master',
+                b'replication-offset', 0,
+                b'health', b'online',
+            ]
+            slots = [bound for slot_range in ranges for bound in slot_range]
+            result.append([b'slots', slots, b'nodes', [description]])
+        return result
+
+    def execute_nodes(self):
+        lines = []
+        for node in self.nodes.values():
+            flags = 'myself,master' if node is self.myself else 'master'
+            slots = ['{}-{}'.format(first, last) if first != last else str(first)
+                     for first, last in node.ranges(self.slots)]
+            if node is self.myself:
+                slots += ['[{}->-{}]'.format(slot, target.node_id.decode()) for slot, target in self.migrating.items()]
+                slots += ['[{}-<-{}]'.format(slot, source.node_id.decode()) for slot, source in self.importing.items()]
+            lines.append(' '.join([
+                node.node_id.decode(), '{}@{}'.format(node.address, node.port + 10000),
+                flags, '-', '0', '0', '0', 'connected',
+            ] + slots))
+        return ('\n'.join(lines) + '\n').encode()
+
+    def execute_info(self):
+        assigned = sum(1 for owner in self.slots if owner is not None)
+        info = [
+            ('cluster_state', 'ok' if assigned == CLUSTER_SLOTS else 'fail'),
+            ('cluster_slots_assigned', assigned),
+            ('cluster_slots_ok', assigned),
+            ('cluster_slots_pfail', 0),
+            ('cluster_slots_fail', 0),
+            ('cluster_known_nodes', len(self.nodes)),
+            ('cluster_size', len(self.shards())),
+            ('cluster_current_epoch', 0),
+            ('cluster_my_epoch', 0),
+        ]
+        return ''.join('{}:{}\r\n'.format(name, value) for name, value in info).encode()
+
+    def execute_setslot(self, slot, action, node_id=None):
+        action = action.upper()
+        if action == b'STABLE' and node_id is None:
+            self.migrating.pop(slot, None)
+            self.importing.pop(slot, None)
+            return resp.OK
+        if node_id is None:
+            raise resp.Errors.SYNTAX
+
+        node = self.find_node(node_id)
+        if action == MIGRATING:
+            if self.slots[slot] is not self.myself:
+                raise resp.Error('ERR', "I'm not the owner of hash slot {}".format(slot))
+            self.migrating[slot] = node
+        elif action == IMPORTING:
+            if node is self.myself:
+                raise resp.Error('ERR', "I'm already the owner of hash slot {}".format(slot))
+            self.importing[slot] = node
+        elif action == b'NODE':
+            self.slots[slot] = node
+            self.migrating.pop(slot, None)
+            self.importing.pop(slot, None)
+        else:
+            raise resp.Errors.SYNTAX
+        return resp.OK
@@ -0,0 +1,72 @@
+class Config:
+    """
+    Server settings, every option can be passed as a keyword argument to the run functions
+    """
+
+    # max number of pipelined commands executed before the replies are flushed to the client
+    pipeline_max_batch = 1024
+    # max number of bytes read from the client socket at once
+    read_buffer_size = 64 * 1024
+    # max size of a single bulk string argument accepted from clients
+    proto_max_bulk_len = 512 * 1024 * 1024
+
+    # frequency of the server background tasks like active expiration, times per second
+    hz = 10
+
+    # memory limit in bytes of the approximately accounted keyspace, 0 means no limit
+    maxmemory = 0
+    # noeviction, allkeys-lru, allkeys-lfu, allkeys-random,
+    # volatile-lru, volatile-lfu, volatile-random or volatile-ttl
+    maxmemory_policy = 'noeviction'
+    # keys sampled per eviction round
+    maxmemory_samples = 5
+    lfu_log_factor = 10
+    # minutes after which an idle key LFU counter is decremented by one
+    lfu_decay_time = 1
+
+    # snapshot file name in dir, the snapshot is loaded on start, None disables persistence
+    dir = '.'
+    dbfilename = None
+    # background save when at least changes were made within seconds, list of (seconds, changes)
+    save = ()
+
+    # log every write command to appendfilename in dir, the log is replayed on start
+    appendonly = False
+    appendfilename = 'appendonly.aof'
+    # always, everysec or no
+    appendfsync = 'everysec'
+    # rewrite the log when it grew by the percentage since the last rewrite and is at least min size
+    auto_aof_rewrite_percentage = 100
+    auto_aof_rewrite_min_size = 64 * 1024 * 1024
+
+    # replicate the primary at (host, port) or at a unix socket path
+    replicaof = None
+    # replicas refuse write commands of clients
+    replica_read_only = True
+    # bytes of the latest write command stream kept for partial resynchronization of replicas
+    repl_backlog_size = 1024 * 1024
+    # a replica with more unsent bytes is disconnected, 0 means no limit
+    replica_output_buffer_limit = 256 * 1024 * 1024
+
+    # a pub/sub subscriber with more unsent bytes is disconnected, 0 means no limit
+    client_output_buffer_limit_pubsub = 32 * 1024 * 1024
+
+    # sets of integers up to this number of members use the compact encoding
+    set_max_intset_entries = 512
+    # hashes up to these number of fields and field or value length use the compact encoding
+    hash_max_listpack_entries = 128
+    hash_max_listpack_value = 64
+    # sorted sets up to these number of members and member length use the compact encoding
+    zset_max_listpack_entries = 128
+    zset_max_listpack_value = 64
+
+    # cluster mode, sequence of (host, port, first slot, last slot) of all the nodes,
+    # cluster_announce is the (host, port) of this node
+    cluster_nodes = ()
+    cluster_announce = None
+
+    def __init__(self, **options):
+        for name, value in options.items():
+            if name.startswith('_') or not hasattr(type(self), name):
+                raise ValueError('Unknown config option {}'.format(name))
+            setattr(self, name, value)
@@ -0,0 +1,87 @@
+from .keyspace import ACCESS_LRU, ACCESS_LFU, lfu_counter
+
+NOEVICTION = 'noeviction'
+POLICIES = (
+    NOEVICTION,
+    'allkeys-lru', 'allkeys-lfu', 'allkeys-random',
+    'volatile-lru', 'volatile-lfu', 'volatile-random', 'volatile-ttl',
+)
+
+# number of the best candidates remembered between evictions, the same as the real Redis
+EVICTION_POOL_SIZE = 16
+
+
+def access_policy(policy):
+    """
+    Kind of per key access tracking the policy needs
+    """
+    if policy.endswith('-lru'):
+        return ACCESS_LRU
+    if policy.endswith('-lfu'):
+        return ACCESS_LFU
+    return None
+
+
+class Evictor:
+    """
+    Approximated eviction: every round samples a few keys and adds them to a pool of the
+    best candidates seen so far, the best candidate still present in the keyspace is evicted
+    """
+
+    def __init__(self, policy, samples):
+        if policy not in POLICIES:
+            raise ValueError('Unknown maxmemory policy {}'.format(policy))
+        self.policy = policy
+        self.samples = samples
+        self.volatile = policy.startswith('volatile-')
+        self.pool = []
+
+    def candidate(self, keys):
+        """
+        Return the key to evict or None if the policy allows no eviction
+        """
+        if self.policy == NOEVICTION:
+            return None
+
+        sampled = keys.sample_volatile(self.samples) if self.volatile else keys.sample_keys(self.samples)
+        if self.policy.endswith('-random'):
+            return sampled[0] if sampled else None
+
+        for key in set(sampled):
+            self._insert(self._score(keys, key), key)
+
+        while self.pool:
+            score, key = self.pool.pop()
+            if key not in keys or (self.volatile and key not in keys.expires):
+                continue
+            # the key could be accessed after it got to the pool
+            current = self._score(keys, key)
+            if current < score:
+                self._insert(current, key)
+                continue
+            return key
+        return None
+
+    def _insert(self, score, key):
+        pool = self.pool
+        if len(pool) >= EVICTION_POOL_SIZE and score <= pool[0][0]:
+            return
+
+        # drop an outdated entry of the same key
+        pool[:] = [item for item in pool if item[1] != key]
+        pool.append((score, key))
+        pool.sort(key=lambda item: item[0])
+        if len(pool) > EVICTION_POOL_SIZE:
+            del pool[0]
+
+    def _score(self, keys, key):
+        """
+        The higher the score the better the eviction candidate
+        """
+        if self.policy == 'volatile-ttl':
+            return -keys.expires[key]
+
+        access = keys.access.get(key, 0)
+        if keys.access_policy == ACCESS_LFU:
+            return 255 - lfu_counter(access, keys.clock, keys.lfu_decay_time)
+        return keys.clock - access
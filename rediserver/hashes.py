@@ -0,0 +1,196 @@
+"""
+Hash value
+
+Small hashes are kept in a single bytes string of interleaved length prefixed fields
+and values, like the listpack encoding of Redis. A field or value shorter than 255 bytes
+has a one byte length, longer ones have 255 followed by a 32 bit length. A hash converts
+to a dict once it has too many fields or a too long field or value. Lookups in the string
+are linear, which is cheap at these sizes, and there is a single object per hash instead
+of two bytes objects per field
+"""
+import sys
+import struct
+
+HASH_MAX_LISTPACK_ENTRIES = 128
+HASH_MAX_LISTPACK_VALUE = 64
+
+ENCODING_LISTPACK = b'listpack'
+ENCODING_HASHTABLE = b'hashtable'
+
+LONG_LENGTH = 255
+_LONG = struct.Struct('<I')
+
+
+def encode_string(value):
+    length = len(value)
+    if length < LONG_LENGTH:
+        return bytes((length,)) + value
+    return bytes((LONG_LENGTH,)) + _LONG.pack(length) + value
+
+
+def string_bounds(data, pos):
+    """
+    Start and end of the length prefixed string at pos
+    """
+    length = data[pos]
+    pos += 1
+    if length == LONG_LENGTH:
+        length, = _LONG.unpack_from(data, pos)
+        pos += 4
+    return pos, pos + length
+
+
+def iter_strings(data):
+    pos = 0
+    end = len(data)
+    while pos < end:
+        start, pos = string_bounds(data, pos)
+        yield data[start:pos]
+
+
+class Hash:
+    """
+    Field -> value mapping of bytes, data is either the encoded string or a dict
+    """
+    # millions of small hashes are common, so the instance has no __dict__
+    __slots__ = ('data', 'length')
+
+    def __init__(self):
+        self.data = b''
+        # number of fields of the encoded string
+        self.length = 0
+
+    @classmethod
+    def from_items(cls, items, max_entries=HASH_MAX_LISTPACK_ENTRIES, max_value=HASH_MAX_LISTPACK_VALUE):
+        items = list(items)
+        value = cls()
+        if len(items) > max_entries or any(len(field) > max_value or len(item) > max_value
+                                           for field, item in items):
+            value.data = dict(items)
+        else:
+            value.data = b''.join(encode_string(field) + encode_string(item) for field, item in items)
+            value.length = len(items)
+        return value
+
+    @property
+    def encoding(self):
+        return ENCODING_HASHTABLE if type(self.data) is dict else ENCODING_LISTPACK
+
+    def locate(self, field):
+        """
+        (entry start, value start, entry end) of the field in the encoded string, None if it is missing
+        """
+        data = self.data
+        # most misses are found by a single substring search
+        if encode_string(field) not in data:
+            return None
+
+        size = len(field)
+        pos = 0
+        end = len(data)
+        while pos < end:
+            entry = pos
+            start, pos = string_bounds(data, pos)
+            found = pos - start == size and data.startswith(field, start)
+            value_start = pos
+            _, pos = string_bounds(data, pos)
+            if found:
+                return entry, value_start, pos
+        return None
+
+    def __len__(self):
+        if type(self.data) is dict:
+            return len(self.data)
+        return self.length
+
+    def __bool__(self):
+        return bool(self.data)
+
+    def __contains__(self, field):
+        if type(self.data) is dict:
+            return field in self.data
+        return self.locate(field) is not None
+
+    def __iter__(self):
+        if type(self.data) is dict:
+            return iter(self.data)
+        return iter([field for field, _ in self.items()])
+
+    def get(self, field):
+        data = self.data
+        if type(data) is dict:
+            return data.get(field)
+        location = self.locate(field)
+        if location is None:
+            return None
+        start, end = string_bounds(data, location[1])
+        return data[start:end]
+
+    def items(self):
+        data = self.data
+        if type(data) is dict:
+            return list(data.items())
+        strings = list(iter_strings(data))
+        return list(zip(strings[::2], strings[1::2]))
+
+    def set(self, field, value, max_entries=HASH_MAX_LISTPACK_ENTRIES, max_value=HASH_MAX_LISTPACK_VALUE):
+        """
+        Set the field, returns whether it is a new one
+        """
+        data = self.data
+        if type(data) is dict:
+            new = field not in data
+            data[field] = value
+            return new
+
+        location = self.locate(field)
+        if location is None and (self.length >= max_entries or len(field) > max_value) or len(value) > max_value:
+            self.data = dict(self.items())
+            return self.set(field, value)
+
+        entry = encode_string(field) + encode_string(value)
+        if location is None:
+            self.data = data + entry
+            self.length += 1
+            return True
+        start, _, end = location
+        self.data = data[:start] + entry + data[end:]
+        return False
+
+    def delete(self, field):
+        data = self.data
+        if type(data) is dict:
+            return data.pop(field, None) is not None
+
+        location = self.locate(field)
+        if location is None:
+            return False
+        start, _, end = location
+        self.data = data[:start] + data[end:]
+        self.length -= 1
+        return True
+
+    def structure_size(self):
+        """
+        Memory used by the encoded string or the dict, without the fields and values of the dict
+        """
+        return sys.getsizeof(self.data)
+
+    def copy(self):
+        value = Hash()
+        value.data = dict(self.data) if type(self.data) is dict else self.data
+        value.length = self.length
+        return value
+
+    def __deepcopy__(self, memo):
+        return self.copy()
+
+    def __eq__(self, other):
+        if isinstance(other, Hash):
+            return dict(self.items()) == dict(other.items())
+        if isinstance(other, dict):
+            return dict(self.items()) == other
+        return NotImplemented
+
+    def __repr__(self):
+        return 'Hash({!r})'.format(dict(self.items()))
@@ -0,0 +1,123 @@
+"""
+Set value of integer members
+
+Sets of integers are kept as a sorted array of 64 bit integers, like the intset encoding
+of Redis, 8 bytes per member instead of a bytes object and a hash table slot. Members are
+bytes outside, only the canonical decimal form of an integer (no sign, spaces or leading
+zeros) is stored as an integer. A set converts to the general set encoding once a
+non integer member is added or it grows past a size threshold
+"""
+import sys
+import random
+
+from array import array
+from bisect import bisect_left
+
+SET_MAX_INTSET_ENTRIES = 512
+
+ENCODING_INTSET = b'intset'
+
+INT64_MIN = -2 ** 63
+INT64_MAX = 2 ** 63 - 1
+
+
+def parse_member(member):
+    """
+    Integer of the member if it is the canonical form of a 64 bit integer, else None
+    """
+    if not member or len(member) > 20:
+        return None
+    try:
+        value = int(member)
+    except ValueError:
+        return None
+    if not INT64_MIN <= value <= INT64_MAX or b'%d' % value != member:
+        return None
+    return value
+
+
+class IntSet:
+    """
+    Sorted array of integers with the membership interface of a set of bytes
+    """
+
+    def __init__(self, values=()):
+        self.values = array('q', sorted(values))
+
+    @classmethod
+    def from_members(cls, members, max_entries=SET_MAX_INTSET_ENTRIES):
+        """
+        IntSet of the members if they are all integers and not too many, else None
+        """
+        if len(members) > max_entries:
+            return None
+        values = set()
+        for member in members:
+            value = parse_member(member)
+            if value is None:
+                return None
+            values.add(value)
+        return cls(values)
+
+    encoding = ENCODING_INTSET
+
+    def find(self, value):
+        values = self.values
+        index = bisect_left(values, value)
+        return index if index < len(values) and values[index] == value else -1
+
+    def __len__(self):
+        return len(self.values)
+
+    def __contains__(self, member):
+        value = parse_member(member)
+        return value is not None and self.find(value) >= 0
+
+    def __iter__(self):
+        return (b'%d' % value for value in self.values)
+
+    def add(self, member):
+        """
+        Add the member, it must be an integer. Returns whether it is a new one
+        """
+        value = parse_member(member)
+        values = self.values
+        index = bisect_left(values, value)
+        if index < len(values) and values[index] == value:
+            return False
+        values.insert(index, value)
+        return True
+
+    def discard(self, member):
+        value = parse_member(member)
+        if value is None:
+            return False
+        index = self.find(value)
+        if index < 0:
+            return False
+        del self.values[index]
+        return True
+
+    def pop(self):
+        return b'%d' % self.values.pop(random.randrange(len(self.values)))
+
+    def structure_size(self):
+        return sys.getsizeof(self.values)
+
+    def copy(self):
+        intset = IntSet()
+        intset.values = array('q', self.values)
+        return intset
+
+    def __deepcopy__(self, memo):
+        return self.copy()
+
+    def __eq__(self, other):
+        if isinstance(other, IntSet):
+            return self.values == other.values
+        if isinstance(other, (set, frozenset)):
+            return set(self) == other
+        return NotImplemented
+
+    def __repr__(self):
+        return 'IntSet({!r})'.format(list(self.values))
@@ -0,0 +1,435 @@
+import sys
+import time
+import random
+
+from array import array
+from bisect import bisect_left
+from collections import deque, namedtuple
+
+from .zset import SortedSet
+from .hashes import Hash, ENCODING_HASHTABLE
+from .intset import IntSet
+
+# collections not larger than this are returned by a single SSCAN call
+SCAN_SMALL_COLLECTION = 128
+# member positions of collection scans are hashes masked to this, 0 is the cursor of a new scan
+SCAN_POSITION_MASK = (1 << 62) - 1
+# number of collections whose scan orders are kept between the calls of a scan
+SCAN_ORDERS_CACHED = 64
+
+# approximate cost of the key slot in the dict and in the key tables
+KEY_OVERHEAD = 64
+
+ACCESS_LRU = 'lru'
+ACCESS_LFU = 'lfu'
+# LFU counter of a new key, so that fresh keys are not evicted immediately
+LFU_INIT_VAL = 5
+
+
+def estimate_size(key, value):
+    """
+    Approximate memory used by the key, collections are estimated by a single member
+    """
+    size = KEY_OVERHEAD + sys.getsizeof(key) + sys.getsizeof(value)
+    if isinstance(value, (bytes, int)):
+        return size
+
+    if isinstance(value, dict):
+        if value:
+            field = next(iter(value))
+            size += len(value) * (sys.getsizeof(field) + sys.getsizeof(value[field]))
+    elif isinstance(value, IntSet):
+        size += value.structure_size()
+    elif isinstance(value, Hash):
+        size += value.structure_size()
+        if value and value.encoding == ENCODING_HASHTABLE:
+            field = next(iter(value))
+            size += len(value) * (sys.getsizeof(field) + sys.getsizeof(value.get(field)))
+    elif isinstance(value, SortedSet):
+        if value:
+            size += len(value) * (sys.getsizeof(next(iter(value))) + value.entry_size())
+    elif isinstance(value, (set, frozenset, list, tuple, deque)) and value:
+        size += len(value) * sys.getsizeof(next(iter(value)))
+    return size
+
+
+def lfu_counter(access, now, decay_time):
+    """
+    LFU counter of the packed access value decremented by the elapsed decay periods
+    """
+    counter = access & 255
+    if decay_time:
+        elapsed = (now - (access >> 8)) & 0xFFFF
+        counter = max(counter - elapsed // decay_time, 0)
+    return counter
+
+
+def lfu_increment(counter, log_factor):
+    """
+    Logarithmic counter increment, the higher the counter the less likely it grows
+    """
+    if counter == 255:
+        return counter
+    base = max(counter - LFU_INIT_VAL, 0)
+    if random.random() < 1.0 / (base * log_factor + 1):
+        counter += 1
+    return counter
+
+
+class Keyspace(dict):
+    """
+    Redis keys storage
+
+    Besides the dict interface keeps the keys in an insertion ordered table addressed
+    by sequence numbers. SCAN cursors are sequence numbers, so a cursor needs no server
+    side state and survives deletions and table compaction
+
+    Expiration times are kept in the separate expires dict, the keys having a TTL
+    are also listed in a table used for random sampling by the active expire cycle
+
+    With track_memory the approximate size of every key is kept in sizes and summed
+    in used_memory. With an access policy every key has an int in access updated on
+    each hit: the LRU clock of the last access or the LFU counter packed with the
+    minute of its last decrement. The clock is updated by the server cron, so a hit
+    stores a shared int and allocates nothing
+    """
+
+    def __init__(self, track_memory=False, access_policy=None):
+        super().__init__()
+        # keys in insertion order, entries of deleted keys are dropped on compaction
+        self._order = []
+        self._seqs = array('q')
+        self._next_seq = 1
+        # key -> sequence number of its live entry in the order table
+        self._key_seqs = {}
+        # key -> unix time in milliseconds
+        self.expires = {}
+        # keys with a TTL, entries of persisted or deleted keys are dropped lazily
+        self._volatile = []
+
+        self.sizes = {} if track_memory else None
+        self.used_memory = 0
+        self.access_policy = access_policy
+        self.access = {} if access_policy else None
+        self.lfu_log_factor = 10
+        self.lfu_decay_time = 1
+        self.clock = 0
+        self.update_clock()
+
+    def __setitem__(self, key, value):
+        if key not in self:
+            self._order.append(key)
+            self._seqs.append(self._next_seq)
+            self._key_seqs[key] = self._next_seq
+            self._next_seq += 1
+            if len(self._order) > 2 * len(self) + 64:
+                self._compact()
+            if self.access is not None:
+                self.access[key] = self.clock if self.access_policy == ACCESS_LRU else (
+                    (self.clock << 8) | LFU_INIT_VAL
+                )
+        dict.__setitem__(self, key, value)
+
+        if self.sizes is not None:
+            self._account(key, value)
+
+    def __delitem__(self, key):
+        dict.__delitem__(self, key)
+        self._forget(key)
+
+    def pop(self, key, *default):
+        if key in self:
+            self._forget(key)
+        return dict.pop(self, key, *default)
+
+    def load(self, keys, values):
+        """
+        Bulk insert of parallel lists of keys and values
+        """
+        if self.sizes is not None or self.access is not None:
+            for key, value in zip(keys, values):
+                self[key] = value
+            return
+
+        # a key already present gets a second entry in the order table, only the latest is live
+        dict.update(self, zip(keys, values))
+        seqs = range(self._next_seq, self._next_seq + len(keys))
+        self._order.extend(keys)
+        self._seqs.extend(seqs)
+        self._key_seqs.update(zip(keys, seqs))
+        self._next_seq += len(keys)
+        if len(self._order) > 2 * len(self) + 64:
+            self._compact()
+
+    def _forget(self, key):
+        self._key_seqs.pop(key, None)
+        self.expires.pop(key, None)
+        if self.sizes is not None:
+            self.used_memory -= self.sizes.pop(key, 0)
+        if self.access is not None:
+            self.access.pop(key, None)
+
+    def _account(self, key, value):
+        size = estimate_size(key, value)
+        self.used_memory += size - self.sizes.get(key, 0)
+        self.sizes[key] = size
+
+    def resize(self, key):
+        """
+        Update the memory accounting after a value was modified in place
+        """
+        value = self.get(key)
+        if value is not None:
+            self._account(key, value)
+
+    def update_clock(self):
+        if self.access_policy == ACCESS_LFU:
+            # minutes, the resolution of the LFU decay
+            self.clock = int(time.monotonic() / 60) & 0xFFFF
+        else:
+            self.clock = int(time.monotonic() * 1000)
+
+    def touch(self, key):
+        """
+        Record an access to the key for the LRU/LFU eviction
+        """
+        access = self.access
+        if key not in access:
+            return
+        if self.access_policy == ACCESS_LRU:
+            access[key] = self.clock
+        else:
+            counter = lfu_counter(access[key], self.clock, self.lfu_decay_time)
+            access[key] = (self.clock << 8) | lfu_increment(counter, self.lfu_log_factor)
+
+    def sample_keys(self, count):
+        """
+        Return up to count random keys, the same key may be returned twice
+        """
+        keys = []
+        if not self:
+            return keys
+
+        # entries of deleted keys are skipped, too stale table is compacted
+        order = self._order
+        for _ in range(count * 4):
+            key = order[random.randrange(len(order))]
+            if key in self:
+                keys.append(key)
+                if len(keys) == count:
+                    return keys
+
+        if not keys:
+            self._compact()
+            return self.sample_keys(count)
+        return keys
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return dict.__getitem__(self, key)
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def clear(self):
+        dict.clear(self)
+        self._order = []
+        self._seqs = array('q')
+        self._key_seqs.clear()
+        self.expires.clear()
+        self._volatile = []
+        if self.sizes is not None:
+            self.sizes.clear()
+            self.used_memory = 0
+        if self.access is not None:
+            self.access.clear()
+
+    def set_expire(self, key, when):
+        expires = self.expires
+        if key not in expires:
+            self._volatile.append(key)
+            if len(self._volatile) > 2 * len(expires) + 64:
+                self._volatile = list(expires)
+                self._volatile.append(key)
+        expires[key] = when
+
+    def persist(self, key):
+        return self.expires.pop(key, None) is not None
+
+    def sample_volatile(self, count):
+        """
+        Return up to count random keys having a TTL, the same key may be returned twice
+        """
+        volatile = self._volatile
+        expires = self.expires
+        keys = []
+        while volatile and len(keys) < count:
+            index = random.randrange(len(volatile))
+            key = volatile[index]
+            if key in expires:
+                keys.append(key)
+            else:
+                volatile[index] = volatile[-1]
+                volatile.pop()
+        return keys
+
+    def _compact(self):
+        """
+        Drop entries of deleted keys, a key deleted and added again keeps its latest entry only
+        """
+        key_seqs = self._key_seqs
+        order = []
+        seqs = array('q')
+        for key, seq in zip(self._order, self._seqs):
+            if key_seqs.get(key) == seq:
+                order.append(key)
+                seqs.append(seq)
+        self._order = order
+        self._seqs = seqs
+
+    def scan(self, cursor, count):
+        """
+        Visit up to count entries starting at the cursor, returns the next cursor and live keys.
+        A key deleted and added again is reported by its latest entry only
+        """
+        order = self._order
+        seqs = self._seqs
+        key_seqs = self._key_seqs
+        index = bisect_left(seqs, cursor)
+        end = min(index + count, len(order))
+
+        keys = [key for key, seq in zip(order[index:end], seqs[index:end]) if key_seqs.get(key) == seq]
+        next_cursor = seqs[end] if end < len(order) else 0
+        return next_cursor, keys
+
+
+def copy_value(value):
+    """
+    Copy of a collection value, strings are immutable and returned as they are
+    """
+    type_ = type(value)
+    if type_ is bytes or type_ is int:
+        return value
+    if type_ is deque:
+        return deque(value)
+    if type_ is set:
+        return set(value)
+    return value.copy()
+
+
+class KeyspaceTemplate:
+    """
+    Dataset shared by copy on write clones (see Redis.load_template): the clones and the
+    instance it was created from keep the same value objects and copy a value before
+    the first write to its key, so the values of the template are never changed
+    """
+
+    def __init__(self, keys):
+        self.values = dict(keys)
+        self.expires = dict(keys.expires)
+
+    def __len__(self):
+        return len(self.values)
+
+    def shares(self, key, value):
+        return self.values.get(key) is value
+
+
+KeyChanges = namedtuple('KeyChanges', ('added', 'modified', 'deleted'))
+
+
+class ChangeTracker:
+    """
+    Keys touched by write commands since the tracker was created or cleared. Only the first
+    touch of a key is recorded, with whether the key existed then, the current keyspace tells
+    the rest
+    """
+
+    def __init__(self):
+        # key -> whether it existed at the first touch
+        self.existed = {}
+
+    def touch(self, key, existed):
+        if key not in self.existed:
+            self.existed[key] = existed
+
+    def changes(self, keys):
+        """
+        KeyChanges of sets of keys compared to the keyspace, a key added and deleted again is left out
+        """
+        added, modified, deleted = set(), set(), set()
+        for key, existed in self.existed.items():
+            exists = key in keys
+            if exists:
+                (modified if existed else added).add(key)
+            elif existed:
+                deleted.add(key)
+        return KeyChanges(added, modified, deleted)
+
+    def clear(self):
+        self.existed = {}
+
+
+def scan_position(member):
+    return (hash(member) & SCAN_POSITION_MASK) + 1
+
+
+class ScanOrder:
+    """
+    Members of a collection sorted by their scan position, a hash of the member
+    """
+
+    def __init__(self, values):
+        pairs = sorted((scan_position(member), member) for member in values)
+        self.positions = array('q', [position for position, _ in pairs])
+        self.members = [member for _, member in pairs]
+
+
+class CollectionScans:
+    """
+    Cursors over collection values (SSCAN, HSCAN). Like keyspace cursors they need no server
+    side state: a cursor is the position of the next member, and the position of a member
+    doesn't depend on the other members, so deletes don't make a scan skip members. The
+    orders of recently scanned collections are kept so that a call costs O(log n + count),
+    a scan starting over or a collection replaced by another object rebuilds the order.
+    Members added after the order was built are not returned, which the SCAN guarantees allow
+    """
+
+    def __init__(self):
+        # key -> (value, ScanOrder)
+        self.orders = {}
+
+    def scan(self, key, values, cursor, count):
+        """
+        Visit up to count members starting at the cursor, returns the next cursor and live members
+        """
+        if cursor == 0 and len(values) <= max(count, SCAN_SMALL_COLLECTION):
+            return 0, list(values)
+
+        entry = self.orders.get(key)
+        if cursor == 0 or entry is None or entry[0] is not values:
+            order = ScanOrder(values)
+            self.orders.pop(key, None)
+            if len(self.orders) >= SCAN_ORDERS_CACHED:
+                del self.orders[next(iter(self.orders))]
+            self.orders[key] = (values, order)
+        else:
+            order = entry[1]
+
+        positions = order.positions
+        index = bisect_left(positions, cursor)
+        end = min(index + count, len(positions))
+        # members of the same position are returned by the same call
+        while end < len(positions) and positions[end] == positions[end - 1]:
+            end += 1
+
+        members = [member for member in order.members[index:end] if member in values]
+        if end < len(positions):
+            return positions[end], members
+        del self.orders[key]
+        return 0, members
+
+    def clear(self):
+        self.orders = {}
@@ -0,0 +1,90 @@
+import re
+
+from functools import lru_cache
+
+_SPECIAL = frozenset(b'*?[\\')
+
+
+def _translate(pattern):
+    regex = []
+    index = 0
+    length = len(pattern)
+
+    while index < length:
+        char = pattern[index]
+        index += 1
+
+        if char == ord('*'):
+            while index < length and pattern[index] == ord('*'):
+                index += 1
+            regex.append(b'.*')
+        elif char == ord('?'):
+            regex.append(b'.')
+        elif char == ord('\\') and index < length:
+            regex.append(re.escape(pattern[index:index + 1]))
+            index += 1
+        elif char == ord('['):
+            end = pattern.find(b']', index + 1 if pattern[index:index + 1] in (b'^', b']') else index)
+            if end == -1:
+                regex.append(re.escape(b'['))
+                continue
+
+            body = pattern[index:end]
+            start = index - 1
+            index = end + 1
+            negate = body.startswith(b'^')
+            if negate:
+                body = body[1:]
+            if not body:
+                # an empty class like [^] is taken literally, like an unterminated one
+                regex.append(re.escape(pattern[start:index]))
+                continue
+
+            items = []
+            position = 0
+            while position < len(body):
+                if body[position] == ord('\\') and position + 1 < len(body):
+                    items.append(re.escape(body[position + 1:position + 2]))
+                    position += 2
+                elif body[position + 1:position + 2] == b'-' and position + 2 < len(body):
+                    low, high = sorted((body[position:position + 1], body[position + 2:position + 3]))
+                    items.append(re.escape(low) + b'-' + re.escape(high))
+                    position += 3
+                else:
+                    items.append(re.escape(body[position:position + 1]))
+                    position += 1
+
+            regex.append(b'[' + (b'^' if negate else b'') + b''.join(items) + b']')
+        else:
+            regex.append(re.escape(pattern[index - 1:index]))
+
+    return b''.join(regex)
+
+
+def literal_prefix(pattern):
+    """
+    The leading part of the pattern without special characters, every match starts with it
+    """
+    for index, char in enumerate(pattern):
+        if char in _SPECIAL:
+            return bytes(pattern[:index])
+    return bytes(pattern)
+
+
+@lru_cache(maxsize=1024)
+def compile_pattern(pattern):
+    """
+    Compile a Redis glob-style pattern into a predicate over bytes
+    """
+    pattern = bytes(pattern)
+
+    if not _SPECIAL.intersection(pattern):
+        return pattern.__eq__
+
+    prefix = pattern[:-1]
+    if pattern.endswith(b'*') and not _SPECIAL.intersection(prefix):
+        return lambda value: value.startswith(prefix)
+
+    match = re.compile(_translate(pattern), re.DOTALL).fullmatch
+    return lambda value: match(value) is not None
+
@@ -0,0 +1,169 @@
+"""
+Publish/subscribe
+
+Messages are encoded once per PUBLISH and the same bytes are written to every subscriber.
+Pattern subscriptions are indexed by their literal prefix (the part before the first
+special character), so a message is matched only against the patterns whose prefix
+starts its channel name
+
+Subscribers are connections (see queue.CommandQueue) having channels and patterns sets
+maintained here and a deliver(data) method returning False when the connection was
+dropped for exceeding its output buffer limit
+"""
+from . import resp
+from .pattern import compile_pattern, literal_prefix
+
+
+def encode_message(channel, message):
+    return b'*3\r\n$7\r\nmessage\r\n$%d\r\n%s\r\n$%d\r\n%s\r\n' % (len(channel), channel, len(message), message)
+
+
+def encode_pmessage(pattern, channel, message):
+    return b'*4\r\n$8\r\npmessage\r\n$%d\r\n%s\r\n$%d\r\n%s\r\n$%d\r\n%s\r\n' % (
+        len(pattern), pattern, len(channel), channel, len(message), message)
+
+
+class PubSub:
+    def __init__(self):
+        # channel -> subscribers, dicts are used as insertion ordered sets
+        self.channels = {}
+        # pattern -> subscribers
+        self.patterns = {}
+        self.matchers = {}
+        # literal prefix -> patterns, and the distinct prefix lengths in ascending order
+        self.prefixes = {}
+        self.prefix_lengths = []
+
+    def subscribe(self, subscriber, channel):
+        if channel in subscriber.channels:
+            return
+        subscriber.channels.add(channel)
+        self.channels.setdefault(channel, {})[subscriber] = None
+
+    def unsubscribe(self, subscriber, channel):
+        if channel not in subscriber.channels:
+            return
+        subscriber.channels.discard(channel)
+        subscribers = self.channels[channel]
+        del subscribers[subscriber]
+        if not subscribers:
+            del self.channels[channel]
+
+    def psubscribe(self, subscriber, pattern):
+        if pattern in subscriber.patterns:
+            return
+        subscriber.patterns.add(pattern)
+        subscribers = self.patterns.get(pattern)
+        if subscribers is None:
+            subscribers = self.patterns[pattern] = {}
+            self.matchers[pattern] = compile_pattern(pattern)
+            self.prefixes.setdefault(literal_prefix(pattern), set()).add(pattern)
+            self.update_prefix_lengths()
+        subscribers[subscriber] = None
+
+    def punsubscribe(self, subscriber, pattern):
+        if pattern not in subscriber.patterns:
+            return
+        subscriber.patterns.discard(pattern)
+        subscribers = self.patterns[pattern]
+        del subscribers[subscriber]
+        if subscribers:
+            return
+
+        del self.patterns[pattern]
+        del self.matchers[pattern]
+        prefix = literal_prefix(pattern)
+        patterns = self.prefixes[prefix]
+        patterns.discard(pattern)
+        if not patterns:
+            del self.prefixes[prefix]
+            self.update_prefix_lengths()
+
+    def update_prefix_lengths(self):
+        self.prefix_lengths = sorted({len(prefix) for prefix in self.prefixes})
+
+    def unsubscribe_all(self, subscriber):
+        for channel in list(subscriber.channels):
+            self.unsubscribe(subscriber, channel)
+        for pattern in list(subscriber.patterns):
+            self.punsubscribe(subscriber, pattern)
+
+    def matching_patterns(self, channel):
+        prefixes = self.prefixes
+        matchers = self.matchers
+        for length in self.prefix_lengths:
+            if length > len(channel):
+                break
+            for pattern in prefixes.get(channel[:length], ()):
+                if matchers[pattern](channel):
+                    yield pattern
+
+    def publish(self, channel, message):
+        """
+        Deliver the message to the subscribers of the channel and of the matching patterns,
+        returns the number of receivers
+        """
+        receivers = 0
+        dropped = []
+
+        subscribers = self.channels.get(channel)
+        if subscribers:
+            data = encode_message(channel, message)
+            for subscriber in subscribers:
+                if subscriber.deliver(data):
+                    receivers += 1
+                else:
+                    dropped.append(subscriber)
+
+        if self.prefix_lengths:
+            for pattern in list(self.matching_patterns(channel)):
+                data = encode_pmessage(pattern, channel, message)
+                for subscriber in self.patterns[pattern]:
+                    if subscriber.deliver(data):
+                        receivers += 1
+                    else:
+                        dropped.append(subscriber)
+
+        for subscriber in dropped:
+            self.unsubscribe_all(subscriber)
+        return receivers
+
+    def execute_channels(self, pattern=None):
+        if pattern is None:
+            return list(self.channels)
+        match = compile_pattern(pattern)
+        return [channel for channel in self.channels if match(channel)]
+
+    def execute_numsub(self, *channels):
+        result = []
+        for channel in channels:
+            result.append(channel)
+            result.append(len(self.channels.get(channel, ())))
+        return result
+
+    def execute_numpat(self):
+        return len(self.patterns)
+
+
+def subscription_replies(pubsub, subscriber, kind, names):
+    """
+    Replies of the (P)SUBSCRIBE and (P)UNSUBSCRIBE commands, one per channel or pattern
+    """
+    action = {
+        b'subscribe': pubsub.subscribe,
+        b'unsubscribe': pubsub.unsubscribe,
+        b'psubscribe': pubsub.psubscribe,
+        b'punsubscribe': pubsub.punsubscribe,
+    }[kind]
+
+    if not names:
+        # unsubscribe from everything
+        names = list(subscriber.channels if kind == b'unsubscribe' else subscriber.patterns)
+        if not names:
+            return resp.Replies([[kind, None, len(subscriber.channels) + len(subscriber.patterns)]])
+
+    replies = resp.Replies()
+    for name in names:
+        action(subscriber, name)
+        replies.append([kind, name, len(subscriber.channels) + len(subscriber.patterns)])
+    return replies
@@ -1,4 +1,15 @@
 from . import resp
+from .pubsub import subscription_replies
+from .blocking import Blocked
+
+SUBSCRIPTION_COMMANDS = {
+    b'SUBSCRIBE': b'subscribe',
+    b'UNSUBSCRIBE': b'unsubscribe',
+    b'PSUBSCRIBE': b'psubscribe',
+    b'PUNSUBSCRIBE': b'punsubscribe',
+}
+# commands allowed once a connection is subscribed
+SUBSCRIBER_COMMANDS = frozenset(SUBSCRIPTION_COMMANDS) | {b'PING'}
 
 
 class CommandQueue:
@@ -6,37 +17,133 @@ class CommandQueue:
     A simple abstraction to support transactions
     """
 
-    def __init__(self, redis_server):
+    def __init__(self, redis_server, writer=None):
         self.redis = redis_server
+        # connection stream writer, replicas take the connection over
+        self.writer = writer
         self.transaction = None
         self.watch = set()
         self.rollback = False
+        # the next command may be served for an importing slot, see cluster.Cluster.route
+        self.asking = False
+        # reads of the slots of the replicated primary are allowed in cluster mode
+        self.readonly = False
+        # pub/sub subscriptions, maintained by pubsub.PubSub
+        self.channels = set()
+        self.patterns = set()
 
     def reset(self):
         self.transaction = None
         self.rollback = False
+        self.unwatch()
+
+    def unwatch(self):
+        for key in self.watch:
+            self.redis.remove_watch(self, key)
         self.watch.clear()
-        self.redis.remove_watch(self)
 
     def on_change(self, key):
-        if key in self.watch:
-            self.rollback = True
+        # called by redis only for the keys registered by this queue
+        self.rollback = True
+
+    def deliver(self, data):
+        """
+        Write a pub/sub message, a subscriber over the output buffer limit is disconnected
+        """
+        transport = self.writer.transport
+        if transport.is_closing():
+            return False
+        self.writer.write(data)
+        limit = self.redis.config.client_output_buffer_limit_pubsub
+        if limit and transport.get_write_buffer_size() > limit:
+            transport.abort()
+            return False
+        return True
+
+    def execute_subscription(self, command, args):
+        kind = SUBSCRIPTION_COMMANDS[command]
+        if not args and kind in (b'subscribe', b'psubscribe'):
+            raise resp.Error('ERR', "wrong number of arguments for '{}' command".format(kind.decode()))
+        if self.writer is None:
+            raise resp.Error('ERR', '{} is only allowed over a connection'.format(command.decode()))
+        return subscription_replies(self.redis.pubsub, self, kind, args)
 
     def execute(self, command, *command_args):
+        # the connection commands are matched by name, like the others they are case insensitive
+        command = command.upper()
+        if self.channels or self.patterns:
+            if command not in SUBSCRIBER_COMMANDS:
+                raise resp.Error('ERR', "Can't execute '{}': only (P)SUBSCRIBE / (P)UNSUBSCRIBE / "
+                                        "PING / QUIT / RESET are allowed in this context".format(command.decode().lower()))
+            if command == b'PING':
+                return [b'pong', command_args[0] if command_args else b'']
+        if command in SUBSCRIPTION_COMMANDS:
+            return self.execute_subscription(command, command_args)
+
         if command == b'UNWATCH':
-            self.watch.clear()
-            self.redis.remove_watch(self)
+            self.unwatch()
+            return resp.OK
+        if command == b'DISCARD':
+            if self.transaction is None:
+                raise resp.Error('ERR', 'DISCARD without MULTI')
+            self.reset()
+            return resp.OK
+        if command == b'ASKING':
+            if self.redis.cluster is None:
+                raise resp.Error('ERR', 'This instance has cluster support disabled')
+            self.asking = True
             return resp.OK
 
+        if command == b'READONLY':
+            self.readonly = True
+            return resp.OK
+        if command == b'READWRITE':
+            self.readonly = False
+            return resp.OK
+        if command in (b'PSYNC', b'SYNC'):
+            replid, offset = command_args if len(command_args) == 2 else (None, -1)
+            try:
+                offset = int(offset)
+            except ValueError:
+                raise resp.Errors.NOT_INT
+            return self.redis.replication.sync(self.writer, replid, offset)
+
+        if self.redis.cluster is not None or self.redis.read_only:
+            asking = self.asking
+            self.asking = False
+            self.route(command, command_args, asking)
+
         if self.transaction is None:
             return self.execute_without_transaction(command, *command_args)
         return self.execute_with_transaction(command, *command_args)
 
+    def route(self, command, args, asking):
+        """
+        Refuse writes on read only replicas and redirect keys of other cluster nodes
+        """
+        redis = self.redis
+        if command in (b'MULTI', b'EXEC'):
+            return
+        if command == b'WATCH':
+            keys = args
+            write = False
+        else:
+            spec = redis.lookup_command(command).spec
+            write = spec.write
+            if write and redis.read_only:
+                raise resp.Errors.READONLY
+            keys = spec.get_keys(args)
+
+        if redis.cluster is not None:
+            redis.cluster.route(keys, redis.keys, asking, read=self.readonly and not write)
+
     def execute_with_transaction(self, command, *args):
         assert self.transaction is not None
 
         if command == b'MULTI':
             raise NotImplementedError()
+        if command == b'WATCH':
+            return resp.Error('ERR', 'WATCH inside MULTI is not allowed')
         if command == b'EXEC':
             to_execute = self.transaction
             rollback = self.rollback
@@ -47,9 +154,9 @@ class CommandQueue:
 
             result = []
             for current_command, current_args in to_execute:
-                result.append(
-                    self.redis.execute_single(current_command, *current_args)
-                )
+                reply = self.redis.execute_single(current_command, *current_args)
+                # blocking commands do not block inside a transaction
+                result.append(resp.NIL if type(reply) is Blocked else reply)
             return result
 
         self.transaction.append((command, args))
@@ -58,13 +165,19 @@ class CommandQueue:
     def execute_without_transaction(self, command, *args):
         assert self.transaction is None
 
+        if command == b'EXEC':
+            raise resp.Error('ERR', 'EXEC without MULTI')
         if command == b'MULTI':
             # start transaction
             self.transaction = []
             return resp.OK
         if command == b'WATCH':
-            self.watch.add(args[0])
-            self.redis.add_watch(self)
+            if not args:
+                raise resp.Error('ERR', "wrong number of arguments for 'watch' command")
+            for key in args:
+                if key not in self.watch:
+                    self.watch.add(key)
+                    self.redis.add_watch(self, key)
             return resp.OK
 
         return self.redis.execute_single(command, *args)
@@ -1,184 +1,1482 @@
+import os
+import sys
+import signal
+import time
 import inspect
-import hashlib
 
-from lupa import LuaRuntime
+from collections import deque
+from itertools import islice
 
+from . import aof
 from . import resp
+from . import snapshot
+from .config import Config
+from .cluster import Cluster, CLUSTER_SLOTS, key_hash_slot
+from .replication import Replication
+from .pubsub import PubSub
+from .blocking import BlockingQueues, Blocked, parse_timeout
+from .scripting import ScriptRuntime, script_sha
+from .zset import SortedSet
+from .hashes import Hash
+from .intset import IntSet, parse_member, INT64_MIN, INT64_MAX
+from .keyspace import Keyspace, KeyspaceTemplate, ChangeTracker, CollectionScans, copy_value, estimate_size
+from .eviction import Evictor, access_policy
+from .pattern import compile_pattern
 
 
 class KeyType:
-    def __init__(self, type_):
+    def __init__(self, type_, name=None):
         self.type_ = type_
+        self.name = name
 
 
+# the argument is a key, any key type is accepted
+KEY = object()
 MUTABLE_KEY = object()
-KEY_SET = KeyType(set)
-KEY_STRING = KeyType(bytes)
+# the varargs alternate keys and values
+KEY_VALUE_PAIRS = object()
+KEY_LIST = KeyType(deque, b'list')
+KEY_SET = KeyType((set, IntSet), b'set')
+# strings looking like integers are stored as int
+KEY_STRING = KeyType((bytes, int), b'string')
+KEY_ZSET = KeyType(SortedSet, b'zset')
+KEY_HASH = KeyType(Hash, b'hash')
+KEY_TYPES = (KEY_STRING, KEY_LIST, KEY_SET, KEY_ZSET, KEY_HASH)
 
+SCAN_DEFAULT_COUNT = 10
 
-def redis_command(command):
-    def wrapper(func):
+ZADD_FLAGS = frozenset((b'NX', b'XX', b'GT', b'LT', b'CH', b'INCR'))
+
+# active expire cycle samples keys with a TTL by this amount, the cycle continues
+# while more than a quarter of the sampled keys were expired
+ACTIVE_EXPIRE_KEYS_PER_LOOP = 20
+# share of the cron interval the active expire cycle is allowed to use
+ACTIVE_EXPIRE_CYCLE_SHARE = 0.25
+
+# Upper bound for spelling variants of command names remembered by the lookup cache
+COMMAND_CACHE_SIZE = 1024
+
+
+class CommandSpec:
+    """
+    Command properties resolved once from the handler signature:
+    arity, key positions, key type checks and mutated keys
+    """
+
+    def __init__(self, name, func, denyoom=None, propagate=None, keys=None, write=None):
         info = inspect.getfullargspec(func)
+        # the first argument is the redis instance
+        positional = info.args[1:]
 
-        mutable_keys = []
-        key_types = {}
-        for arg, annotation in info.annotations.items():
+        self.name = name
+        self.func = func
+        self.min_args = len(positional) - len(info.defaults or ())
+        self.max_args = sys.maxsize if info.varargs else len(positional)
+
+        # (position, type) pairs for fixed arguments, varargs are described by rest_* fields
+        self.key_types = []
+        self.mutable_keys = []
+        self.key_positions = []
+        self.rest_start = len(positional)
+        self.rest_type = None
+        self.rest_key = False
+        self.rest_mutable = False
+        self.rest_step = 1
+
+        for index, arg in enumerate(positional + [info.varargs]):
+            if arg is None or arg not in info.annotations:
+                continue
+
+            annotation = info.annotations[arg]
             if not isinstance(annotation, tuple):
                 annotation = (annotation,)
 
+            is_rest = arg == info.varargs
             for prop in annotation:
+                if prop is KEY_VALUE_PAIRS and is_rest:
+                    self.rest_step = 2
                 if prop is MUTABLE_KEY:
-                    mutable_keys.append(arg)
+                    if is_rest:
+                        self.rest_mutable = True
+                    else:
+                        self.mutable_keys.append(index)
                 if isinstance(prop, KeyType):
-                    key_types[arg] = prop.type_
-
-        def new_func(self, *args, **kwargs):
-            values = {}
-            values.update(kwargs)
-            for index, arg_value in enumerate(args, start=1):
-                if index >= len(info.args):
-                    # varargs
-                    break
-                values[info.args[index]] = arg_value
+                    if is_rest:
+                        self.rest_type = prop.type_
+                    else:
+                        self.key_types.append((index, prop.type_))
+
+            if is_rest:
+                self.rest_key = True
+            else:
+                self.key_positions.append(index)
+
+        self.mutable = bool(self.mutable_keys) or self.rest_mutable
+        # the command may grow memory usage, so it is refused when the memory is over the limit
+        self.denyoom = self.mutable if denyoom is None else denyoom
+        # the command is logged to the append only file as is, handlers of non deterministic
+        # commands disable it and propagate their effects themselves
+        self.propagate = self.mutable if propagate is None else propagate
+        # blocking commands modify their keys through other commands, they are still writes
+        self.write = (self.mutable or self.propagate) if write is None else write
+        # keys of commands with a variable key layout, args -> keys
+        self.find_keys = keys
+
+    def get_keys(self, args):
+        if self.find_keys is not None:
+            return self.find_keys(args)
+        keys = [args[index] for index in self.key_positions if index < len(args)]
+        if self.rest_key:
+            keys.extend(args[self.rest_start::self.rest_step])
+        return keys
+
+    def info(self):
+        """
+        COMMAND reply entry: name, arity, flags, first key, last key, key step
+        """
+        arity = self.min_args + 1
+        if self.max_args != self.min_args:
+            arity = -arity
+
+        flags = [b'write' if self.write else b'readonly']
+        if self.denyoom:
+            flags.append(b'denyoom')
+
+        first = last = step = 0
+        if self.find_keys is not None:
+            flags.append(b'movablekeys')
+        elif self.key_positions or self.rest_key:
+            positions = self.key_positions
+            first = (positions[0] if positions else self.rest_start) + 1
+            last = -1 if self.rest_key else positions[-1] + 1
+            if self.rest_key:
+                step = self.rest_step
+            else:
+                step = positions[1] - positions[0] if len(positions) > 1 else 1
+
+        return [self.name.lower().encode(), arity, flags, first, last, step]
+
+    def arity_error(self):
+        return resp.Error('ERR', "wrong number of arguments for '{}' command".format(self.name.lower()))
+
+    def compile(self, redis):
+        """
+        Build the dispatch function of the command bound to the redis instance
+        """
+        func = self.func
+        command = self.name.encode()
+        min_args = self.min_args
+        max_args = self.max_args
+        key_positions = tuple(self.key_positions)
+        key_types = tuple(self.key_types)
+        mutable_keys = tuple(self.mutable_keys)
+        rest_start = self.rest_start
+        rest_key = self.rest_key
+        rest_type = self.rest_type
+        rest_mutable = self.rest_mutable
+        rest_step = self.rest_step
+        single_mutable_key = len(mutable_keys) == 1 and not rest_mutable
+        arity_error = self.arity_error()
+
+        denyoom = self.denyoom
+        mutable = self.mutable
+        propagate = self.propagate
+        config = redis.config
+
+        if not key_positions and not rest_key:
+            def dispatch(*args):
+                if not min_args <= len(args) <= max_args:
+                    raise arity_error
+                result = func(redis, *args)
+                if propagate and redis.propagation_targets:
+                    redis.propagate(command, args)
+                return result
+            dispatch.spec = self
+            return dispatch
+
+        def dispatch(*args):
+            if not min_args <= len(args) <= max_args:
+                raise arity_error
 
-            for key in mutable_keys:
-                self.on_change(values[key])
+            keys = redis.keys
+            if keys.expires:
+                for index in key_positions:
+                    redis.expire_if_needed(args[index])
+                if rest_key:
+                    for key in args[rest_start::rest_step]:
+                        redis.expire_if_needed(key)
 
-            for key, key_type in key_types.items():
-                self.assert_key_type(values[key], key_type)
+            if denyoom and config.maxmemory and keys.used_memory > config.maxmemory and not redis.loading:
+                if not redis.free_memory():
+                    raise resp.Errors.OOM
+
+            for index, type_ in key_types:
+                value = keys.get(args[index])
+                if value is not None and not isinstance(value, type_):
+                    raise resp.Errors.WRONGTYPE
+            if rest_type is not None:
+                for key in args[rest_start::rest_step]:
+                    value = keys.get(key)
+                    if value is not None and not isinstance(value, rest_type):
+                        raise resp.Errors.WRONGTYPE
+
+            if keys.access is not None:
+                for index in key_positions:
+                    keys.touch(args[index])
+                if rest_key:
+                    for key in args[rest_start::rest_step]:
+                        keys.touch(key)
+
+            if not mutable:
+                result = func(redis, *args)
+                if propagate and redis.propagation_targets:
+                    redis.propagate(command, args)
+                return result
+
+            if single_mutable_key:
+                changed = (args[mutable_keys[0]],)
+            else:
+                changed = [args[index] for index in mutable_keys]
+                if rest_mutable:
+                    changed.extend(args[rest_start::rest_step])
+            if redis.template is not None:
+                for key in changed:
+                    redis.copy_on_write(key)
+            # the trackers need the state of the keys before the command
+            existed = [key in keys for key in changed] if redis.trackers else None
+            redis.unchanged = False
+
+            result = func(redis, *args)
+            # writes which changed nothing, like a failed SET NX, are not seen by the watchers and trackers
+            if not redis.unchanged:
+                redis.dirty += 1
+                if redis.watched_keys or existed is not None:
+                    for index, key in enumerate(changed):
+                        redis.on_change(key, None if existed is None else existed[index])
+            if propagate and redis.propagation_targets:
+                redis.propagate(command, args)
+
+            if keys.sizes is not None:
+                for key in changed:
+                    keys.resize(key)
+
+            return result
+
+        dispatch.spec = self
+        return dispatch
+
+
+def key_type_name(value):
+    for key_type in KEY_TYPES:
+        if isinstance(value, key_type.type_):
+            return key_type.name
+    return b'none'
+
+
+def object_encoding(value):
+    encoding = getattr(value, 'encoding', None)
+    if encoding is not None:
+        return encoding
+    if isinstance(value, bytes):
+        return b'embstr' if len(value) <= 44 else b'raw'
+    if isinstance(value, int):
+        return b'int'
+    if isinstance(value, deque):
+        return b'quicklist'
+    return b'hashtable'
+
+
+def encode_string(value):
+    """
+    Stored form of a string value, the canonical form of a 64 bit integer is stored as int
+    """
+    if 0 < len(value) <= 18 and value.isdigit() and (value[0] != 48 or len(value) == 1):
+        return int(value)
+    if len(value) <= 20 and (value[:1] == b'-' or value.isdigit()):
+        integer = parse_member(value)
+        if integer is not None:
+            return integer
+    return value
+
+
+def string_bytes(value):
+    """
+    Bytes of a stored string value
+    """
+    return value if type(value) is bytes else b'%d' % value
+
+
+def parse_scan_args(args, allow_type=False):
+    """
+    Parse MATCH, COUNT and TYPE options of the SCAN family commands
+    """
+    count = SCAN_DEFAULT_COUNT
+    match = None
+    type_name = None
+
+    if len(args) % 2:
+        raise resp.Errors.SYNTAX
+
+    for option, value in zip(args[::2], args[1::2]):
+        option = option.upper()
+        if option == b'COUNT':
+            try:
+                count = int(value)
+            except ValueError:
+                raise resp.Errors.NOT_INT
+            if count < 1:
+                raise resp.Errors.SYNTAX
+        elif option == b'MATCH':
+            match = None if value == b'*' else compile_pattern(value)
+        elif option == b'TYPE' and allow_type:
+            type_name = value.lower()
+        else:
+            raise resp.Errors.SYNTAX
 
-            return func(self, *args, **kwargs)
+    return count, match, type_name
 
-        new_func.redis_command = command
-        return new_func
+
+def child_exited(pid):
+    """
+    Poll a background child process, returns None while it runs, else whether it succeeded
+    """
+    exited, status = os.waitpid(pid, os.WNOHANG)
+    if exited == 0:
+        return None
+    return os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0
+
+
+def now_ms():
+    return int(time.time() * 1000)
+
+
+def parse_int(value):
+    try:
+        return int(value)
+    except ValueError:
+        raise resp.Errors.NOT_INT
+
+
+def parse_int64(value):
+    result = parse_int(value)
+    if not INT64_MIN <= result <= INT64_MAX:
+        raise resp.Errors.NOT_INT
+    return result
+
+
+def parse_float(value):
+    try:
+        result = float(value)
+    except ValueError:
+        raise resp.Errors.NOT_FLOAT
+    if result != result:
+        raise resp.Errors.NOT_FLOAT
+    return result
+
+
+def format_float(value):
+    """
+    Float reply like Redis formats it: integral values without a fractional part
+    """
+    if value.is_integer() and abs(value) < 1e17:
+        return b'%d' % value
+    if value in (float('inf'), float('-inf')):
+        return b'inf' if value > 0 else b'-inf'
+    return repr(value).encode()
+
+
+def parse_score_bound(value):
+    """
+    ZRANGE BYSCORE bound, returns (score, inclusive), ( prefix makes it exclusive
+    """
+    inclusive = not value.startswith(b'(')
+    try:
+        score = float(value if inclusive else value[1:])
+    except ValueError:
+        raise resp.Error('ERR', 'min or max is not a float')
+    if score != score:
+        raise resp.Error('ERR', 'min or max is not a float')
+    return score, inclusive
+
+
+def parse_lex_bound(value):
+    """
+    ZRANGE BYLEX bound, returns (member, inclusive), None member for - and +
+    """
+    if value in (b'-', b'+'):
+        return value, True
+    if value.startswith(b'['):
+        return value[1:], True
+    if value.startswith(b'('):
+        return value[1:], False
+    raise resp.Error('ERR', 'min or max not valid string range item')
+
+
+def parse_direction(value):
+    """
+    LEFT or RIGHT argument of the list commands, True for LEFT
+    """
+    direction = value.upper()
+    if direction not in (b'LEFT', b'RIGHT'):
+        raise resp.Errors.SYNTAX
+    return direction == b'LEFT'
+
+
+def list_bounds(length, start, stop):
+    """
+    Start and exclusive end of the inclusive LRANGE/LTRIM indexes, negative ones count from the end
+    """
+    start = parse_int(start)
+    stop = parse_int(stop)
+    if start < 0:
+        start = max(start + length, 0)
+    if stop < 0:
+        stop += length
+    return start, min(stop, length - 1) + 1
+
+
+def parse_cursor(cursor):
+    try:
+        cursor = int(cursor)
+    except ValueError:
+        raise resp.Errors.INVALID_CURSOR
+    if cursor < 0:
+        raise resp.Errors.INVALID_CURSOR
+    return cursor
+
+
+def script_keys(args):
+    """
+    Keys of EVAL and EVALSHA are the numkeys arguments following the script
+    """
+    try:
+        num_keys = int(args[1])
+    except (IndexError, ValueError):
+        return ()
+    return args[2:2 + num_keys]
+
+
+def blocking_keys(args):
+    """
+    Keys of blocking commands taking the timeout as the last argument
+    """
+    return args[:-1]
+
+
+def redis_command(command, denyoom=None, propagate=None, keys=None, write=None):
+    """
+    Mark the method as a handler of the command, the dispatch function
+    is compiled once per Redis instance from the handler signature
+    """
+    def wrapper(func):
+        func.redis_command = command
+        func.command_spec = CommandSpec(command, func, denyoom=denyoom, propagate=propagate, keys=keys, write=write)
+        return func
     return wrapper
 
 
 class Redis:
-    def __init__(self):
-        self.keys = {}
+    def __init__(self, config=None):
+        self.config = config or Config()
+        self.evictor = Evictor(self.config.maxmemory_policy, self.config.maxmemory_samples)
+        self.keys = self.create_keyspace()
         self.scripts = {}
-        self.watches = set()
+        self.script_sources = {}
+        # number of changes since the last snapshot
+        self.dirty = 0
+        # set by the handler of a write command which changed nothing, e.g. SET NX of an existing key
+        self.unchanged = False
+        self.lastsave = int(time.time())
+        self.bgsave_child = None
+        self.dirty_before_bgsave = 0
+        self.aof = None
+        self.aof_rewrite_child = None
+        self.aof_rewrite_temp = None
+        self.aof_rewrite_scheduled = False
+        # logs receiving the executed write commands, see propagate
+        self.propagation_targets = []
+        # the dataset is being restored, memory limits are not enforced
+        self.loading = False
+        self.cluster = None
+        if self.config.cluster_nodes:
+            if self.config.cluster_announce is None:
+                raise ValueError('cluster_announce is required in cluster mode')
+            self.cluster = Cluster(self.config.cluster_nodes, self.config.cluster_announce)
+        self.replication = Replication(self)
+        self.pubsub = PubSub()
+        self.blocking = BlockingQueues(self)
+        # command queues of the connected clients, see server.on_connect
+        self.clients = set()
+        # write commands of clients are refused, set on replicas
+        self.read_only = False
+        # key -> set of command queues watching the key
+        self.watched_keys = {}
+        # change trackers of the keyspace, see track_changes
+        self.trackers = []
+        # KeyspaceTemplate sharing values with the keyspace, see load_template
+        self.template = None
+        self.collection_scans = CollectionScans()
         self.execute_map = {}
-        self.cursors = {}
+        self.command_specs = {}
+        self.command_cache = {}
+
+        self.scripting = ScriptRuntime(self)
+
+        for _, func in inspect.getmembers(type(self), predicate=inspect.isfunction):
+            spec = getattr(func, 'command_spec', None)
+            if spec is None:
+                continue
+            name = spec.name.encode()
+            self.command_specs[name] = spec
+            self.execute_map[name] = spec.compile(self)
+        self.command_cache.update(self.execute_map)
 
-        self.lua_proxy = self.get_lua_proxy()
-        self.lua = LuaRuntime(
-            encoding=None,
-            unpack_returned_tuples=True
+    def create_keyspace(self):
+        keys = Keyspace(
+            track_memory=bool(self.config.maxmemory),
+            access_policy=access_policy(self.config.maxmemory_policy),
         )
+        keys.lfu_log_factor = self.config.lfu_log_factor
+        keys.lfu_decay_time = self.config.lfu_decay_time
+        return keys
 
-        for _, func in inspect.getmembers(self, predicate=inspect.ismethod):
-            if hasattr(func, 'redis_command'):
-                self.execute_map[func.redis_command] = func
+    def add_watch(self, queue, key):
+        queues = self.watched_keys.get(key)
+        if queues is None:
+            queues = self.watched_keys[key] = set()
+        queues.add(queue)
 
-    def get_lua_proxy(self):
-        redis = self
+    def remove_watch(self, queue, key):
+        queues = self.watched_keys.get(key)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self.watched_keys[key]
 
-        class RedisProxy:
-            def call(self, command, *args):
-                return redis.execute_single(command, *args)
+    def on_change(self, key, existed=None):
+        """
+        Notify the watchers and the trackers of a changed key, existed tells if the key was in
+        the keyspace before the change, by default the change is about to happen
+        """
+        queues = self.watched_keys.get(key)
+        if queues:
+            for queue in queues:
+                queue.on_change(key)
+        if self.trackers:
+            if existed is None:
+                existed = key in self.keys
+            for tracker in self.trackers:
+                tracker.touch(key, existed)
 
-            def replicate_commands(self):
-                pass
+    def copy_on_write(self, key):
+        """
+        Copy the value shared with the template before a command may change it in place
+        """
+        value = self.keys.get(key)
+        if value is not None and self.template.shares(key, value):
+            self.keys[key] = copy_value(value)
 
-        return RedisProxy()
+    def track_changes(self):
+        """
+        New ChangeTracker recording the keys touched from now on, until untrack_changes
+        """
+        tracker = ChangeTracker()
+        self.trackers.append(tracker)
+        return tracker
 
-    def add_watch(self, queue):
-        self.watches.add(queue)
+    def untrack_changes(self, tracker):
+        if tracker in self.trackers:
+            self.trackers.remove(tracker)
 
-    def remove_watch(self, queue):
-        if queue in self.watches:
-            self.watches.remove(queue)
+    def replace_keyspace(self, keys=None):
+        """
+        Swap in a new keyspace, an empty one by default. Watchers and trackers see all the old keys changed
+        """
+        # the old values are dropped, they need no copy
+        self.template = None
+        for key in list(self.watched_keys):
+            self.on_change(key)
+        for tracker in self.trackers:
+            for key in self.keys:
+                tracker.touch(key, True)
+        self.keys = self.create_keyspace() if keys is None else keys
+        self.collection_scans.clear()
+        for tracker in self.trackers:
+            for key in self.keys:
+                tracker.touch(key, False)
 
-    def on_change(self, key):
-        for queue in self.watches:
-            queue.on_change(key)
+    def create_template(self):
+        """
+        KeyspaceTemplate of the dataset, from now on the values are copied before they are changed
+        """
+        self.template = KeyspaceTemplate(self.keys)
+        return self.template
 
-    def execute_single(self, command, *args):
+    def load_template(self, template):
+        """
+        Replace the dataset by a copy on write clone of the template, the keys are copied, the values
+        are shared until they are written
+        """
+        values = template.values
+        keys = self.create_keyspace()
+        keys.load(list(values), list(values.values()))
+        for key, when in template.expires.items():
+            keys.set_expire(key, when)
+        self.replace_keyspace(keys)
+        self.template = template
+        self.dirty += 1
+        if self.propagation_targets:
+            self.propagate(b'FLUSHALL', ())
+            for key in keys:
+                self.propagate_restore(key)
+
+    def propagate_restore(self, key):
+        """
+        Log a key written without a command, by an import or a template, as a RESTORE of its value
+        """
+        when = self.keys.expires.get(key, 0)
+        self.propagate(b'RESTORE', (key, b'%d' % when, snapshot.dump_value(self.keys[key]), b'REPLACE', b'ABSTTL'))
+
+    def propagate(self, command, args):
+        """
+        Log the effect of a write command, the args are a tuple of the command arguments
+        """
+        for target in self.propagation_targets:
+            target.feed(command, args)
+
+    def flushall(self):
+        """
+        Empty the dataset by swapping in a new keyspace, the old one is left to the garbage collector
+        """
+        self.replace_keyspace()
+        self.dirty += 1
+
+    def flush_scripts(self):
+        self.scripts.clear()
+        self.script_sources.clear()
+
+    def expire_if_needed(self, key, now=None):
+        """
+        Delete the key if its TTL is over, returns True if the key was expired
+        """
+        when = self.keys.expires.get(key)
+        if when is None or when > (now_ms() if now is None else now):
+            return False
+
+        self.on_change(key)
+        del self.keys[key]
+        self.dirty += 1
+        self.propagate(b'DEL', (key,))
+        return True
+
+    def active_expire_cycle(self, time_limit):
+        """
+        Expire keys sampled among the keys having a TTL until few of the sampled keys
+        are expired or the time limit in seconds is over
+        """
+        keys = self.keys
+        deadline = time.monotonic() + time_limit
+
+        while keys.expires:
+            now = now_ms()
+            sampled = keys.sample_volatile(ACTIVE_EXPIRE_KEYS_PER_LOOP)
+            expired = sum(1 for key in sampled if self.expire_if_needed(key, now))
+
+            if expired * 4 <= len(sampled) or time.monotonic() > deadline:
+                break
+
+    def free_memory(self):
+        """
+        Evict keys until the used memory fits maxmemory, returns False if the policy can't free enough
+        """
+        keys = self.keys
+        while keys.used_memory > self.config.maxmemory:
+            key = self.evictor.candidate(keys)
+            if key is None:
+                return False
+            self.on_change(key)
+            del keys[key]
+            self.dirty += 1
+            self.propagate(b'DEL', (key,))
+        return True
+
+    def snapshot_path(self):
+        if self.config.dbfilename is None:
+            raise resp.Error('ERR', 'snapshot file is not configured')
+        return os.path.join(self.config.dir, self.config.dbfilename)
+
+    def save(self):
+        snapshot.save(self.snapshot_path(), self.keys, self.script_sources.values())
+        self.dirty = 0
+        self.lastsave = int(time.time())
+
+    def bgsave(self):
+        """
+        Write the snapshot in a forked child, the child gets a copy-on-write view of the keyspace
+        """
+        path = self.snapshot_path()
+        if not hasattr(os, 'fork'):
+            self.save()
+            return
+
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                snapshot.save(path, self.keys, self.script_sources.values())
+                code = 0
+            finally:
+                os._exit(code)
+
+        self.bgsave_child = pid
+        self.dirty_before_bgsave = self.dirty
+
+    def check_bgsave(self):
+        succeeded = child_exited(self.bgsave_child)
+        if succeeded is None:
+            return
+
+        self.bgsave_child = None
+        if succeeded:
+            self.dirty -= self.dirty_before_bgsave
+            self.lastsave = int(time.time())
+
+    def load_records(self, records, replace=False):
+        """
+        Insert the snapshot record batches into the keyspace skipping expired keys,
+        returns the end position of the snapshot. With replace the keys may exist,
+        they are changed like by a command
+        """
+        keys = self.keys
+        now = now_ms()
+        while True:
+            try:
+                batch_keys, batch_values, expires, scripts = next(records)
+            except StopIteration as e:
+                return e.value
+            # strings get the stored form of SET, integers are kept as int
+            batch_values = [encode_string(value) if type(value) is bytes else value for value in batch_values]
+
+            if replace:
+                for key in batch_keys:
+                    self.on_change(key)
+                    if key in keys:
+                        del keys[key]
+            keys.load(batch_keys, batch_values)
+            for key, when in expires.items():
+                if when > now:
+                    keys.set_expire(key, when)
+                else:
+                    del keys[key]
+            for script in scripts:
+                self.load_script(script)
+
+            if replace:
+                self.dirty += len(batch_keys)
+                if self.propagation_targets:
+                    for key in batch_keys:
+                        if key in keys:
+                            self.propagate_restore(key)
+
+    def load_snapshot(self):
+        """
+        Load the snapshot file if it exists
+        """
+        if self.config.dbfilename is None or not os.path.exists(self.snapshot_path()):
+            return
+        self.load_records(snapshot.load(self.snapshot_path(), self.config))
+
+    def aof_path(self):
+        return os.path.join(self.config.dir, self.config.appendfilename)
+
+    def load(self):
+        """
+        Restore the dataset on start, the append only file takes precedence over the snapshot
+        """
+        if not self.config.appendonly:
+            self.load_snapshot()
+            return
+
+        path = self.aof_path()
+        if os.path.exists(path):
+            self.load_aof(path)
+        else:
+            self.load_snapshot()
+        self.start_aof()
+
+    def load_aof(self, path):
+        """
+        Replay the append only file straight to the command handlers
+        """
+        data = aof.map_file(path)
+        if data is None:
+            return
+
+        pos = 0
+        self.loading = True
         try:
-            return self.execute_map[command.decode().upper()](*args)
-        except KeyError:
+            with data:
+                if data[:len(snapshot.MAGIC)] == snapshot.MAGIC:
+                    pos = self.load_records(snapshot.read_snapshot(data, config=self.config))
+                for args, pos in aof.read_commands(data, pos):
+                    self.lookup_command(args[0])(*args[1:])
+                size = len(data)
+        finally:
+            self.loading = False
+        self.dirty = 0
+
+        if pos < size:
+            # the last command was partially written, e.g. the server was killed during the write
+            os.truncate(path, pos)
+
+    def import_data(self, data):
+        """
+        Load a fixture into the dataset without a client: a snapshot (see snapshot.py) is merged
+        into the keyspace replacing existing keys, a RESP command stream (like an append only
+        file or the input of redis-cli --pipe) is executed straight by the command handlers
+        """
+        if data[:len(snapshot.MAGIC)] == snapshot.MAGIC:
+            self.load_records(snapshot.read_snapshot(data, config=self.config), replace=True)
+            return
+
+        pos = 0
+        for args, pos in aof.read_commands(data):
+            self.lookup_command(args[0])(*args[1:])
+        if pos < len(data):
+            raise aof.AofError('Truncated command at offset {}'.format(pos))
+
+    def import_file(self, path):
+        data = aof.map_file(path)
+        if data is None:
+            return
+        with data:
+            self.import_data(data)
+
+    def start_aof(self):
+        """
+        Open the append only file, a missing file is created from the current dataset
+        """
+        path = self.aof_path()
+        if not os.path.exists(path):
+            snapshot.save(path, self.keys, self.script_sources.values())
+        self.aof = aof.AppendOnlyFile(path, self.config.appendfsync)
+        self.propagation_targets.append(self.aof)
+
+    def bgrewriteaof(self):
+        """
+        Write a snapshot of the keyspace to a new file in a forked child, the commands executed
+        meanwhile are appended to the current file and to the rewrite buffer
+        """
+        temp_path = '{}.rewrite-{}'.format(self.aof.path, os.getpid())
+        self.aof.start_rewrite()
+        if not hasattr(os, 'fork'):
+            snapshot.save(temp_path, self.keys, self.script_sources.values())
+            self.aof.finish_rewrite(temp_path)
+            return
+
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                snapshot.save(temp_path, self.keys, self.script_sources.values())
+                code = 0
+            finally:
+                os._exit(code)
+
+        self.aof_rewrite_child = pid
+        self.aof_rewrite_temp = temp_path
+
+    def check_aof_rewrite(self):
+        succeeded = child_exited(self.aof_rewrite_child)
+        if succeeded is None:
+            return
+
+        self.aof_rewrite_child = None
+        if succeeded:
+            self.aof.finish_rewrite(self.aof_rewrite_temp)
+        else:
+            self.aof.abort_rewrite()
+            if os.path.exists(self.aof_rewrite_temp):
+                os.unlink(self.aof_rewrite_temp)
+
+    def shutdown(self):
+        if self.aof_rewrite_child is not None:
+            os.kill(self.aof_rewrite_child, signal.SIGKILL)
+            os.waitpid(self.aof_rewrite_child, 0)
+            self.aof_rewrite_child = None
+            if os.path.exists(self.aof_rewrite_temp):
+                os.unlink(self.aof_rewrite_temp)
+        if self.aof is not None:
+            self.aof.close()
+
+    def cron(self):
+        """
+        Periodic tasks, the server calls it config.hz times per second
+        """
+        config = self.config
+        self.keys.update_clock()
+        if self.replication.master is None:
+            # replicas get the deletions of expired keys from the primary
+            self.active_expire_cycle(ACTIVE_EXPIRE_CYCLE_SHARE / config.hz)
+
+        if self.aof is not None:
+            # commands executed outside of client connections and the everysec fsync
+            self.aof.flush()
+
+        if self.bgsave_child is not None:
+            self.check_bgsave()
+        if self.aof_rewrite_child is not None:
+            self.check_aof_rewrite()
+        if self.bgsave_child is not None or self.aof_rewrite_child is not None:
+            return
+
+        if self.aof is not None and (
+            self.aof_rewrite_scheduled or
+            self.aof.rewrite_needed(config.auto_aof_rewrite_percentage, config.auto_aof_rewrite_min_size)
+        ):
+            self.aof_rewrite_scheduled = False
+            self.bgrewriteaof()
+        elif config.dbfilename is not None and self.dirty:
+            elapsed = time.time() - self.lastsave
+            for seconds, changes in config.save:
+                if self.dirty >= changes and elapsed >= seconds:
+                    self.bgsave()
+                    break
+
+    def lookup_command(self, command):
+        """
+        Resolve the dispatch function by the command name as sent by the client
+        """
+        dispatch = self.command_cache.get(command)
+        if dispatch is not None:
+            return dispatch
+
+        name = command.encode() if isinstance(command, str) else bytes(command)
+        dispatch = self.execute_map.get(name.upper())
+        if dispatch is None:
             raise resp.Error('ERR', 'Command {} is not implemented yet'.format(command))
 
-    @redis_command('SET')
-    def execute_set(self, key: MUTABLE_KEY, value):
-        self.keys[key] = value
+        if len(self.command_cache) < len(self.execute_map) + COMMAND_CACHE_SIZE:
+            self.command_cache[command] = dispatch
+        return dispatch
+
+    def execute_single(self, command, *args):
+        dispatch = self.command_cache.get(command)
+        if dispatch is None:
+            dispatch = self.lookup_command(command)
+        return dispatch(*args)
+
+    @redis_command('SET', propagate=False)
+    def execute_set(self, key: MUTABLE_KEY, value, *options):
+        expire_at = None
+        keep_ttl = False
+        condition = None
+
+        options = iter(options)
+        for option in options:
+            option = option.upper()
+            if option in (b'NX', b'XX') and condition is None:
+                condition = option
+            elif option == b'KEEPTTL' and expire_at is None:
+                keep_ttl = True
+            elif option in (b'EX', b'PX', b'EXAT', b'PXAT') and expire_at is None and not keep_ttl:
+                amount = parse_int(next(options, b''))
+                if amount <= 0:
+                    raise resp.Error('ERR', "invalid expire time in 'set' command")
+                if option in (b'EX', b'EXAT'):
+                    amount *= 1000
+                expire_at = amount if option.endswith(b'AT') else now_ms() + amount
+            else:
+                raise resp.Errors.SYNTAX
+
+        if condition == b'NX' and key in self.keys or condition == b'XX' and key not in self.keys:
+            self.unchanged = True
+            return resp.NIL
+
+        self.keys[key] = encode_string(value)
+        if expire_at is not None:
+            self.keys.set_expire(key, expire_at)
+            # relative expire times are logged as absolute ones
+            self.propagate(b'SET', (key, value, b'PXAT', expire_at))
+            self.expire_if_needed(key)
+        elif keep_ttl:
+            self.propagate(b'SET', (key, value, b'KEEPTTL'))
+        else:
+            self.keys.persist(key)
+            self.propagate(b'SET', (key, value))
         return resp.OK
 
     @redis_command('GET')
     def execute_get(self, key: KEY_STRING):
-        if key not in self.keys:
-            return resp.NIL
-        return self.keys[key]
+        value = self.keys.get(key)
+        if value is None or type(value) is bytes:
+            return value
+        return b'%d' % value
 
-    @redis_command('INCRBY')
-    def execute_incrby(self, key: (MUTABLE_KEY, KEY_STRING), value):
-        try:
-            initial = int(self.keys.get(key, 0))
-            value = int(value)
-        except ValueError:
-            raise resp.Errors.NOT_INT
+    @redis_command('GETSET')
+    def execute_getset(self, key: (MUTABLE_KEY, KEY_STRING), value):
+        previous = self.keys.get(key)
+        self.keys[key] = encode_string(value)
+        self.keys.persist(key)
+        return None if previous is None else string_bytes(previous)
+
+    @redis_command('APPEND')
+    def execute_append(self, key: (MUTABLE_KEY, KEY_STRING), value):
+        previous = self.keys.get(key)
+        value = value if previous is None else string_bytes(previous) + value
+        self.keys[key] = value
+        return len(value)
+
+    @redis_command('STRLEN')
+    def execute_strlen(self, key: KEY_STRING):
+        value = self.keys.get(key)
+        return 0 if value is None else len(string_bytes(value))
+
+    @redis_command('MGET')
+    def execute_mget(self, key: KEY, *keys: KEY):
+        values = self.keys
+        # keys of other types are reported as missing
+        return [
+            value if type(value) is bytes else b'%d' % value if type(value) is int else None
+            for value in map(values.get, (key,) + keys)
+        ]
 
-        result = initial + value
-        self.keys[key] = str(result).encode()
+    @redis_command('MSET')
+    def execute_mset(self, key: MUTABLE_KEY, value, *pairs: (MUTABLE_KEY, KEY_VALUE_PAIRS)):
+        if len(pairs) % 2:
+            raise resp.Error('ERR', "wrong number of arguments for 'mset' command")
+        self.set_many(key, value, pairs)
+        return resp.OK
+
+    @redis_command('MSETNX', propagate=False)
+    def execute_msetnx(self, key: MUTABLE_KEY, value, *pairs: (MUTABLE_KEY, KEY_VALUE_PAIRS)):
+        if len(pairs) % 2:
+            raise resp.Error('ERR', "wrong number of arguments for 'msetnx' command")
+        keys = self.keys
+        if key in keys or any(pair_key in keys for pair_key in pairs[::2]):
+            self.unchanged = True
+            return 0
+        self.set_many(key, value, pairs)
+        self.propagate(b'MSET', (key, value) + pairs)
+        return 1
+
+    def set_many(self, key, value, pairs):
+        keys = self.keys
+        keys[key] = encode_string(value)
+        keys.update(zip(pairs[::2], map(encode_string, pairs[1::2])))
+        if keys.expires:
+            keys.persist(key)
+            for pair_key in pairs[::2]:
+                keys.persist(pair_key)
+
+    def increment(self, key, increment):
+        keys = self.keys
+        value = keys.get(key)
+        if type(value) is int:
+            result = value + increment
+            if INT64_MIN <= result <= INT64_MAX:
+                # the key exists, so the bookkeeping of new keys is skipped,
+                # the memory accounting is updated by the dispatch
+                dict.__setitem__(keys, key, result)
+                return result
+        elif value is None:
+            value = 0
+        else:
+            value = parse_member(value)
+            if value is None:
+                raise resp.Errors.NOT_INT
+
+        result = value + increment
+        if not INT64_MIN <= result <= INT64_MAX:
+            raise resp.Error('ERR', 'increment or decrement would overflow')
+        keys[key] = result
         return result
 
+    @redis_command('INCR')
+    def execute_incr(self, key: (MUTABLE_KEY, KEY_STRING)):
+        return self.increment(key, 1)
+
+    @redis_command('DECR')
+    def execute_decr(self, key: (MUTABLE_KEY, KEY_STRING)):
+        return self.increment(key, -1)
+
+    @redis_command('INCRBY')
+    def execute_incrby(self, key: (MUTABLE_KEY, KEY_STRING), value):
+        return self.increment(key, parse_int64(value))
+
     @redis_command('DECRBY')
     def execute_decrby(self, key: (MUTABLE_KEY, KEY_STRING), value):
+        increment = parse_int64(value)
+        if increment == INT64_MIN:
+            raise resp.Error('ERR', 'decrement would overflow')
+        return self.increment(key, -increment)
+
+    @redis_command('INCRBYFLOAT', propagate=False)
+    def execute_incrbyfloat(self, key: (MUTABLE_KEY, KEY_STRING), increment):
+        increment = parse_float(increment)
+        value = self.keys.get(key, 0)
         try:
-            initial = int(self.keys.get(key, 0))
-            value = int(value)
+            result = float(value) + increment
         except ValueError:
-            raise resp.Errors.NOT_INT
+            raise resp.Errors.NOT_FLOAT
+        if result in (float('inf'), float('-inf')) or result != result:
+            raise resp.Error('ERR', 'increment would produce NaN or Infinity')
 
-        result = initial - value
-        self.keys[key] = str(result).encode()
+        result = format_float(result)
+        self.keys[key] = encode_string(result)
+        # the result is logged instead of the increment, so that it does not depend on float rounding
+        self.propagate(b'SET', (key, result, b'KEEPTTL'))
         return result
 
-    @redis_command('DEL')
-    def execute_del(self, *keys):
-        for key in keys:
-            if key in self.keys:
+    @redis_command('DEL', propagate=True)
+    def execute_del(self, key: KEY, *keys: KEY):
+        values = self.keys
+        deleted = 0
+        for key in (key,) + keys:
+            if key in values:
                 self.on_change(key)
-                del self.keys[key]
-        return resp.OK
+                del values[key]
+                deleted += 1
+        self.dirty += deleted
+        return deleted
+
+    @redis_command('UNLINK', propagate=True)
+    def execute_unlink(self, key: KEY, *keys: KEY):
+        return self.execute_del(key, *keys)
+
+    @redis_command('EXISTS')
+    def execute_exists(self, key: KEY, *keys: KEY):
+        values = self.keys
+        # a key repeated in the arguments is counted every time
+        return sum(1 for key in (key,) + keys if key in values)
 
     @redis_command('SCAN')
-    def execute_scan(self, cursor):
+    def execute_scan(self, cursor, *args):
+        cursor = parse_cursor(cursor)
+        count, match, type_name = parse_scan_args(args, allow_type=True)
+
+        cursor, keys = self.keys.scan(cursor, count)
+        if self.keys.expires:
+            now = now_ms()
+            keys = [key for key in keys if not self.expire_if_needed(key, now)]
+        if match is not None:
+            keys = [key for key in keys if match(key)]
+        if type_name is not None:
+            keys = [key for key in keys if key_type_name(self.keys[key]) == type_name]
+
+        return [str(cursor).encode(), keys]
+
+    @redis_command('DUMP')
+    def execute_dump(self, key: KEY):
+        value = self.keys.get(key)
+        return None if value is None else snapshot.dump_value(value)
+
+    @redis_command('RESTORE', propagate=False)
+    def execute_restore(self, key: MUTABLE_KEY, ttl, payload, *options):
+        ttl = parse_int(ttl)
+        replace = absolute = False
+        options = iter(options)
+        for option in options:
+            option = option.upper()
+            if option == b'REPLACE':
+                replace = True
+            elif option == b'ABSTTL':
+                absolute = True
+            elif option in (b'IDLETIME', b'FREQ'):
+                # accepted for compatibility, the access data is not restored
+                if parse_int(next(options, b'')) < 0:
+                    raise resp.Error('ERR', 'Invalid {} value, must be >= 0'.format(option.decode()))
+            else:
+                raise resp.Errors.SYNTAX
+        if ttl < 0:
+            raise resp.Error('ERR', 'Invalid TTL value, must be >= 0')
+        if not replace and key in self.keys:
+            raise resp.Error('BUSYKEY', 'Target key name already exists.')
         try:
-            cursor = int(cursor)
-        except ValueError:
-            return resp.Errors.INVALID_CURSOR
+            value = snapshot.restore_value(payload, self.config)
+        except snapshot.SnapshotError:
+            raise resp.Error('ERR', 'DUMP payload version or checksum are wrong')
 
-        if cursor == 0:
-            cursor = max(self.cursors.keys()) if self.cursors else 1
-            self.cursors[cursor] = iter(set(self.keys.keys()))
+        if key in self.keys:
+            del self.keys[key]
+        when = None
+        if ttl:
+            when = ttl if absolute else now_ms() + ttl
+            if when <= now_ms():
+                # already expired, the key is only deleted
+                self.propagate(b'DEL', (key,))
+                return resp.OK
+        self.keys[key] = encode_string(value) if type(value) is bytes else value
+        if when is not None:
+            self.keys.set_expire(key, when)
+        # relative TTLs are logged as absolute ones
+        self.propagate(b'RESTORE', (key, b'%d' % (when or 0), payload, b'REPLACE', b'ABSTTL'))
+        return resp.OK
 
-        bulk = []
-        for item in self.cursors[cursor]:
-            bulk.append(item)
-            if len(bulk) > 5:
-                break
+    @redis_command('TYPE')
+    def execute_type(self, key: KEY):
+        if key not in self.keys:
+            return resp.Status(b'none')
+        return resp.Status(key_type_name(self.keys[key]))
+
+    def expire(self, key, when, options):
+        if key not in self.keys:
+            self.unchanged = True
+            return 0
+
+        options = {option.upper() for option in options}
+        if not options <= {b'NX', b'XX', b'GT', b'LT'} or len(options) > 1:
+            raise resp.Errors.SYNTAX
+
+        current = self.keys.expires.get(key)
+        if b'NX' in options and current is not None:
+            self.unchanged = True
+            return 0
+        if b'XX' in options and current is None:
+            self.unchanged = True
+            return 0
+        # a key without TTL has an infinite one
+        if b'GT' in options and (current is None or when <= current):
+            self.unchanged = True
+            return 0
+        if b'LT' in options and current is not None and when >= current:
+            self.unchanged = True
+            return 0
+
+        self.keys.set_expire(key, when)
+        if not self.expire_if_needed(key):
+            self.propagate(b'PEXPIREAT', (key, when))
+        return 1
+
+    @redis_command('EXPIRE', denyoom=False, propagate=False)
+    def execute_expire(self, key: MUTABLE_KEY, seconds, *options):
+        return self.expire(key, now_ms() + parse_int(seconds) * 1000, options)
+
+    @redis_command('PEXPIRE', denyoom=False, propagate=False)
+    def execute_pexpire(self, key: MUTABLE_KEY, milliseconds, *options):
+        return self.expire(key, now_ms() + parse_int(milliseconds), options)
+
+    @redis_command('EXPIREAT', denyoom=False, propagate=False)
+    def execute_expireat(self, key: MUTABLE_KEY, timestamp, *options):
+        return self.expire(key, parse_int(timestamp) * 1000, options)
+
+    @redis_command('PEXPIREAT', denyoom=False, propagate=False)
+    def execute_pexpireat(self, key: MUTABLE_KEY, timestamp, *options):
+        return self.expire(key, parse_int(timestamp), options)
+
+    @redis_command('PTTL')
+    def execute_pttl(self, key: KEY):
+        if key not in self.keys:
+            return -2
+        when = self.keys.expires.get(key)
+        if when is None:
+            return -1
+        return max(when - now_ms(), 0)
+
+    @redis_command('TTL')
+    def execute_ttl(self, key: KEY):
+        ttl = self.execute_pttl(key)
+        if ttl < 0:
+            return ttl
+        return (ttl + 500) // 1000
+
+    @redis_command('PERSIST', denyoom=False)
+    def execute_persist(self, key: MUTABLE_KEY):
+        persisted = key in self.keys and self.keys.persist(key)
+        self.unchanged = not persisted
+        return int(persisted)
+
+    @redis_command('MEMORY')
+    def execute_memory(self, subcommand, *args):
+        if subcommand.upper() != b'USAGE' or len(args) not in (1, 3):
+            raise resp.Errors.SYNTAX
+        key = args[0]
+        self.expire_if_needed(key)
+        if key not in self.keys:
+            return resp.NIL
+        return estimate_size(key, self.keys[key])
+
+    @redis_command('OBJECT')
+    def execute_object(self, subcommand, *args):
+        if subcommand.upper() != b'ENCODING' or len(args) != 1:
+            raise resp.Errors.SYNTAX
+        key = args[0]
+        self.expire_if_needed(key)
+        if key not in self.keys:
+            return resp.NIL
+        return object_encoding(self.keys[key])
+
+    def list_push(self, key, elements, left):
+        values = self.keys.get(key)
+        if values is None:
+            values = self.keys[key] = deque()
+            # clients blocked on the key are served after the command
+            self.blocking.signal(key)
+        if left:
+            values.extendleft(elements)
+        else:
+            values.extend(elements)
+        return len(values)
+
+    @redis_command('LPUSH')
+    def execute_lpush(self, key: (MUTABLE_KEY, KEY_LIST), element, *elements):
+        return self.list_push(key, (element,) + elements, True)
+
+    @redis_command('RPUSH')
+    def execute_rpush(self, key: (MUTABLE_KEY, KEY_LIST), element, *elements):
+        return self.list_push(key, (element,) + elements, False)
+
+    def list_pop(self, key, count, left):
+        if count is not None:
+            count = parse_int(count)
+            if count < 0:
+                raise resp.Error('ERR', 'value is out of range, must be positive')
+        values = self.keys.get(key)
+        if values is None:
+            self.unchanged = True
+            return resp.NIL
+
+        pop = values.popleft if left else values.pop
+        if count is None:
+            result = pop()
         else:
-            del self.cursors[cursor]
-            cursor = 0
+            result = [pop() for _ in range(min(count, len(values)))]
+        if not values:
+            del self.keys[key]
+        return result
 
-        return [cursor, bulk]
+    @redis_command('LPOP', denyoom=False)
+    def execute_lpop(self, key: (MUTABLE_KEY, KEY_LIST), count=None):
+        return self.list_pop(key, count, True)
+
+    @redis_command('RPOP', denyoom=False)
+    def execute_rpop(self, key: (MUTABLE_KEY, KEY_LIST), count=None):
+        return self.list_pop(key, count, False)
+
+    @redis_command('LLEN')
+    def execute_llen(self, key: KEY_LIST):
+        return len(self.keys.get(key, ()))
+
+    @redis_command('LRANGE')
+    def execute_lrange(self, key: KEY_LIST, start, stop):
+        values = self.keys.get(key, ())
+        length = len(values)
+        start, stop = list_bounds(length, start, stop)
+        if start >= stop:
+            return []
+        if start > length - stop:
+            # closer to the tail, deques are iterated from either end
+            result = list(islice(reversed(values), length - stop, length - start))
+            result.reverse()
+            return result
+        return list(islice(values, start, stop))
+
+    @redis_command('LTRIM', denyoom=False)
+    def execute_ltrim(self, key: (MUTABLE_KEY, KEY_LIST), start, stop):
+        values = self.keys.get(key)
+        if values is None:
+            self.unchanged = True
+            return resp.OK
+        length = len(values)
+        start, stop = list_bounds(length, start, stop)
+        if start >= stop:
+            del self.keys[key]
+            return resp.OK
+        for _ in range(length - stop):
+            values.pop()
+        for _ in range(start):
+            values.popleft()
+        return resp.OK
+
+    @redis_command('LMOVE')
+    def execute_lmove(self, source: (MUTABLE_KEY, KEY_LIST), destination: (MUTABLE_KEY, KEY_LIST),
+                      wherefrom, whereto):
+        from_left = parse_direction(wherefrom)
+        to_left = parse_direction(whereto)
+        values = self.keys.get(source)
+        if values is None:
+            self.unchanged = True
+            return resp.NIL
+
+        element = values.popleft() if from_left else values.pop()
+        if not values:
+            del self.keys[source]
+        self.list_push(destination, (element,), to_left)
+        return element
+
+    def blocking_pop(self, args, left):
+        """
+        Pop from the first non empty list, a served pop is the LPOP or RPOP command
+        """
+        keys = args[:-1]
+        timeout = parse_timeout(args[-1])
+        command = b'LPOP' if left else b'RPOP'
+
+        for key in keys:
+            self.expire_if_needed(key)
+            values = self.keys.get(key)
+            if values is None:
+                continue
+            if type(values) is not deque:
+                raise resp.Errors.WRONGTYPE
+            return [key, self.execute_single(command, key)]
+
+        return Blocked(list(dict.fromkeys(keys)), timeout, lambda key: [key, self.execute_single(command, key)])
+
+    @redis_command('BLPOP', propagate=False, write=True, keys=blocking_keys)
+    def execute_blpop(self, key, timeout, *args):
+        return self.blocking_pop((key, timeout) + args, True)
+
+    @redis_command('BRPOP', propagate=False, write=True, keys=blocking_keys)
+    def execute_brpop(self, key, timeout, *args):
+        return self.blocking_pop((key, timeout) + args, False)
+
+    @redis_command('BLMOVE', propagate=False, write=True)
+    def execute_blmove(self, source: KEY_LIST, destination: KEY_LIST, wherefrom, whereto, timeout):
+        parse_direction(wherefrom)
+        parse_direction(whereto)
+        timeout = parse_timeout(timeout)
+
+        def move(key):
+            return self.execute_single(b'LMOVE', source, destination, wherefrom, whereto)
+
+        if source in self.keys:
+            return move(source)
+        return Blocked([source], timeout, move)
 
     @redis_command('SADD')
     def execute_sadd(self, key: (MUTABLE_KEY, KEY_SET), *args):
-        if key not in self.keys:
-            self.keys[key] = set()
+        max_entries = self.config.set_max_intset_entries
+        values = self.keys.get(key)
+        if values is None:
+            integers = len(args) <= max_entries and all(parse_member(member) is not None for member in args)
+            values = self.keys[key] = IntSet() if integers else set()
+
+        added = 0
+        if type(values) is IntSet:
+            for index, member in enumerate(args):
+                if parse_member(member) is None or len(values) >= max_entries and member not in values:
+                    # the rest of the members go to the general encoding
+                    values = self.keys[key] = set(values)
+                    args = args[index:]
+                    break
+                added += values.add(member)
+            else:
+                self.unchanged = not added
+                return added
 
-        values = self.keys[key]
         to_add = set(args) - values
         values.update(to_add)
-        return len(to_add)
+        added += len(to_add)
+        # a conversion to the general encoding keeps the members
+        self.unchanged = not added
+        return added
 
-    @redis_command('SPOP')
+    @redis_command('SPOP', denyoom=False, propagate=False)
     def execute_spop(self, key: (MUTABLE_KEY, KEY_SET)):
         if key not in self.keys:
+            self.unchanged = True
             return resp.NIL
         values = self.keys[key]
         result = values.pop()
@@ -186,39 +1484,627 @@ class Redis:
         if not values:
             del self.keys[key]
 
+        # the popped member is random, the log gets the deterministic removal
+        self.propagate(b'SREM', (key, result))
         return result
 
+    @redis_command('SREM', denyoom=False)
+    def execute_srem(self, key: (MUTABLE_KEY, KEY_SET), *members):
+        if key not in self.keys:
+            self.unchanged = True
+            return 0
+        values = self.keys[key]
+        removed = 0
+        for member in set(members):
+            if member in values:
+                values.discard(member)
+                removed += 1
+
+        if not values:
+            del self.keys[key]
+
+        self.unchanged = not removed
+        return removed
+
+    @redis_command('SISMEMBER')
+    def execute_sismember(self, key: KEY_SET, member):
+        return int(member in self.keys.get(key, ()))
+
+    @redis_command('SMISMEMBER')
+    def execute_smismember(self, key: KEY_SET, member, *members):
+        values = self.keys.get(key, ())
+        return [int(member in values) for member in (member,) + members]
+
     @redis_command('SCARD')
     def execute_scard(self, key: KEY_SET):
         if key not in self.keys:
             return 0
         return len(self.keys[key])
 
-    @redis_command('EVALSHA')
-    def execute_evalsha(self, script_sha, *args):
-        if script_sha not in self.scripts:
-            return resp.Error('NOSCRIPT')
+    @redis_command('SSCAN')
+    def execute_sscan(self, key: KEY_SET, cursor, *args):
+        cursor = parse_cursor(cursor)
+        count, match, _ = parse_scan_args(args)
+
+        if key not in self.keys:
+            return [b'0', []]
+
+        cursor, members = self.collection_scans.scan(key, self.keys[key], cursor, count)
+        if match is not None:
+            members = [member for member in members if match(member)]
+
+        return [str(cursor).encode(), members]
+
+    def create_zset(self):
+        return SortedSet(self.config.zset_max_listpack_entries, self.config.zset_max_listpack_value)
+
+    @redis_command('ZADD')
+    def execute_zadd(self, key: (MUTABLE_KEY, KEY_ZSET), *args):
+        index = 0
+        flags = set()
+        while index < len(args) and args[index].upper() in ZADD_FLAGS:
+            flags.add(args[index].upper())
+            index += 1
+        pairs = args[index:]
+
+        if not pairs or len(pairs) % 2:
+            raise resp.Errors.SYNTAX
+        if b'NX' in flags and b'XX' in flags:
+            raise resp.Error('ERR', 'XX and NX options at the same time are not compatible')
+        if len(flags & {b'NX', b'GT', b'LT'}) > 1:
+            raise resp.Error('ERR', 'GT, LT, and/or NX options at the same time are not compatible')
+        if b'INCR' in flags and len(pairs) != 2:
+            raise resp.Error('ERR', 'INCR option supports a single increment-element pair')
+        scores = [parse_float(score) for score in pairs[::2]]
+
+        zset = self.keys.get(key)
+        if zset is None:
+            if b'XX' in flags:
+                self.unchanged = True
+                return resp.NIL if b'INCR' in flags else 0
+            zset = self.keys[key] = self.create_zset()
+
+        added = changed = 0
+        for score, member in zip(scores, pairs[1::2]):
+            current = zset.score(member)
+            if current is None:
+                if b'XX' in flags:
+                    continue
+                added += 1
+            else:
+                if b'NX' in flags:
+                    continue
+                if b'INCR' in flags:
+                    score += current
+                    if score != score:
+                        raise resp.Error('ERR', 'resulting score is not a number (NaN)')
+                if b'GT' in flags and score <= current or b'LT' in flags and score >= current:
+                    continue
+                if score == current:
+                    if b'INCR' in flags:
+                        return format_float(score)
+                    continue
+                changed += 1
+            zset.add(member, score)
+            if b'INCR' in flags:
+                return format_float(score)
 
-        num_keys, *script_args = args
-        num_keys = int(num_keys)
+        if not zset:
+            del self.keys[key]
+        self.unchanged = not (added or changed)
+        if b'INCR' in flags:
+            return resp.NIL
+        return added + changed if b'CH' in flags else added
+
+    @redis_command('ZINCRBY')
+    def execute_zincrby(self, key: (MUTABLE_KEY, KEY_ZSET), increment, member):
+        return self.execute_zadd(key, b'INCR', increment, member)
+
+    @redis_command('ZREM', denyoom=False)
+    def execute_zrem(self, key: (MUTABLE_KEY, KEY_ZSET), member, *members):
+        zset = self.keys.get(key)
+        if zset is None:
+            self.unchanged = True
+            return 0
+        removed = sum(zset.remove(member) for member in (member,) + members)
+        if not zset:
+            del self.keys[key]
+        self.unchanged = not removed
+        return removed
+
+    @redis_command('ZSCORE')
+    def execute_zscore(self, key: KEY_ZSET, member):
+        zset = self.keys.get(key)
+        score = None if zset is None else zset.score(member)
+        return resp.NIL if score is None else format_float(score)
+
+    @redis_command('ZCARD')
+    def execute_zcard(self, key: KEY_ZSET):
+        zset = self.keys.get(key)
+        return 0 if zset is None else len(zset)
+
+    def zrank(self, key, member, reverse, options):
+        if len(options) > 1 or options and options[0].upper() != b'WITHSCORE':
+            raise resp.Errors.SYNTAX
+        zset = self.keys.get(key)
+        rank = None if zset is None else zset.rank(member)
+        if rank is None:
+            return resp.NIL
+        if reverse:
+            rank = len(zset) - 1 - rank
+        if options:
+            return [rank, format_float(zset.score(member))]
+        return rank
+
+    @redis_command('ZRANK')
+    def execute_zrank(self, key: KEY_ZSET, member, *options):
+        return self.zrank(key, member, False, options)
+
+    @redis_command('ZREVRANK')
+    def execute_zrevrank(self, key: KEY_ZSET, member, *options):
+        return self.zrank(key, member, True, options)
+
+    def zset_range(self, zset, start, stop, by=None, reverse=False, limit=None):
+        """
+        Rank range [first, last) of ZRANGE arguments, start and stop are swapped by REV for BYSCORE and BYLEX
+        """
+        length = len(zset)
+        if by is None:
+            start = parse_int(start)
+            stop = parse_int(stop)
+            if start < 0:
+                start = max(start + length, 0)
+            if stop < 0:
+                stop += length
+            if reverse:
+                start, stop = length - 1 - stop, length - 1 - start
+            return start, min(stop + 1, length)
+
+        if reverse:
+            start, stop = stop, start
+        if by == b'BYSCORE':
+            low, low_inclusive = parse_score_bound(start)
+            high, high_inclusive = parse_score_bound(stop)
+            first = zset.score_rank(low, not low_inclusive)
+            last = zset.score_rank(high, high_inclusive)
+        else:
+            low, low_inclusive = parse_lex_bound(start)
+            high, high_inclusive = parse_lex_bound(stop)
+            if low == b'+' or high == b'-':
+                return 0, 0
+            first = 0 if low == b'-' else zset.lex_rank(low, not low_inclusive)
+            last = length if high == b'+' else zset.lex_rank(high, high_inclusive)
+
+        if limit is not None:
+            offset, count = limit
+            if offset < 0:
+                return 0, 0
+            if reverse:
+                last -= offset
+                if count >= 0:
+                    first = max(first, last - count)
+            else:
+                first += offset
+                if count >= 0:
+                    last = min(last, first + count)
+        return first, last
+
+    @redis_command('ZRANGE')
+    def execute_zrange(self, key: KEY_ZSET, start, stop, *options):
+        by = None
+        reverse = with_scores = False
+        limit = None
+        index = 0
+        while index < len(options):
+            option = options[index].upper()
+            if option in (b'BYSCORE', b'BYLEX'):
+                by = option
+            elif option == b'REV':
+                reverse = True
+            elif option == b'WITHSCORES':
+                with_scores = True
+            elif option == b'LIMIT' and index + 2 < len(options):
+                limit = (parse_int(options[index + 1]), parse_int(options[index + 2]))
+                index += 2
+            else:
+                raise resp.Errors.SYNTAX
+            index += 1
+
+        if limit is not None and by is None:
+            raise resp.Error('ERR', 'syntax error, LIMIT is only supported in combination with either BYSCORE or BYLEX')
+        if with_scores and by == b'BYLEX':
+            raise resp.Error('ERR', 'syntax error, WITHSCORES not supported in combination with BYLEX')
+
+        zset = self.keys.get(key)
+        if zset is None:
+            # the arguments are validated even for a missing key
+            self.zset_range(self.create_zset(), start, stop, by, reverse, limit)
+            return []
+
+        first, last = self.zset_range(zset, start, stop, by, reverse, limit)
+        items = zset.slice(first, last)
+        if reverse:
+            items.reverse()
+        if with_scores:
+            return [value for member, score in items for value in (member, format_float(score))]
+        return [member for member, _ in items]
+
+    @redis_command('ZREVRANGE')
+    def execute_zrevrange(self, key: KEY_ZSET, start, stop, *options):
+        if len(options) > 1 or options and options[0].upper() != b'WITHSCORES':
+            raise resp.Errors.SYNTAX
+        return self.execute_zrange(key, start, stop, b'REV', *options)
+
+    @redis_command('ZCOUNT')
+    def execute_zcount(self, key: KEY_ZSET, min_score, max_score):
+        zset = self.keys.get(key)
+        if zset is None:
+            return 0
+        first, last = self.zset_range(zset, min_score, max_score, b'BYSCORE')
+        return max(last - first, 0)
+
+    @redis_command('ZREMRANGEBYSCORE', denyoom=False)
+    def execute_zremrangebyscore(self, key: (MUTABLE_KEY, KEY_ZSET), min_score, max_score):
+        zset = self.keys.get(key)
+        if zset is None:
+            return 0
+        first, last = self.zset_range(zset, min_score, max_score, b'BYSCORE')
+        removed = zset.remove_slice(first, last)
+        if not zset:
+            del self.keys[key]
+        self.unchanged = not removed
+        return len(removed)
+
+    def zpop(self, key, count, reverse):
+        if count is not None:
+            count = parse_int(count)
+            if count < 0:
+                raise resp.Error('ERR', 'value is out of range, must be positive')
+        zset = self.keys.get(key)
+        if zset is None:
+            return []
+
+        length = len(zset)
+        number = 1 if count is None else count
+        if reverse:
+            items = zset.remove_slice(length - number, length)
+            items.reverse()
+        else:
+            items = zset.remove_slice(0, number)
+        if not zset:
+            del self.keys[key]
+        return [value for member, score in items for value in (member, format_float(score))]
+
+    @redis_command('ZPOPMIN', denyoom=False)
+    def execute_zpopmin(self, key: (MUTABLE_KEY, KEY_ZSET), count=None):
+        return self.zpop(key, count, False)
+
+    @redis_command('ZPOPMAX', denyoom=False)
+    def execute_zpopmax(self, key: (MUTABLE_KEY, KEY_ZSET), count=None):
+        return self.zpop(key, count, True)
+
+    def hash_set(self, key, pairs, only_new=False):
+        """
+        Set the field value pairs creating the hash, returns the number of new fields
+        """
+        if not pairs or len(pairs) % 2:
+            raise resp.Error('ERR', "wrong number of arguments for 'hset' command")
+        values = self.keys.get(key)
+        if values is None:
+            values = self.keys[key] = Hash()
+
+        max_entries = self.config.hash_max_listpack_entries
+        max_value = self.config.hash_max_listpack_value
+        added = 0
+        for field, value in zip(pairs[::2], pairs[1::2]):
+            if only_new and field in values:
+                continue
+            added += values.set(field, value, max_entries, max_value)
+        return added
+
+    @redis_command('HSET')
+    def execute_hset(self, key: (MUTABLE_KEY, KEY_HASH), *pairs):
+        return self.hash_set(key, pairs)
+
+    @redis_command('HMSET')
+    def execute_hmset(self, key: (MUTABLE_KEY, KEY_HASH), *pairs):
+        self.hash_set(key, pairs)
+        return resp.OK
+
+    @redis_command('HSETNX')
+    def execute_hsetnx(self, key: (MUTABLE_KEY, KEY_HASH), field, value):
+        added = self.hash_set(key, (field, value), only_new=True)
+        self.unchanged = not added
+        return added
+
+    @redis_command('HGET')
+    def execute_hget(self, key: KEY_HASH, field):
+        values = self.keys.get(key)
+        return None if values is None else values.get(field)
+
+    @redis_command('HMGET')
+    def execute_hmget(self, key: KEY_HASH, field, *fields):
+        values = self.keys.get(key)
+        if values is None:
+            return [None] * (len(fields) + 1)
+        return [values.get(field) for field in (field,) + fields]
+
+    @redis_command('HEXISTS')
+    def execute_hexists(self, key: KEY_HASH, field):
+        values = self.keys.get(key)
+        return int(values is not None and field in values)
+
+    @redis_command('HDEL', denyoom=False)
+    def execute_hdel(self, key: (MUTABLE_KEY, KEY_HASH), field, *fields):
+        values = self.keys.get(key)
+        if values is None:
+            self.unchanged = True
+            return 0
+        deleted = sum(values.delete(field) for field in (field,) + fields)
+        if not values:
+            del self.keys[key]
+        self.unchanged = not deleted
+        return deleted
 
-        keys = script_args[:num_keys]
-        vals = script_args[num_keys:]
+    @redis_command('HLEN')
+    def execute_hlen(self, key: KEY_HASH):
+        values = self.keys.get(key)
+        return 0 if values is None else len(values)
 
-        func = self.scripts[script_sha]
-        result = func(self.lua_proxy, self.lua.table(*keys), self.lua.table(*vals))
+    @redis_command('HINCRBY')
+    def execute_hincrby(self, key: (MUTABLE_KEY, KEY_HASH), field, increment):
+        increment = parse_int64(increment)
+        values = self.keys.get(key)
+        current = None if values is None else values.get(field)
+        try:
+            current = int(current or 0)
+        except ValueError:
+            current = None
+        if current is None or not INT64_MIN <= current <= INT64_MAX:
+            raise resp.Error('ERR', 'hash value is not an integer')
+        result = current + increment
+        if not INT64_MIN <= result <= INT64_MAX:
+            raise resp.Error('ERR', 'increment or decrement would overflow')
+        self.hash_set(key, (field, b'%d' % result))
+        return result
 
+    @redis_command('HINCRBYFLOAT')
+    def execute_hincrbyfloat(self, key: (MUTABLE_KEY, KEY_HASH), field, increment):
+        increment = parse_float(increment)
+        values = self.keys.get(key)
+        current = None if values is None else values.get(field)
+        try:
+            result = float(current or 0) + increment
+        except ValueError:
+            raise resp.Error('ERR', 'hash value is not a float')
+        if result in (float('inf'), float('-inf')) or result != result:
+            raise resp.Error('ERR', 'increment would produce NaN or Infinity')
+        result = format_float(result)
+        self.hash_set(key, (field, result))
         return result
 
+    @redis_command('HGETALL')
+    def execute_hgetall(self, key: KEY_HASH):
+        values = self.keys.get(key)
+        if values is None:
+            return []
+        return [item for pair in values.items() for item in pair]
+
+    @redis_command('HKEYS')
+    def execute_hkeys(self, key: KEY_HASH):
+        values = self.keys.get(key)
+        return [] if values is None else list(values)
+
+    @redis_command('HVALS')
+    def execute_hvals(self, key: KEY_HASH):
+        values = self.keys.get(key)
+        return [] if values is None else [value for _, value in values.items()]
+
+    @redis_command('HSCAN')
+    def execute_hscan(self, key: KEY_HASH, cursor, *args):
+        cursor = parse_cursor(cursor)
+        count, match, _ = parse_scan_args(args)
+
+        values = self.keys.get(key)
+        if values is None:
+            return [b'0', []]
+
+        cursor, fields = self.collection_scans.scan(key, values, cursor, count)
+        if match is not None:
+            fields = [field for field in fields if match(field)]
+
+        return [str(cursor).encode(), [item for field in fields for item in (field, values.get(field))]]
+
+    @redis_command('EVAL', keys=script_keys)
+    def execute_eval(self, script, num_keys, *args):
+        func = self.scripts.get(script_sha(script))
+        if func is None:
+            func = self.scripts[self.load_script(script)]
+        return self.scripting.run(func, num_keys, args)
+
+    @redis_command('EVALSHA', keys=script_keys)
+    def execute_evalsha(self, sha, num_keys, *args):
+        func = self.scripts.get(sha)
+        if func is None:
+            func = self.scripts.get(sha.lower())
+        if func is None:
+            raise resp.Error('NOSCRIPT', 'No matching script. Please use EVAL.')
+        return self.scripting.run(func, num_keys, args)
+
+    def load_script(self, script):
+        sha = script_sha(script)
+        if sha not in self.scripts:
+            self.scripts[sha] = self.scripting.compile(script)
+            self.script_sources[sha] = script
+        return sha
+
     @redis_command('SCRIPT')
-    def execute_script_load(self, action, script):
-        if action == b'LOAD':
-            sha = hashlib.sha1(script).hexdigest().encode()
-            lua_func = 'function(redis, KEYS, ARGV) {} end'.format(script.decode())
-            self.scripts[sha] = self.lua.eval(lua_func)
+    def execute_script(self, action, *args):
+        action = action.upper()
+        if action == b'LOAD' and len(args) == 1:
+            sha = self.load_script(args[0])
+            self.propagate(b'SCRIPT', (b'LOAD', args[0]))
             return sha
+        if action == b'EXISTS' and args:
+            return [int(sha.lower() in self.scripts) for sha in args]
+        if action == b'FLUSH' and len(args) <= 1:
+            if args and args[0].upper() not in (b'ASYNC', b'SYNC'):
+                raise resp.Errors.SYNTAX
+            self.flush_scripts()
+            self.propagate(b'SCRIPT', (b'FLUSH',))
+            return resp.OK
+        raise resp.Error('ERR', 'Unknown subcommand or wrong number of arguments for {}'.format(action.decode()))
+
+    @redis_command('SAVE')
+    def execute_save(self):
+        if self.bgsave_child is not None:
+            raise resp.Error('ERR', 'Background save already in progress')
+        self.save()
+        return resp.OK
+
+    @redis_command('BGSAVE')
+    def execute_bgsave(self, *options):
+        if any(option.upper() != b'SCHEDULE' for option in options):
+            raise resp.Errors.SYNTAX
+        if self.bgsave_child is not None:
+            raise resp.Error('ERR', 'Background save already in progress')
+        if self.aof_rewrite_child is not None:
+            raise resp.Error('ERR', 'Background append only file rewriting in progress')
+        self.bgsave()
+        return resp.Status(b'Background saving started')
 
-        raise NotImplementedError()
+    @redis_command('BGREWRITEAOF')
+    def execute_bgrewriteaof(self):
+        if self.aof is None:
+            raise resp.Error('ERR', 'Append only file is disabled')
+        if self.aof_rewrite_child is not None:
+            raise resp.Error('ERR', 'Background append only file rewriting already in progress')
+        if self.bgsave_child is not None:
+            self.aof_rewrite_scheduled = True
+            return resp.Status(b'Background append only file rewriting scheduled')
+        self.bgrewriteaof()
+        return resp.Status(b'Background append only file rewriting started')
+
+    @redis_command('LASTSAVE')
+    def execute_lastsave(self):
+        return self.lastsave
+
+    @redis_command('DBSIZE')
+    def execute_dbsize(self):
+        return len(self.keys)
+
+    @redis_command('FLUSHALL', propagate=True)
+    def execute_flushall(self, *options):
+        if len(options) > 1 or options and options[0].upper() not in (b'ASYNC', b'SYNC'):
+            raise resp.Errors.SYNTAX
+        self.flushall()
+        return resp.OK
+
+    @redis_command('FLUSHDB', propagate=True)
+    def execute_flushdb(self, *options):
+        return self.execute_flushall(*options)
+
+    @redis_command('PING')
+    def execute_ping(self, message=None):
+        if message is None:
+            return resp.Status(b'PONG')
+        return message
+
+    @redis_command('PUBLISH')
+    def execute_publish(self, channel, message):
+        return self.pubsub.publish(channel, message)
+
+    @redis_command('PUBSUB')
+    def execute_pubsub(self, subcommand, *args):
+        subcommand = subcommand.upper()
+        if subcommand == b'CHANNELS' and len(args) <= 1:
+            return self.pubsub.execute_channels(*args)
+        if subcommand == b'NUMSUB':
+            return self.pubsub.execute_numsub(*args)
+        if subcommand == b'NUMPAT' and not args:
+            return self.pubsub.execute_numpat()
+        raise resp.Error('ERR', 'Unknown subcommand or wrong number of arguments for {}'.format(subcommand.decode()))
+
+    @redis_command('REPLICAOF')
+    def execute_replicaof(self, host, port):
+        if host.upper() == b'NO' and port.upper() == b'ONE':
+            self.replication.stop()
+            return resp.OK
+        self.replication.replicaof(host.decode(), parse_int(port))
+        return resp.OK
+
+    @redis_command('SLAVEOF')
+    def execute_slaveof(self, host, port):
+        return self.execute_replicaof(host, port)
+
+    @redis_command('REPLCONF')
+    def execute_replconf(self, *options):
+        return resp.OK
+
+    @redis_command('ROLE')
+    def execute_role(self):
+        return self.replication.role()
+
+    @redis_command('COMMAND')
+    def execute_command(self, subcommand=None, *args):
+        specs = self.command_specs
+        if subcommand is None:
+            return [spec.info() for spec in specs.values()]
+
+        subcommand = subcommand.upper()
+        if subcommand == b'COUNT' and not args:
+            return len(specs)
+        if subcommand == b'INFO':
+            return [specs[name.upper()].info() if name.upper() in specs else resp.NIL for name in args]
+        if subcommand == b'GETKEYS' and args:
+            dispatch = self.lookup_command(args[0])
+            if not dispatch.spec.min_args <= len(args) - 1 <= dispatch.spec.max_args:
+                raise resp.Error('ERR', 'Invalid number of arguments specified for command')
+            return list(dispatch.spec.get_keys(args[1:]))
+        raise resp.Errors.SYNTAX
+
+    @redis_command('CLUSTER')
+    def execute_cluster(self, subcommand, *args):
+        cluster = self.cluster
+        if cluster is None:
+            raise resp.Error('ERR', 'This instance has cluster support disabled')
+
+        subcommand = subcommand.upper()
+        if subcommand == b'KEYSLOT' and len(args) == 1:
+            return key_hash_slot(args[0])
+        if subcommand == b'MYID' and not args:
+            return cluster.myself.node_id
+        if subcommand == b'SLOTS' and not args:
+            return cluster.execute_slots()
+        if subcommand == b'SHARDS' and not args:
+            return cluster.execute_shards()
+        if subcommand == b'NODES' and not args:
+            return cluster.execute_nodes()
+        if subcommand == b'INFO' and not args:
+            return cluster.execute_info()
+        if subcommand == b'COUNTKEYSINSLOT' and len(args) == 1:
+            slot = self.parse_slot(args[0])
+            return sum(1 for key in self.keys if key_hash_slot(key) == slot)
+        if subcommand == b'GETKEYSINSLOT' and len(args) == 2:
+            slot = self.parse_slot(args[0])
+            count = parse_int(args[1])
+            if count < 0:
+                raise resp.Error('ERR', 'Invalid number of keys')
+            keys = (key for key in self.keys if key_hash_slot(key) == slot)
+            return [key for key, _ in zip(keys, range(count))]
+        if subcommand == b'SETSLOT' and len(args) in (2, 3):
+            return cluster.execute_setslot(self.parse_slot(args[0]), *args[1:])
+        raise resp.Error('ERR', 'Unknown subcommand or wrong number of arguments for {}'.format(subcommand.decode()))
+
+    @staticmethod
+    def parse_slot(value):
+        try:
+            slot = int(value)
+        except ValueError:
+            slot = -1
+        if not 0 <= slot < CLUSTER_SLOTS:
+            raise resp.Error('ERR', 'Invalid or out of range slot')
+        return slot
 
     def assert_key_type(self, key, type_):
         if key not in self.keys:
@@ -0,0 +1,300 @@
+"""
+Primary/replica replication
+
+A replica sends PSYNC with the replication id and offset it already has. The primary
+either continues from its backlog (+CONTINUE) or sends a snapshot (+FULLRESYNC) followed
+by the stream of write commands, the same RESP commands as in the append only file.
+Offsets count the bytes of the command stream
+"""
+import io
+import os
+import asyncio
+import binascii
+
+from . import aof
+from . import resp
+from . import snapshot
+
+# delay between reconnection attempts of a replica, seconds
+RECONNECT_INTERVAL = 1
+
+
+def generate_replid():
+    return binascii.hexlify(os.urandom(20))
+
+
+class ReplicationBacklog:
+    """
+    The latest part of the command stream kept for partial resynchronization
+    """
+
+    def __init__(self, size, offset):
+        self.size = size
+        self.data = bytearray()
+        # stream offset of the first byte of data
+        self.start = offset
+
+    @property
+    def end(self):
+        return self.start + len(self.data)
+
+    def append(self, data):
+        self.data += data
+        # trimmed by large steps, deleting from the start of the buffer is amortized
+        if len(self.data) > 2 * self.size:
+            trim = len(self.data) - self.size
+            del self.data[:trim]
+            self.start += trim
+
+    def since(self, offset):
+        """
+        Stream data after the offset, None if it is no longer available
+        """
+        if not self.start <= offset <= self.end:
+            return None
+        return bytes(self.data[offset - self.start:])
+
+
+class Replication:
+    """
+    Replication state of a server, it acts as a primary for the attached replicas
+    and as a replica when master is set
+    """
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.loop = None
+        self.replid = generate_replid()
+        self.offset = 0
+        self.backlog = None
+        # write command stream of the current event loop iteration
+        self.pending = bytearray()
+        self.replicas = {}
+        self.stat_sync_full = 0
+        self.stat_sync_partial_ok = 0
+
+        # replica role
+        self.master = None
+        self.master_replid = None
+        self.master_offset = 0
+        self.master_link = False
+        self.task = None
+
+    def start(self, loop):
+        self.loop = loop
+        replicaof = self.redis.config.replicaof
+        if replicaof is not None:
+            if isinstance(replicaof, str):
+                self.replicaof(replicaof)
+            else:
+                self.replicaof(*replicaof)
+
+    def feed(self, command, args):
+        if not self.pending:
+            # the stream of all commands executed in the iteration is sent at once
+            self.loop.call_soon(self.flush)
+        aof.encode_command(self.pending, command, args)
+
+    def flush(self):
+        if not self.pending:
+            return
+        data = bytes(self.pending)
+        self.pending = bytearray()
+        self.backlog.append(data)
+        self.offset += len(data)
+
+        limit = self.redis.config.replica_output_buffer_limit
+        for writer in list(self.replicas):
+            transport = writer.transport
+            if transport.is_closing():
+                self.detach(writer)
+                continue
+            writer.write(data)
+            if limit and transport.get_write_buffer_size() > limit:
+                # a replica that can't keep up gets a full resynchronization when it reconnects
+                self.detach(writer)
+                writer.close()
+
+    def sync(self, writer, replid, offset):
+        """
+        Attach the connection as a replica, PSYNC handler
+        """
+        if self.loop is None:
+            raise resp.Error('ERR', 'Replication requires a running server')
+        if writer is None:
+            raise resp.Error('ERR', 'PSYNC is only allowed over a connection')
+
+        if self.backlog is None:
+            self.backlog = ReplicationBacklog(self.redis.config.repl_backlog_size, self.offset)
+            self.redis.propagation_targets.append(self)
+        # the commands already executed must not be sent after a snapshot which includes them
+        self.flush()
+
+        data = None
+        if replid == self.replid:
+            data = self.backlog.since(offset)
+        if data is not None:
+            writer.write(b'+CONTINUE %s\r\n' % self.replid)
+            writer.write(data)
+            self.stat_sync_partial_ok += 1
+        else:
+            buffer = io.BytesIO()
+            snapshot.write_snapshot(buffer, self.redis.keys, self.redis.script_sources.values())
+            payload = buffer.getvalue()
+            writer.write(b'+FULLRESYNC %s %d\r\n$%d\r\n' % (self.replid, self.offset, len(payload)))
+            writer.write(payload)
+            self.stat_sync_full += 1
+
+        self.replicas[writer] = writer.get_extra_info('peername')
+        return resp.NO_REPLY
+
+    def detach(self, writer):
+        self.replicas.pop(writer, None)
+
+    def replicaof(self, host, port=None):
+        """
+        Replicate the primary at host and port, or at the unix socket path when port is None
+        """
+        if self.loop is None:
+            raise resp.Error('ERR', 'Replication requires a running server')
+        if self.master == (host, port):
+            return
+
+        self.stop()
+        self.master = (host, port)
+        self.redis.read_only = self.redis.config.replica_read_only
+        if self.redis.cluster is not None:
+            self.redis.cluster.master = self.redis.cluster.nodes.get((host, port))
+        self.task = self.loop.create_task(self.run_replica(host, port))
+
+    def stop(self):
+        """
+        Stop replicating, the replica becomes a primary keeping its dataset
+        """
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        self.master = None
+        self.master_link = False
+        self.redis.read_only = False
+        if self.redis.cluster is not None:
+            self.redis.cluster.master = None
+
+    def reset(self):
+        """
+        Forget the replica role, the attached replicas and the backlog, the server starts a new history
+        """
+        self.stop()
+        if self in self.redis.propagation_targets:
+            self.redis.propagation_targets.remove(self)
+        self.replid = generate_replid()
+        self.offset = 0
+        self.backlog = None
+        self.pending = bytearray()
+        self.replicas = {}
+        self.stat_sync_full = 0
+        self.stat_sync_partial_ok = 0
+        self.master_replid = None
+        self.master_offset = 0
+
+    async def run_replica(self, host, port):
+        while True:
+            writer = None
+            try:
+                if port is None:
+                    reader, writer = await asyncio.open_unix_connection(host)
+                else:
+                    reader, writer = await asyncio.open_connection(host, port)
+                await self.sync_with_master(reader, writer)
+            except (OSError, EOFError, asyncio.IncompleteReadError, resp.ProtocolError, resp.Error):
+                pass
+            finally:
+                self.master_link = False
+                if writer is not None:
+                    writer.close()
+            await asyncio.sleep(RECONNECT_INTERVAL)
+
+    async def sync_with_master(self, reader, writer):
+        # handshake commands wait for each reply, PSYNC writes its reply straight to the connection
+        for command, args in ((b'PING', ()), (b'REPLCONF', (b'capa', b'psync2'))):
+            request = bytearray()
+            aof.encode_command(request, command, args)
+            writer.write(request)
+            line = await reader.readline()
+            if not line.startswith(b'+'):
+                raise EOFError()
+
+        request = bytearray()
+        aof.encode_command(request, b'PSYNC', (self.master_replid or b'?', self.master_offset))
+        writer.write(request)
+
+        line = await reader.readline()
+        if line.startswith(b'+FULLRESYNC '):
+            _, replid, offset = line.split()
+            length = int((await reader.readline())[1:])
+            self.load(await reader.readexactly(length))
+            self.master_replid = replid
+            self.master_offset = int(offset)
+        elif line.startswith(b'+CONTINUE'):
+            pass
+        else:
+            raise EOFError()
+
+        self.master_link = True
+        parser = resp.RequestParser()
+        # the arguments of a partially received command are released from the parser buffer,
+        # only complete commands advance the offset sent by PSYNC when the link is restored
+        offset = self.master_offset
+        redis = self.redis
+        while True:
+            data = await reader.read(redis.config.read_buffer_size)
+            if not data:
+                raise EOFError()
+            parser.feed(data)
+            commands = parser.get_commands(len(data))
+            self.master_offset = offset + parser.parsed
+
+            redis.loading = True
+            try:
+                for command, *args in commands:
+                    try:
+                        redis.lookup_command(command)(*args)
+                    except resp.Error:
+                        pass
+            finally:
+                redis.loading = False
+
+    def load(self, data):
+        """
+        Replace the dataset by the snapshot received from the primary
+        """
+        redis = self.redis
+        redis.replace_keyspace()
+        redis.loading = True
+        try:
+            redis.load_records(snapshot.read_snapshot(data, config=redis.config))
+        finally:
+            redis.loading = False
+        for tracker in redis.trackers:
+            for key in redis.keys:
+                tracker.touch(key, False)
+
+        if redis.aof is not None:
+            # the log has to describe the new dataset
+            if redis.aof_rewrite_child is None and redis.bgsave_child is None:
+                redis.bgrewriteaof()
+            else:
+                redis.aof_rewrite_scheduled = True
+
+    def role(self):
+        if self.master is None:
+            replicas = []
+            for address in self.replicas.values():
+                # peer address of the replica connection, empty for unix sockets
+                host, port = address[:2] if isinstance(address, tuple) else ('', 0)
+                replicas.append([host.encode(), str(port).encode(), str(self.offset).encode()])
+            return [b'master', self.offset, replicas]
+
+        host, port = self.master
+        state = b'connected' if self.master_link else b'connect'
+        return [b'slave', host.encode(), port or 0, state, self.master_offset]
@@ -2,6 +2,8 @@ SYM_CRLF = b'\r\n'
 OK = object()
 QUEUED = object()
 NIL = None
+# the command wrote its reply to the connection itself
+NO_REPLY = object()
 
 
 class Error(Exception):
@@ -10,68 +12,266 @@ class Error(Exception):
         self.message = msg
 
 
+class ProtocolError(Exception):
+    pass
+
+
+class Replies(list):
+    """
+    Several replies of a single command, like the confirmations of SUBSCRIBE
+    """
+
+
+class Status:
+    """
+    Simple string reply
+    """
+
+    def __init__(self, value):
+        self.value = value
+
+
 class Errors:
     INVALID_CURSOR = Error('ERR', 'invalid cursor')
+    SYNTAX = Error('ERR', 'syntax error')
+    OOM = Error('OOM', "command not allowed when used memory > 'maxmemory'.")
     NOT_INT = Error('ERR', 'value is not an integer or out of range')
+    NOT_FLOAT = Error('ERR', 'value is not a valid float')
     WRONGTYPE = Error('WRONGTYPE', 'Operation against a key holding the wrong kind of value')
+    READONLY = Error('READONLY', "You can't write against a read only replica.")
+
+
+# protocol limits, the same as the defaults of the real Redis
+PROTO_MAX_BULK_LEN = 512 * 1024 * 1024
+PROTO_MAX_MULTIBULK_LEN = 1024 * 1024
+PROTO_INLINE_MAX_SIZE = 64 * 1024
+
+_STAR = ord('*')
+_DOLLAR = ord('$')
+
+
+def _parse_length(data, error):
+    try:
+        return int(data)
+    except ValueError:
+        raise ProtocolError(error)
+
+
+class RequestParser:
+    """
+    Incremental parser of client requests, both multibulk and inline commands
+
+    Data is appended to a single buffer and parsed in place, a partially received
+    command keeps its state so that large arrays and values are never parsed twice.
+    Bulk strings are sliced from the buffer with a memoryview and copied only once,
+    when the argument is materialized as bytes
+    """
+
+    def __init__(self, max_bulk_length=PROTO_MAX_BULK_LEN):
+        self.max_bulk_length = max_bulk_length
+        self.buffer = bytearray()
+        self.pos = 0
+        # stream offsets: data released from the buffer and the end of the last complete command
+        self.released = 0
+        self.parsed = 0
+        # state of a partially received multibulk command
+        self.args = None
+        self.remaining = 0
+        self.bulk_length = -1
+
+    def feed(self, data):
+        self.buffer += data
+
+    def get_commands(self, limit):
+        """
+        Parse up to limit complete commands received so far
+        """
+        commands = []
+        buffer = self.buffer
+        try:
+            with memoryview(buffer) as view:
+                while len(commands) < limit:
+                    command = self._parse_command(buffer, view)
+                    if command is None:
+                        break
+                    self.parsed = self.released + self.pos
+                    if command:
+                        commands.append(command)
+        finally:
+            # release consumed data, deleting from the start of bytearray doesn't move memory
+            if self.pos:
+                del buffer[:self.pos]
+                self.released += self.pos
+                self.pos = 0
+        return commands
+
+    def _parse_command(self, buffer, view):
+        if self.args is None:
+            if self.pos >= len(buffer):
+                return None
+            if buffer[self.pos] != _STAR:
+                return self._parse_inline(buffer)
+
+            end = buffer.find(SYM_CRLF, self.pos)
+            if end == -1:
+                if len(buffer) - self.pos > PROTO_INLINE_MAX_SIZE:
+                    raise ProtocolError('too big mbulk count string')
+                return None
+
+            count = _parse_length(buffer[self.pos + 1:end], 'invalid multibulk length')
+            if count > PROTO_MAX_MULTIBULK_LEN:
+                raise ProtocolError('invalid multibulk length')
+            self.pos = end + 2
+            if count <= 0:
+                return []
+
+            self.args = []
+            self.remaining = count
+
+        args = self.args
+        size = len(buffer)
+        pos = self.pos
+        remaining = self.remaining
+        bulk_length = self.bulk_length
+        try:
+            while remaining:
+                if bulk_length < 0:
+                    end = buffer.find(SYM_CRLF, pos)
+                    if end == -1:
+                        if size - pos > PROTO_INLINE_MAX_SIZE:
+                            raise ProtocolError('too big bulk count string')
+                        return None
+                    if buffer[pos] != _DOLLAR:
+                        raise ProtocolError("expected '$', got '{}'".format(chr(buffer[pos])))
+
+                    bulk_length = _parse_length(buffer[pos + 1:end], 'invalid bulk length')
+                    if bulk_length < 0 or bulk_length > self.max_bulk_length:
+                        raise ProtocolError('invalid bulk length')
+                    pos = end + 2
 
+                end = pos + bulk_length
+                if end + 2 > size:
+                    return None
 
-async def read_command(reader):
-    data = await reader.readuntil(SYM_CRLF)
+                args.append(view[pos:end].tobytes())
+                pos = end + 2
+                bulk_length = -1
+                remaining -= 1
+        finally:
+            self.pos = pos
+            self.remaining = remaining
+            self.bulk_length = bulk_length
 
-    type_ = chr(data[0])
-    data = data[1:-len(SYM_CRLF)]
+        self.args = None
+        return args
 
-    if type_ == ':':
-        return float(data)
-    if type_ == '$':
-        length = int(data)
-        if length == -1:
+    def _parse_inline(self, buffer):
+        end = buffer.find(b'\n', self.pos)
+        if end == -1:
+            if len(buffer) - self.pos > PROTO_INLINE_MAX_SIZE:
+                raise ProtocolError('too big inline request')
             return None
-        string = await reader.readexactly(length)
-        await reader.readexactly(len(SYM_CRLF))
-        return string
-    if type_ == '*':
-        length = int(data)
-        return [
-            await read_command(reader) for _ in range(length)
-        ]
 
-    raise NotImplementedError('Unknown message type: {}'.format(type_))
+        line = bytes(buffer[self.pos:end])
+        self.pos = end + 1
+        return line.split()
 
 
-def _resp_dumps(value):
-    if value is OK:
-        return [b'+OK']
+# pre-encoded replies shared by every connection, like the shared objects of the real Redis
+OK_REPLY = b'+OK\r\n'
+QUEUED_REPLY = b'+QUEUED\r\n'
+NIL_REPLY = b'$-1\r\n'
+SHARED_INTEGERS = 10000
+SHARED_HEADERS = 1024
 
-    if value is NIL:
-        return [b'$-1']
+_INTEGER_REPLIES = [b':%d\r\n' % value for value in range(SHARED_INTEGERS)]
+_BULK_HEADERS = [b'$%d\r\n' % length for length in range(SHARED_HEADERS)]
+_ARRAY_HEADERS = [b'*%d\r\n' % length for length in range(SHARED_HEADERS)]
 
-    if value is QUEUED:
-        return [b'+QUEUED']
 
-    if isinstance(value, int):
-        return [b':' + str(value).encode()]
+class ReplyEncoder:
+    """
+    Encodes replies straight into an output buffer reused for all replies of a batch,
+    nested arrays are encoded iteratively
+    """
 
-    if isinstance(value, str):
-        value = value.encode()
+    def __init__(self):
+        self.buffer = bytearray()
 
-    if isinstance(value, bytes):
-        return [b'$' + str(len(value)).encode(), value]
+    def take(self):
+        """
+        Return the encoded data and start a new buffer
+        """
+        buffer = self.buffer
+        self.buffer = bytearray()
+        return buffer
 
-    if isinstance(value, Error):
-        return [b'-' + str(value.class_).encode() + b' ' + str(value.message).encode()]
+    def write(self, value):
+        out = self.buffer
+        stack = [iter((value,))]
 
-    if isinstance(value, (list, tuple)):
-        result = [b'*' + str(len(value)).encode()]
-        for item in value:
-            result.extend(_resp_dumps(item))
-        return result
+        while stack:
+            for value in stack[-1]:
+                type_ = type(value)
+                if type_ is bytes:
+                    length = len(value)
+                    out += _BULK_HEADERS[length] if length < SHARED_HEADERS else b'$%d\r\n' % length
+                    out += value
+                    out += SYM_CRLF
+                elif type_ is int:
+                    out += _INTEGER_REPLIES[value] if 0 <= value < SHARED_INTEGERS else b':%d\r\n' % value
+                elif value is OK:
+                    out += OK_REPLY
+                elif value is NIL:
+                    out += NIL_REPLY
+                elif type_ is list or type_ is tuple:
+                    length = len(value)
+                    out += _ARRAY_HEADERS[length] if length < SHARED_HEADERS else b'*%d\r\n' % length
+                    # continue with the nested array, the outer iterator is resumed afterwards
+                    stack.append(iter(value))
+                    break
+                elif value is QUEUED:
+                    out += QUEUED_REPLY
+                elif self._write_other(out, value):
+                    stack.append(iter(value))
+                    break
+            else:
+                stack.pop()
 
-    raise NotImplementedError()
+    @staticmethod
+    def _write_other(out, value):
+        """
+        Encode less common reply types, returns True for arrays to be expanded by the caller
+        """
+        if value is NO_REPLY:
+            pass
+        elif isinstance(value, Replies):
+            # written one after another without an array header
+            return True
+        elif isinstance(value, Status):
+            out += b'+%s\r\n' % value.value
+        elif isinstance(value, Error):
+            out += b'-%s %s\r\n' % (str(value.class_).encode(), str(value.message).encode())
+        elif isinstance(value, int):
+            out += b':%d\r\n' % value
+        elif isinstance(value, str):
+            value = value.encode()
+            out += b'$%d\r\n' % len(value)
+            out += value
+            out += SYM_CRLF
+        elif isinstance(value, (bytes, bytearray, memoryview)):
+            out += b'$%d\r\n' % len(value)
+            out += value
+            out += SYM_CRLF
+        elif isinstance(value, (list, tuple)):
+            out += b'*%d\r\n' % len(value)
+            return True
+        else:
+            raise NotImplementedError()
+        return False
 
 
 def dump_response(value):
-    response = _resp_dumps(value)
-    response = SYM_CRLF.join(response) + SYM_CRLF
-    return response
+    encoder = ReplyEncoder()
+    encoder.write(value)
+    return bytes(encoder.buffer)
@@ -0,0 +1,205 @@
+"""
+Lua scripting runtime
+
+Scripts are compiled once into Lua functions taking numkeys and the arguments, KEYS and ARGV
+are built on the Lua side. redis.call resolves the command handler once per command name
+and converts replies the way Redis does: nil -> false, status -> {ok=...}, error -> {err=...}
+"""
+import hashlib
+
+from lupa import LuaRuntime, LuaError, lua_type
+
+from . import resp
+from .blocking import Blocked
+
+# reply kinds returned to the Lua wrappers along with the value
+STATUS = 1
+ERROR = 2
+
+PRELUDE = b'''
+local py_call, py_pcall, sha1hex = ...
+local STATUS, ERROR = 1, 2
+
+local function reply(value, kind)
+    if kind == STATUS then
+        return {ok = value}
+    end
+    if kind == ERROR then
+        return {err = value}
+    end
+    return value
+end
+
+redis = {
+    call = function(...) return reply(py_call(...)) end,
+    pcall = function(...) return reply(py_pcall(...)) end,
+    status_reply = function(status) return {ok = status} end,
+    error_reply = function(error) return {err = error} end,
+    sha1hex = sha1hex,
+    log = function() end,
+    replicate_commands = function() return true end,
+    set_repl = function() end,
+    LOG_DEBUG = 0, LOG_VERBOSE = 1, LOG_NOTICE = 2, LOG_WARNING = 3,
+    REPL_NONE = 0, REPL_AOF = 1, REPL_SLAVE = 2, REPL_REPLICA = 2, REPL_ALL = 3,
+}
+'''
+
+SCRIPT_TEMPLATE = b'''
+local unpack = table.unpack or unpack
+return function(num_keys, ...)
+    KEYS = {unpack({...}, 1, num_keys)}
+    ARGV = {unpack({...}, num_keys + 1, select('#', ...))}
+%s
+end
+'''
+
+
+def script_sha(script):
+    return hashlib.sha1(script).hexdigest().encode()
+
+
+def error_message(error):
+    return '{} {}'.format(error.class_, error.message).strip().encode()
+
+
+def to_arg(value):
+    """
+    Lua numbers passed to redis.call are converted to strings like Redis does
+    """
+    if isinstance(value, bytes):
+        return value
+    if isinstance(value, float) and not value.is_integer():
+        return '{:.17g}'.format(value).encode()
+    if isinstance(value, (int, float)):
+        return str(int(value)).encode()
+    raise resp.Error('ERR', 'Lua redis lib command arguments must be strings or integers')
+
+
+class ScriptRuntime:
+    def __init__(self, redis):
+        self.redis = redis
+        self.lua = LuaRuntime(encoding=None, unpack_returned_tuples=True)
+        # command name as sent by scripts -> (dispatch, is write command)
+        self.handlers = {}
+        self.lua.execute(PRELUDE, self.call, self.pcall, lambda value: script_sha(to_arg(value)))
+
+    def compile(self, script):
+        try:
+            return self.lua.execute(SCRIPT_TEMPLATE % script)
+        except LuaError as e:
+            raise resp.Error('ERR', 'Error compiling script: {}'.format(str(e).splitlines()[0]))
+
+    def run(self, func, num_keys, args):
+        try:
+            num_keys = int(num_keys)
+        except ValueError:
+            raise resp.Errors.NOT_INT
+        if num_keys < 0:
+            raise resp.Error('ERR', "Number of keys can't be negative")
+        if num_keys > len(args):
+            raise resp.Error('ERR', "Number of keys can't be greater than number of args")
+
+        try:
+            result = func(num_keys, *args)
+        except LuaError as e:
+            raise resp.Error('ERR', 'Error running script: {}'.format(str(e).splitlines()[0]))
+        return self.from_lua(result)
+
+    def resolve(self, name):
+        dispatch = self.redis.lookup_command(name)
+        handler = (dispatch, dispatch.spec.write)
+        if len(self.handlers) < len(self.redis.execute_map) * 2:
+            self.handlers[name] = handler
+        return handler
+
+    def call(self, name, *args):
+        handler = self.handlers.get(name)
+        if handler is None:
+            handler = self.resolve(to_arg(name))
+        dispatch, write = handler
+        if write and self.redis.read_only:
+            raise resp.Errors.READONLY
+
+        for arg in args:
+            if type(arg) is not bytes:
+                args = [to_arg(arg) for arg in args]
+                break
+
+        value = dispatch(*args)
+        type_ = type(value)
+        if type_ is bytes or type_ is int:
+            return value
+        return self.to_lua(value)
+
+    def pcall(self, name, *args):
+        try:
+            return self.call(name, *args)
+        except resp.Error as e:
+            return error_message(e), ERROR
+
+    def to_lua(self, value):
+        """
+        Reply of a command handler as returned by redis.call, with the kind for the Lua wrapper
+        """
+        if value is None or type(value) is Blocked:
+            # blocking commands do not block in scripts
+            return False
+        if value is resp.OK:
+            return b'OK', STATUS
+        if isinstance(value, resp.Status):
+            return value.value, STATUS
+        if isinstance(value, resp.Error):
+            raise value
+        if isinstance(value, (list, tuple)):
+            return self.lua.table_from([self.to_lua_item(item) for item in value])
+        return value
+
+    def to_lua_item(self, value):
+        type_ = type(value)
+        if type_ is bytes or type_ is int:
+            return value
+        if value is None:
+            return False
+        if value is resp.OK:
+            return self.lua.table_from({b'ok': b'OK'})
+        if isinstance(value, resp.Status):
+            return self.lua.table_from({b'ok': value.value})
+        if isinstance(value, resp.Error):
+            return self.lua.table_from({b'err': error_message(value)})
+        if isinstance(value, (list, tuple)):
+            return self.lua.table_from([self.to_lua_item(item) for item in value])
+        return value
+
+    def from_lua(self, value):
+        """
+        Script result as a server reply: numbers are truncated to integers, false is nil, true is 1,
+        tables are arrays up to the first nil unless they have an ok or err field
+        """
+        type_ = type(value)
+        if type_ is bytes or type_ is int:
+            return value
+        if type_ is float:
+            return int(value)
+        if value is None or value is False:
+            return None
+        if value is True:
+            return 1
+        if lua_type(value) != 'table':
+            return None
+
+        error = value[b'err']
+        if error is not None:
+            class_, _, message = to_arg(error).partition(b' ')
+            return resp.Error(class_.decode(), message.decode())
+        status = value[b'ok']
+        if status is not None:
+            return resp.Status(to_arg(status))
+
+        result = []
+        index = 1
+        item = value[1]
+        while item is not None:
+            result.append(self.from_lua(item))
+            index += 1
+            item = value[index]
+        return result
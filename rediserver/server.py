@@ -1,56 +1,184 @@
+import os
+import signal
 import asyncio
 import asyncio.streams
+import multiprocessing
 
 from threading import Thread, Event
 
 from . import resp
 from .redis import Redis
+from .config import Config
+from .cluster import split_slots
 from .queue import CommandQueue
+from .blocking import Blocked
 
 
-def create_redis_server():
-    redis_server = Redis()
+def execute_command(transaction, command, command_args):
+    try:
+        return transaction.execute(command, *command_args)
+    except resp.Error as e:
+        transaction.reset()
+        return e
+    except Exception as e:
+        transaction.reset()
+        return resp.Error('UNKNOWN', str(e))
+    finally:
+        # clients blocked on the lists the command pushed to
+        blocking = transaction.redis.blocking
+        if blocking.ready:
+            blocking.serve()
+
+
+async def reset_server(redis_server, keep_scripts=False):
+    """
+    Disconnect the clients and empty the dataset, so that a server is reused between tests
+    """
+    for transaction in list(redis_server.clients):
+        transaction.writer.transport.abort()
+    # the connection handlers release watched keys, subscriptions and blocked commands
+    while redis_server.clients:
+        await asyncio.sleep(0)
+
+    redis_server.replication.reset()
+    redis_server.flushall()
+    if not keep_scripts:
+        redis_server.flush_scripts()
+    redis_server.dirty = 0
+
+
+async def wait_blocked(redis_server, blocked, reader, parser):
+    """
+    Wait until the blocked command is served or times out. Data received meanwhile is queued
+    in the parser, a closed connection stops the wait so that it is not served
+    """
+    loop = asyncio.get_event_loop()
+    future = redis_server.blocking.block(blocked)
+    deadline = loop.time() + blocked.timeout if blocked.timeout else None
+    read = None
+    try:
+        while not future.done():
+            timeout = None if deadline is None else deadline - loop.time()
+            if timeout is not None and timeout <= 0:
+                return resp.NIL
+            if read is None:
+                read = loop.create_task(reader.read(redis_server.config.read_buffer_size))
+            await asyncio.wait((future, read), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if read.done():
+                data = read.result()
+                read = None
+                if not data:
+                    raise ConnectionResetError()
+                parser.feed(data)
+        return future.result()
+    finally:
+        redis_server.blocking.unblock(blocked)
+        if read is not None:
+            # unread data stays buffered in the reader
+            read.cancel()
+            try:
+                await read
+            except asyncio.CancelledError:
+                pass
+
+
+def create_group_commit(redis_server):
+    """
+    The append only file is written once per event loop iteration for the commands
+    of all the connections served in the iteration, replies wait for the write
+    """
+    pending = []
+
+    def flush():
+        future = pending.pop()
+        try:
+            redis_server.aof.flush()
+        except Exception as e:
+            future.set_exception(e)
+        else:
+            future.set_result(None)
+
+    def wait():
+        if not pending:
+            loop = asyncio.get_event_loop()
+            pending.append(loop.create_future())
+            loop.call_soon(flush)
+        return pending[0]
+
+    return wait
+
+
+def create_redis_server(config=None):
+    redis_server = Redis(config)
+    redis_server.load()
+    config = redis_server.config
+    group_commit = create_group_commit(redis_server)
 
     async def on_connect(reader, writer):
-        transaction = CommandQueue(redis_server)
+        transaction = CommandQueue(redis_server, writer)
+        redis_server.clients.add(transaction)
+        parser = resp.RequestParser(max_bulk_length=config.proto_max_bulk_len)
+        encoder = resp.ReplyEncoder()
+
+        async def flush():
+            if redis_server.aof is not None and redis_server.aof.buffer:
+                await group_commit()
+            writer.write(encoder.take())
+            await writer.drain()
 
         try:
             while True:
-                command, *command_args = await resp.read_command(reader)
-                try:
-                    result = transaction.execute(command, *command_args)
-                except resp.Error as e:
-                    response = resp.dump_response(e)
-                    transaction.reset()
-                except Exception as e:
-                    response = resp.dump_response(
-                        resp.Error('UNKNOWN', str(e))
-                    )
-                    transaction.reset()
-                else:
-                    response = resp.dump_response(result)
-
-                writer.write(response)
-                await writer.drain()
-        except asyncio.streams.IncompleteReadError:
+                data = await reader.read(config.read_buffer_size)
+                if not data:
+                    break
+                parser.feed(data)
+
+                while True:
+                    # execute every complete command already received and flush the replies at once
+                    try:
+                        commands = parser.get_commands(config.pipeline_max_batch)
+                    except resp.ProtocolError as e:
+                        writer.write(resp.dump_response(resp.Error('ERR', 'Protocol error: {}'.format(e))))
+                        await writer.drain()
+                        return
+
+                    if not commands:
+                        break
+
+                    for command, *command_args in commands:
+                        reply = execute_command(transaction, command, command_args)
+                        if type(reply) is Blocked:
+                            # replies of the previous commands are not held while blocked
+                            await flush()
+                            reply = await wait_blocked(redis_server, reply, reader, parser)
+                        encoder.write(reply)
+                    await flush()
+        except ConnectionError:
+            pass
+        finally:
+            # release watched keys of the dropped connection
+            transaction.reset()
+            redis_server.pubsub.unsubscribe_all(transaction)
+            redis_server.replication.detach(writer)
+            redis_server.clients.discard(transaction)
             writer.close()
 
     return redis_server, on_connect
 
 
-def run_tcp(host='127.0.0.1', port=6379):
-    run(endpoint=(host, port))
+def run_tcp(host='127.0.0.1', port=6379, **options):
+    run(endpoint=(host, port), **options)
 
 
-def run_sock(path):
-    run(unix_domain_socket=path)
+def run_sock(path, **options):
+    run(unix_domain_socket=path, **options)
 
 
-def _create(endpoint=None, unix_domain_socket=None):
+def _create(endpoint=None, unix_domain_socket=None, **options):
     assert (unix_domain_socket is None) != (endpoint is None)
 
     loop = asyncio.new_event_loop()
-    redis_instance, on_connect = create_redis_server()
+    redis_instance, on_connect = create_redis_server(Config(**options))
 
     if unix_domain_socket:
         socket_server = asyncio.start_unix_server(on_connect, path=unix_domain_socket, loop=loop)
@@ -58,15 +186,22 @@ def _create(endpoint=None, unix_domain_socket=None):
         host, port = endpoint
         socket_server = asyncio.start_server(on_connect, host=host, port=port, loop=loop)
 
+    _schedule_cron(loop, redis_instance)
+    redis_instance.replication.start(loop)
     return redis_instance, loop, socket_server
 
 
-def _run_forever(loop, socket_server, started_event=None):
-    server = loop.run_until_complete(socket_server)
+def _schedule_cron(loop, redis_instance):
+    interval = 1 / redis_instance.config.hz
 
-    if started_event:
-        started_event.set()
+    def cron():
+        redis_instance.cron()
+        loop.call_later(interval, cron)
+
+    loop.call_later(interval, cron)
 
+
+def _run_forever(loop, server):
     try:
         loop.run_forever()
     except KeyboardInterrupt:
@@ -77,29 +212,54 @@ def _run_forever(loop, socket_server, started_event=None):
     loop.close()
 
 
-def run(endpoint=None, unix_domain_socket=None):
-    redis_instance, loop, socket_server = _create(endpoint=endpoint, unix_domain_socket=unix_domain_socket)
-    _run_forever(loop, socket_server)
+def run(endpoint=None, unix_domain_socket=None, **options):
+    redis_instance, loop, socket_server = _create(
+        endpoint=endpoint, unix_domain_socket=unix_domain_socket, **options
+    )
+    try:
+        # graceful stop, e.g. of cluster workers
+        loop.add_signal_handler(signal.SIGTERM, loop.stop)
+    except (NotImplementedError, RuntimeError):
+        pass
+    _run_forever(loop, loop.run_until_complete(socket_server))
+    redis_instance.shutdown()
 
 
-def run_threaded(unix_domain_socket):
+def run_threaded(unix_domain_socket, **options):
     started_event = Event()
 
     class Data:
         def __init__(self):
             self.redis_instance = None
             self.loop = None
+            self.error = None
 
     data = Data()
 
     def thread_target():
-        data.redis_instance, data.loop, socket_server = _create(unix_domain_socket=unix_domain_socket)
-        _run_forever(data.loop, socket_server, started_event)
+        try:
+            data.redis_instance, data.loop, socket_server = _create(unix_domain_socket=unix_domain_socket, **options)
+            # e.g. the socket can't be bound
+            server = data.loop.run_until_complete(socket_server)
+        except Exception as e:
+            data.error = e
+            if data.redis_instance is not None:
+                data.redis_instance.shutdown()
+                data.loop.close()
+            started_event.set()
+            return
+        started_event.set()
+        _run_forever(data.loop, server)
+        data.redis_instance.shutdown()
 
     thread = Thread(target=thread_target)
     thread.start()
     started_event.wait()
 
+    if data.error is not None:
+        thread.join()
+        raise data.error
+
     def shutdown():
         for task in asyncio.Task.all_tasks():
             task.cancel()
@@ -108,4 +268,88 @@ def run_threaded(unix_domain_socket):
     def shutdown_callback():
         data.loop.call_soon_threadsafe(shutdown)
 
-    return data.redis_instance, thread, shutdown_callback
+    async def call(func, args):
+        result = func(*args)
+        if asyncio.iscoroutine(result):
+            result = await result
+        return result
+
+    def call_in_loop(func, *args):
+        """
+        Run func in the server thread between two commands and return its result, coroutines are awaited
+        """
+        return asyncio.run_coroutine_threadsafe(call(func, args), data.loop).result()
+
+    return data.redis_instance, thread, shutdown_callback, call_in_loop
+
+
+def cluster_nodes(host, ports):
+    """
+    Cluster topology of nodes listening on the ports, the slots are split evenly
+    """
+    return [(host, port, first, last) for port, (first, last) in zip(ports, split_slots(len(ports)))]
+
+
+def start_worker(host, port, **options):
+    """
+    Start a server process, persistent workers keep their files in a subdirectory of dir named by the port
+    """
+    if options.get('dbfilename') or options.get('appendonly'):
+        options['dir'] = os.path.join(options.get('dir', '.'), str(port))
+        os.makedirs(options['dir'], exist_ok=True)
+
+    process = multiprocessing.Process(target=run_tcp, args=(host, port), kwargs=options, daemon=True)
+    process.start()
+    return process
+
+
+def start_cluster(host, ports, **options):
+    """
+    Start a worker process per port, every worker is a cluster node owning a range of slots
+    """
+    nodes = cluster_nodes(host, ports)
+    return [
+        start_worker(host, port, cluster_nodes=nodes, cluster_announce=(host, port), **options)
+        for port in ports
+    ]
+
+
+def start_replicated(host, ports, **options):
+    """
+    Start a primary on the first port and its read only replicas on the other ports
+    """
+    primary = ports[0]
+    return [start_worker(host, primary, **options)] + [
+        start_worker(host, port, replicaof=(host, primary), **options)
+        for port in ports[1:]
+    ]
+
+
+def _serve_workers(processes):
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            process.terminate()
+            process.join()
+
+
+def run_cluster(host='127.0.0.1', port=7000, workers=None, **options):
+    """
+    Serve a cluster of worker processes listening on consecutive ports starting from port,
+    a worker per CPU by default
+    """
+    ports = [port + index for index in range(workers or os.cpu_count())]
+    _serve_workers(start_cluster(host, ports, **options))
+
+
+def run_replicated(host='127.0.0.1', port=6379, workers=None, **options):
+    """
+    Serve a primary on port and read only replicas on the following ports,
+    a process per CPU by default
+    """
+    ports = [port + index for index in range(workers or os.cpu_count())]
+    _serve_workers(start_replicated(host, ports, **options))
@@ -0,0 +1,337 @@
+"""
+Binary snapshot of the keyspace, a simplified RDB
+
+    header: MAGIC, version byte
+    record: [OPCODE_EXPIRE, int64 ms] type byte, key, value
+    script: OPCODE_SCRIPT, body
+    footer: OPCODE_EOF, crc32 of everything before the footer
+
+Lengths are 32 bit little endian, strings are length prefixed. The DUMP payload of a
+key is its type byte and value followed by the 16 bit version and a crc32 of both
+"""
+import os
+import mmap
+import zlib
+import struct
+
+from collections import deque
+
+from .zset import SortedSet
+from .hashes import Hash
+from .intset import IntSet
+from .config import Config
+
+MAGIC = b'REDISERVER'
+VERSION = 1
+
+TYPE_STRING = 0
+TYPE_LIST = 1
+TYPE_SET = 2
+TYPE_HASH = 4
+TYPE_ZSET = 5
+
+OPCODE_SCRIPT = 0xF5
+OPCODE_EXPIRE = 0xFC
+OPCODE_EOF = 0xFF
+
+# buffered data is written to the file by chunks of this size
+WRITE_CHUNK_SIZE = 1024 * 1024
+# number of records loaded into the keyspace at once
+LOAD_BATCH_SIZE = 10000
+
+_LENGTH = struct.Struct('<I')
+_TYPE_LENGTH = struct.Struct('<BI')
+_EXPIRE = struct.Struct('<Bq')
+_CRC = struct.Struct('<I')
+_SCORE = struct.Struct('<d')
+_DUMP_TRAILER = struct.Struct('<HI')
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def value_type(value):
+    if isinstance(value, (bytes, int)):
+        return TYPE_STRING
+    if isinstance(value, deque):
+        return TYPE_LIST
+    if isinstance(value, (set, frozenset, IntSet)):
+        return TYPE_SET
+    if isinstance(value, SortedSet):
+        return TYPE_ZSET
+    if isinstance(value, Hash):
+        return TYPE_HASH
+    raise SnapshotError('Unsupported value type {}'.format(type(value).__name__))
+
+
+def encode_payload(out, type_, value):
+    if type_ == TYPE_STRING:
+        if type(value) is int:
+            value = b'%d' % value
+        out += _LENGTH.pack(len(value))
+        out += value
+    elif type_ == TYPE_SET or type_ == TYPE_LIST:
+        out += _LENGTH.pack(len(value))
+        for member in value:
+            out += _LENGTH.pack(len(member))
+            out += member
+    elif type_ == TYPE_ZSET:
+        out += _LENGTH.pack(len(value))
+        for member, score in value.items():
+            out += _LENGTH.pack(len(member))
+            out += member
+            out += _SCORE.pack(score)
+    elif type_ == TYPE_HASH:
+        out += _LENGTH.pack(len(value))
+        for field, item in value.items():
+            out += _LENGTH.pack(len(field))
+            out += field
+            out += _LENGTH.pack(len(item))
+            out += item
+
+
+def decode_payload(data, pos, type_, config=Config):
+    """
+    Decode a value payload, returns the value and the next position. Collections get the compact
+    encodings within the limits of the config, the Config class holds the default ones
+    """
+    length, = _LENGTH.unpack_from(data, pos)
+    pos += 4
+
+    if type_ == TYPE_STRING:
+        return bytes(data[pos:pos + length]), pos + length
+
+    if type_ == TYPE_SET or type_ == TYPE_LIST:
+        members = []
+        for _ in range(length):
+            size, = _LENGTH.unpack_from(data, pos)
+            pos += 4
+            members.append(bytes(data[pos:pos + size]))
+            pos += size
+        if type_ == TYPE_LIST:
+            return deque(members), pos
+        intset = IntSet.from_members(members, config.set_max_intset_entries)
+        return set(members) if intset is None else intset, pos
+
+    if type_ == TYPE_ZSET:
+        items = []
+        for _ in range(length):
+            size, = _LENGTH.unpack_from(data, pos)
+            pos += 4
+            member = bytes(data[pos:pos + size])
+            score, = _SCORE.unpack_from(data, pos + size)
+            items.append((member, score))
+            pos += size + _SCORE.size
+        zset = SortedSet.from_items(items, max_listpack_entries=config.zset_max_listpack_entries,
+                                    max_listpack_value=config.zset_max_listpack_value)
+        return zset, pos
+
+    if type_ == TYPE_HASH:
+        items = []
+        for _ in range(length):
+            size, = _LENGTH.unpack_from(data, pos)
+            field = bytes(data[pos + 4:pos + 4 + size])
+            pos += 4 + size
+            size, = _LENGTH.unpack_from(data, pos)
+            items.append((field, bytes(data[pos + 4:pos + 4 + size])))
+            pos += 4 + size
+        return Hash.from_items(items, config.hash_max_listpack_entries, config.hash_max_listpack_value), pos
+
+    raise SnapshotError('Unknown value type {}'.format(type_))
+
+
+def encode_value(out, value):
+    """
+    Append the type byte and the serialized value to the buffer
+    """
+    type_ = value_type(value)
+    out.append(type_)
+    encode_payload(out, type_, value)
+
+
+def decode_value(data, pos, config=Config):
+    """
+    Decode a value serialized by encode_value, returns the value and the next position
+    """
+    return decode_payload(data, pos + 1, data[pos], config)
+
+
+def dump_value(value):
+    """
+    Serialized value of the DUMP command
+    """
+    out = bytearray()
+    encode_value(out, value)
+    out += _DUMP_TRAILER.pack(VERSION, zlib.crc32(out))
+    return bytes(out)
+
+
+def restore_value(payload, config=Config):
+    """
+    Value of a DUMP payload, raises SnapshotError if the version or the checksum are wrong
+    """
+    end = len(payload) - _DUMP_TRAILER.size
+    if end < 1:
+        raise SnapshotError('DUMP payload is too short')
+    version, crc = _DUMP_TRAILER.unpack_from(payload, end)
+    if version != VERSION or crc != zlib.crc32(payload[:end]):
+        raise SnapshotError('DUMP payload version or checksum are wrong')
+    try:
+        value, pos = decode_value(payload, 0, config)
+    except struct.error:
+        pos = None
+    if pos != end:
+        raise SnapshotError('Bad DUMP payload')
+    return value
+
+
+class SnapshotWriter:
+    """
+    Serializes records into a file through a chunked buffer keeping a running checksum
+    """
+
+    def __init__(self, fileobj):
+        self.file = fileobj
+        self.buffer = bytearray(MAGIC)
+        self.buffer.append(VERSION)
+        self.crc = 0
+
+    def flush(self):
+        self.crc = zlib.crc32(self.buffer, self.crc)
+        self.file.write(self.buffer)
+        self.buffer = bytearray()
+
+    def write_key(self, key, value, expire=None):
+        out = self.buffer
+        if expire is not None:
+            out += _EXPIRE.pack(OPCODE_EXPIRE, expire)
+        type_ = value_type(value)
+        out += _TYPE_LENGTH.pack(type_, len(key))
+        out += key
+        encode_payload(out, type_, value)
+        if len(out) >= WRITE_CHUNK_SIZE:
+            self.flush()
+
+    def write_script(self, script):
+        self.buffer.append(OPCODE_SCRIPT)
+        self.buffer += _LENGTH.pack(len(script))
+        self.buffer += script
+
+    def close(self):
+        self.buffer.append(OPCODE_EOF)
+        self.flush()
+        self.file.write(_CRC.pack(self.crc))
+
+
+def write_snapshot(fileobj, keys, scripts=()):
+    writer = SnapshotWriter(fileobj)
+    expires = keys.expires
+    for key, value in keys.items():
+        writer.write_key(key, value, expires.get(key))
+    for script in scripts:
+        writer.write_script(script)
+    writer.close()
+
+
+def save(path, keys, scripts=()):
+    """
+    Write the snapshot to a temporary file and atomically replace the target
+    """
+    temp_path = '{}.temp-{}'.format(path, os.getpid())
+    try:
+        with open(temp_path, 'wb') as fileobj:
+            write_snapshot(fileobj, keys, scripts)
+            fileobj.flush()
+            os.fsync(fileobj.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+
+def read_snapshot(data, batch_size=LOAD_BATCH_SIZE, config=Config):
+    """
+    Iterate over the snapshot data by batches of records, yields (keys, values, expires, scripts)
+    where keys and values are parallel lists and expires maps keys to unix time in milliseconds.
+    The batches are yielded once the checksum is verified, a corrupted snapshot loads nothing.
+    Returns the end position of the snapshot, data may continue after it
+    """
+    if bytes(data[:len(MAGIC)]) != MAGIC:
+        raise SnapshotError('Wrong snapshot signature')
+    if data[len(MAGIC)] != VERSION:
+        raise SnapshotError('Unsupported snapshot version {}'.format(data[len(MAGIC)]))
+
+    unpack_length = _LENGTH.unpack_from
+    batches = []
+    keys, values, expires, scripts = [], [], {}, []
+    pos = len(MAGIC) + 1
+    size = len(data)
+    try:
+        while True:
+            opcode = data[pos]
+            if opcode == OPCODE_EOF:
+                break
+
+            if opcode == OPCODE_SCRIPT:
+                length, = unpack_length(data, pos + 1)
+                pos += 5
+                scripts.append(bytes(data[pos:pos + length]))
+                pos += length
+                continue
+
+            expire = None
+            if opcode == OPCODE_EXPIRE:
+                _, expire = _EXPIRE.unpack_from(data, pos)
+                pos += _EXPIRE.size
+                opcode = data[pos]
+
+            length, = unpack_length(data, pos + 1)
+            pos += 5
+            key = bytes(data[pos:pos + length])
+            pos += length
+
+            if opcode == TYPE_STRING:
+                # inlined decode_payload of the most common type
+                length, = unpack_length(data, pos)
+                pos += 4
+                value = bytes(data[pos:pos + length])
+                pos += length
+            else:
+                value, pos = decode_payload(data, pos, opcode, config)
+            if pos > size:
+                raise SnapshotError('Unexpected end of snapshot')
+
+            keys.append(key)
+            values.append(value)
+            if expire is not None:
+                expires[key] = expire
+
+            if len(keys) >= batch_size:
+                batches.append((keys, values, expires, scripts))
+                keys, values, expires, scripts = [], [], {}, []
+    except (IndexError, struct.error):
+        raise SnapshotError('Unexpected end of snapshot')
+
+    crc = 0
+    for start in range(0, pos + 1, WRITE_CHUNK_SIZE):
+        crc = zlib.crc32(data[start:min(start + WRITE_CHUNK_SIZE, pos + 1)], crc)
+    if data[pos + 1:pos + 5] != _CRC.pack(crc):
+        raise SnapshotError('Wrong snapshot checksum')
+
+    batches.append((keys, values, expires, scripts))
+    yield from batches
+    return pos + 1 + _CRC.size
+
+
+def load(path, config=Config):
+    """
+    Iterate over the record batches of the snapshot file, the file is memory mapped
+    so that its pages are read on demand while the records are consumed
+    """
+    with open(path, 'rb') as fileobj:
+        if os.fstat(fileobj.fileno()).st_size == 0:
+            raise SnapshotError('Empty snapshot')
+        with mmap.mmap(fileobj.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return (yield from read_snapshot(data, config=config))
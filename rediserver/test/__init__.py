@@ -1 +1,2 @@
-from .server import local_redis
+from .server import local_redis, local_cluster, load_template
+from .direct import DirectRedis
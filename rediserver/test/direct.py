@@ -0,0 +1,179 @@
+"""
+In process redis-py client
+
+DirectRedis is a redis-py client whose connections execute the commands on a Redis
+instance in the calling thread: the arguments are encoded by redis-py, passed to the
+command queue as a tuple and the replies are converted to what the RESP parser of
+redis-py returns. Pipelines, transactions and scripts work unchanged, there is no socket,
+thread or event loop. Blocking commands return nil at once when there is no data, nothing
+else could push it while the caller waits
+"""
+import inspect
+
+from collections import deque
+
+import redis
+from redis import exceptions
+from redis.connection import Connection, ConnectionPool
+from redis.exceptions import ResponseError
+
+from .. import resp
+from ..redis import Redis
+from ..config import Config
+from ..queue import CommandQueue
+from ..server import execute_command
+from ..blocking import Blocked
+from .frozen import FrozenKeyspace
+
+# exception classes of the error prefixes like the RESP parser of redis-py, the classes
+# missing from older versions are raised as ResponseError
+ERROR_CLASSES = {
+    prefix: getattr(exceptions, name, ResponseError) for prefix, name in (
+        ('EXECABORT', 'ExecAbortError'),
+        ('LOADING', 'BusyLoadingError'),
+        ('NOSCRIPT', 'NoScriptError'),
+        ('READONLY', 'ReadOnlyError'),
+        ('NOAUTH', 'AuthenticationError'),
+        ('WRONGPASS', 'AuthenticationError'),
+        ('NOPERM', 'NoPermissionError'),
+        ('OOM', 'OutOfMemoryError'),
+    )
+}
+
+try:
+    from redis.connection import AbstractConnection
+except ImportError:  # redis-py < 5
+    AbstractConnection = Connection
+
+# the replies are converted to RESP2 types, the client must parse them with RESP2 callbacks
+if 'protocol' in inspect.signature(AbstractConnection.__init__).parameters:
+    CONNECTION_OPTIONS = {'protocol': 2}
+else:  # redis-py < 5 speaks RESP2 only
+    CONNECTION_OPTIONS = {}
+
+
+def parse_error(error):
+    error_class = ERROR_CLASSES.get(error.class_)
+    if error_class is None:
+        return ResponseError('{} {}'.format(error.class_, error.message).strip())
+    return error_class(error.message)
+
+
+def convert_reply(value):
+    """
+    Reply of a command handler as parsed by redis-py, errors are exception instances
+    """
+    type_ = type(value)
+    if type_ is bytes or type_ is int or value is None:
+        return value
+    if type_ is list or type_ is tuple:
+        return [convert_reply(item) for item in value]
+    if value is resp.OK:
+        return b'OK'
+    if value is resp.QUEUED:
+        return b'QUEUED'
+    if isinstance(value, resp.Status):
+        return value.value
+    if isinstance(value, resp.Error):
+        return parse_error(value)
+    if type_ is Blocked:
+        return None
+    raise ResponseError('Reply of type {} is not supported by the direct client'.format(type_.__name__))
+
+
+class DirectConnection(Connection):
+    """
+    redis-py connection executing the commands right away, the replies are queued for read_response
+    """
+
+    def __init__(self, server=None, **kwargs):
+        super().__init__(**kwargs)
+        self.server = server
+        self.queue = None
+        self.replies = deque()
+
+    def connect(self):
+        if self.queue is None:
+            self.queue = CommandQueue(self.server)
+
+    def disconnect(self, *args):
+        if self.queue is not None:
+            # release the watched keys like a closed connection
+            self.queue.reset()
+            self.queue = None
+        self.replies.clear()
+
+    def pack_command(self, *args):
+        command = args[0]
+        if isinstance(command, str):
+            command = command.encode()
+        # command names of several words like 'SCRIPT LOAD'
+        encode = self.encoder.encode
+        return [tuple(command.split()) + tuple(encode(arg) for arg in args[1:])]
+
+    def pack_commands(self, commands):
+        return [packed for args in commands for packed in self.pack_command(*args)]
+
+    def send_packed_command(self, command, check_health=True):
+        self.connect()
+        for args in command:
+            reply = execute_command(self.queue, args[0], args[1:])
+            self.replies.append(convert_reply(reply))
+
+    def send_command(self, *args, **kwargs):
+        self.send_packed_command(self.pack_command(*args))
+
+    def can_read(self, timeout=0):
+        return bool(self.replies)
+
+    def read_response(self, disable_decoding=False, **kwargs):
+        reply = self.replies.popleft()
+        if isinstance(reply, ResponseError):
+            raise reply
+        if disable_decoding or not self.encoder.decode_responses:
+            return reply
+        return self.decode(reply)
+
+    def decode(self, reply):
+        if type(reply) is list:
+            return [self.decode(item) for item in reply]
+        return self.encoder.decode(reply)
+
+
+class DirectRedis(redis.StrictRedis):
+    """
+    redis-py client of a Redis instance in the same process, a new one is created from the options
+    when no server is given. The instance is not thread safe, it must not be served by a socket server
+    """
+
+    def __init__(self, server=None, decode_responses=False, **options):
+        self.server = Redis(Config(**options)) if server is None else server
+        pool = ConnectionPool(connection_class=DirectConnection, server=self.server,
+                              decode_responses=decode_responses, **CONNECTION_OPTIONS)
+        super().__init__(connection_pool=pool, single_connection_client=True)
+        self.frozen = FrozenKeyspace(self.server)
+        self.tracker = None
+
+    def execute_command(self, *args, **options):
+        # a direct connection can't fail, the pool and the retries are skipped
+        connection = self.connection
+        connection.send_packed_command(connection.pack_command(*args))
+        return self.parse_response(connection, args[0], **options)
+
+    @property
+    def dict(self):
+        """
+        Read only snapshot of the keyspace, like the dict of the local_redis proxy
+        """
+        return self.frozen.snapshot()
+
+    def mark(self):
+        if self.tracker is None:
+            self.tracker = self.server.track_changes()
+        else:
+            self.tracker.clear()
+
+    def changes(self):
+        if self.tracker is None:
+            raise RuntimeError('changes() is called before mark()')
+        return self.tracker.changes(self.server.keys)
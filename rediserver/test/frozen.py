@@ -0,0 +1,83 @@
+"""
+Read only snapshots of a keyspace
+
+Values are frozen into immutable Python objects: strings are bytes, lists tuples, sets
+frozensets, hashes and sorted sets read only mappings (field -> value, member -> score).
+A FrozenKeyspace keeps the frozen values of the keys and a change tracker of the Redis
+instance, a refresh only freezes the keys touched since the previous one. Snapshots share
+the frozen mapping until the next refresh finds changes and copies it (copy on write), so
+taking a snapshot of an unchanged keyspace costs nothing. Refreshes must run in the thread
+executing the commands of the instance
+"""
+from types import MappingProxyType
+from collections import deque
+
+from ..zset import SortedSet
+from ..hashes import Hash
+from ..intset import IntSet
+
+
+def freeze_value(value):
+    type_ = type(value)
+    if type_ is bytes:
+        return value
+    # strings stored as int are seen as their bytes
+    if type_ is int:
+        return b'%d' % value
+    if type_ is deque:
+        return tuple(value)
+    if type_ is set or type_ is IntSet:
+        return frozenset(value)
+    if type_ is Hash or type_ is SortedSet:
+        return MappingProxyType(dict(value.items()))
+    raise TypeError('Values of type {} can not be frozen'.format(type_.__name__))
+
+
+class FrozenKeyspace:
+    def __init__(self, redis):
+        self.redis = redis
+        self.tracker = None
+        self.values = None
+        # the values are used by a snapshot, they are copied before the next change
+        self.shared = False
+
+    def refresh(self):
+        redis = self.redis
+        if self.tracker is None:
+            self.tracker = redis.track_changes()
+            self.values = {key: freeze_value(value) for key, value in redis.keys.items()}
+            return
+
+        touched = self.tracker.existed
+        if not touched:
+            return
+        if self.shared:
+            self.values = dict(self.values)
+            self.shared = False
+        values = self.values
+        keys = redis.keys
+        for key in touched:
+            value = keys.get(key)
+            if value is None:
+                values.pop(key, None)
+            else:
+                values[key] = freeze_value(value)
+        self.tracker.clear()
+
+    def snapshot(self):
+        """
+        Read only mapping of the frozen values, later changes of the keyspace don't show in it
+        """
+        self.refresh()
+        self.shared = True
+        return MappingProxyType(self.values)
+
+    def get(self, key):
+        self.refresh()
+        return self.values[key]
+
+    def close(self):
+        if self.tracker is not None:
+            self.redis.untrack_changes(self.tracker)
+        self.tracker = None
+        self.values = None
@@ -1,8 +1,33 @@
 import pytest
 from .server import local_redis as local_redis_server
+from .direct import DirectRedis
+
+
+def pytest_addoption(parser):
+    parser.addini('rediserver_keep_scripts', type='bool', default=False,
+                  help='keep the scripts loaded into the shared redis server between tests')
 
 
 @pytest.fixture(scope='function')
 def local_redis():
     with local_redis_server() as redis_proxy:
         yield redis_proxy
+
+
+@pytest.fixture(scope='session')
+def shared_redis_server():
+    # session scoped, so every pytest-xdist worker process runs its own server
+    with local_redis_server() as redis_proxy:
+        yield redis_proxy
+
+
+@pytest.fixture(scope='function')
+def shared_redis(shared_redis_server, request):
+    shared_redis_server.reset(keep_scripts=request.config.getini('rediserver_keep_scripts'))
+    yield shared_redis_server
+
+
+@pytest.fixture(scope='function')
+def direct_redis():
+    # in process client of a new server, no socket, thread or event loop
+    return DirectRedis()
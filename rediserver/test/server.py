@@ -1,16 +1,35 @@
 import os
+import time
+import socket
 import inspect
 
-from copy import deepcopy
 from tempfile import TemporaryDirectory
 from functools import wraps
 
-from ..server import run_threaded
+from ..redis import Redis
+from ..config import Config
+from ..server import run_threaded, reset_server, start_cluster
+from .frozen import FrozenKeyspace
+
+
+def load_template(*paths, **options):
+    """
+    KeyspaceTemplate of the fixture files (snapshots or RESP command streams) for
+    local_redis(template=...), the servers clone it instead of loading the files
+    """
+    redis = Redis(Config(**options))
+    for path in paths:
+        redis.import_file(path)
+    return redis.create_template()
 
 
 class RedisServer:
-    def __init__(self):
+    def __init__(self, fixture=None, template=None, **options):
+        self.fixture = fixture
+        self.template = template
+        self.options = options
         self.stop_loop = None
+        self.call_in_loop = None
         self.tempdir = None
         self.thread = None
 
@@ -26,33 +45,92 @@ class RedisServer:
 
         self.tempdir = TemporaryDirectory()
         socket_file = os.path.join(self.tempdir.name, 'redis.sock')
-        redis, self.thread, self.stop_loop = run_threaded(unix_domain_socket=socket_file)
+        redis, self.thread, self.stop_loop, self.call_in_loop = run_threaded(
+            unix_domain_socket=socket_file, **self.options)
+        call_in_loop = self.call_in_loop
+        # snapshots are refreshed in the server thread, between two commands
+        frozen = FrozenKeyspace(redis)
+        fixture = self.fixture
+        template = self.template
+
+        def load_dataset():
+            if template is not None:
+                redis.load_template(template)
+            if fixture is not None:
+                redis.import_file(fixture)
+
+        call_in_loop(load_dataset)
+
+        class Ext:
+            pass
 
         class RedisProxy:
             def __init__(self):
-                class Ext:
-                    pass
                 self.ext = Ext()
+                self.tracker = None
 
             def extend(self, attr, value):
                 setattr(self.ext, attr, value)
 
+            def reset(self, keep_scripts=False):
+                """
+                Disconnect the clients and restore the initial dataset so that the server is reused by another test
+                """
+                call_in_loop(reset_server, redis, keep_scripts)
+                call_in_loop(load_dataset)
+                if self.tracker is not None:
+                    call_in_loop(redis.untrack_changes, self.tracker)
+                    self.tracker = None
+                self.ext = Ext()
+
             @property
             def dict(self):
-                return deepcopy(redis.keys)
+                """
+                Read only snapshot of the keyspace, see FrozenKeyspace
+                """
+                return call_in_loop(frozen.snapshot)
+
+            def mark(self):
+                """
+                Start recording the changed keys, see changes
+                """
+                if self.tracker is None:
+                    self.tracker = call_in_loop(redis.track_changes)
+                else:
+                    call_in_loop(self.tracker.clear)
+
+            def changes(self):
+                """
+                KeyChanges (added, modified, deleted) since the last mark
+                """
+                if self.tracker is None:
+                    raise RuntimeError('changes() is called before mark()')
+                tracker = self.tracker
+                return call_in_loop(lambda: tracker.changes(redis.keys))
+
+            def import_file(self, path):
+                """
+                Load a fixture file into the dataset without a client, see Redis.import_file
+                """
+                call_in_loop(redis.import_file, path)
 
             def __len__(self):
-                return len(redis.keys)
+                return call_in_loop(lambda: len(redis.keys))
 
             def __getitem__(self, key):
                 if isinstance(key, str):
                     key = key.encode()
-                return deepcopy(redis.keys[key])
+                return call_in_loop(frozen.get, key)
 
             @property
             def sock(self):
                 return socket_file
 
+            @property
+            def instance(self):
+                # the server Redis instance, it is used by the server thread concurrently
+                return redis
+
         return RedisProxy()
 
     def __exit__(self, exc_type, exc_val, exc_tb):
@@ -61,18 +139,126 @@ class RedisServer:
         self.tempdir.cleanup()
 
         self.stop_loop = None
+        self.call_in_loop = None
         self.tempdir = None
         self.thread = None
 
 
-def local_redis(func=None):
+def local_redis(func=None, **options):
+    if func is None:
+        return RedisServer(**options)
+
+    if inspect.isfunction(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with RedisServer(**options):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    raise ValueError()
+
+
+def free_ports(count, host='127.0.0.1'):
+    sockets = []
+    try:
+        for _ in range(count):
+            sock = socket.socket()
+            sock.bind((host, 0))
+            sockets.append(sock)
+        return [sock.getsockname()[1] for sock in sockets]
+    finally:
+        for sock in sockets:
+            sock.close()
+
+
+def wait_for_port(host, port, process, timeout=10):
+    """
+    Wait until the server process accepts connections on the port
+    """
+    deadline = time.time() + timeout
+    while True:
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return
+        except OSError:
+            if process.exitcode is not None or time.time() > deadline:
+                raise RuntimeError('Server on port {} failed to start'.format(port))
+            time.sleep(0.01)
+
+
+class RedisCluster:
+    """
+    Cluster of worker processes listening on free local TCP ports
+    """
+
+    def __init__(self, workers=3, host='127.0.0.1', **options):
+        self.workers = workers
+        self.host = host
+        self.options = options
+        self.processes = None
+        self.tempdir = None
+
+    def __call__(self, func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with self:
+                return func(*args, **kwargs)
+        return wrapper
+
+    def __enter__(self):
+        assert self.processes is None
+
+        self.tempdir = TemporaryDirectory()
+        options = dict(self.options)
+        options.setdefault('dir', self.tempdir.name)
+
+        ports = free_ports(self.workers, self.host)
+        self.processes = start_cluster(self.host, ports, **options)
+        try:
+            for port, process in zip(ports, self.processes):
+                wait_for_port(self.host, port, process)
+        except Exception:
+            self.__exit__(None, None, None)
+            raise
+
+        host = self.host
+
+        class ClusterProxy:
+            @property
+            def nodes(self):
+                return [(host, port) for port in ports]
+
+            @property
+            def host(self):
+                return host
+
+            @property
+            def port(self):
+                # any node serves as a startup node of cluster clients
+                return ports[0]
+
+        return ClusterProxy()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            process.join()
+        self.tempdir.cleanup()
+
+        self.processes = None
+        self.tempdir = None
+
+
+def local_cluster(func=None, workers=3, **options):
     if func is None:
-        return RedisServer()
+        return RedisCluster(workers=workers, **options)
 
     if inspect.isfunction(func):
         @wraps(func)
         def wrapper(*args, **kwargs):
-            with RedisServer():
+            with RedisCluster(workers=workers, **options):
                 return func(*args, **kwargs)
 
         return wrapper
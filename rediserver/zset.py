@@ -0,0 +1,412 @@
+"""
+Sorted set value
+
+Members are ordered by (score, member). Small sorted sets are kept in two parallel
+arrays sorted in that order, larger ones in a skiplist with spans (so that ranks are
+computed in O(log n)) and a dict of member scores, like the listpack and skiplist
+encodings of Redis. All range queries are resolved to rank ranges first
+"""
+import random
+
+from array import array
+from bisect import bisect_left, bisect_right
+
+ZSET_MAX_LISTPACK_ENTRIES = 128
+ZSET_MAX_LISTPACK_VALUE = 64
+
+ENCODING_LISTPACK = b'listpack'
+ENCODING_SKIPLIST = b'skiplist'
+
+SKIPLIST_MAX_LEVEL = 32
+SKIPLIST_P = 0.25
+
+# approximate memory used by an entry besides the member itself
+LISTPACK_ENTRY_OVERHEAD = 16
+SKIPLIST_ENTRY_OVERHEAD = 200
+
+
+def random_level():
+    level = 1
+    while level < SKIPLIST_MAX_LEVEL and random.random() < SKIPLIST_P:
+        level += 1
+    return level
+
+
+class SkipListNode:
+    __slots__ = ('member', 'score', 'backward', 'forward', 'span')
+
+    def __init__(self, member, score, level):
+        self.member = member
+        self.score = score
+        self.backward = None
+        self.forward = [None] * level
+        # number of nodes skipped by the forward link of the level
+        self.span = [0] * level
+
+
+class SkipList:
+    """
+    Skiplist ordered by (score, member), ranks are 1-based like in t_zset.c
+    """
+
+    def __init__(self):
+        self.header = SkipListNode(None, None, SKIPLIST_MAX_LEVEL)
+        self.tail = None
+        self.level = 1
+        self.length = 0
+
+    def insert(self, member, score):
+        update = [None] * SKIPLIST_MAX_LEVEL
+        rank = [0] * SKIPLIST_MAX_LEVEL
+        node = self.header
+        for level in range(self.level - 1, -1, -1):
+            rank[level] = 0 if level == self.level - 1 else rank[level + 1]
+            forward = node.forward[level]
+            while forward is not None and (
+                    forward.score < score or (forward.score == score and forward.member < member)):
+                rank[level] += node.span[level]
+                node = forward
+                forward = node.forward[level]
+            update[level] = node
+
+        new_level = random_level()
+        if new_level > self.level:
+            for level in range(self.level, new_level):
+                rank[level] = 0
+                update[level] = self.header
+                self.header.span[level] = self.length
+            self.level = new_level
+
+        node = SkipListNode(member, score, new_level)
+        for level in range(new_level):
+            previous = update[level]
+            node.forward[level] = previous.forward[level]
+            previous.forward[level] = node
+            node.span[level] = previous.span[level] - (rank[0] - rank[level])
+            previous.span[level] = rank[0] - rank[level] + 1
+        for level in range(new_level, self.level):
+            update[level].span[level] += 1
+
+        node.backward = None if update[0] is self.header else update[0]
+        if node.forward[0] is not None:
+            node.forward[0].backward = node
+        else:
+            self.tail = node
+        self.length += 1
+        return node
+
+    def delete(self, member, score):
+        update = [None] * SKIPLIST_MAX_LEVEL
+        node = self.header
+        for level in range(self.level - 1, -1, -1):
+            forward = node.forward[level]
+            while forward is not None and (
+                    forward.score < score or (forward.score == score and forward.member < member)):
+                node = forward
+                forward = node.forward[level]
+            update[level] = node
+
+        node = node.forward[0]
+        if node is None or node.score != score or node.member != member:
+            return False
+
+        for level in range(self.level):
+            previous = update[level]
+            if previous.forward[level] is node:
+                previous.span[level] += node.span[level] - 1
+                previous.forward[level] = node.forward[level]
+            else:
+                previous.span[level] -= 1
+        if node.forward[0] is not None:
+            node.forward[0].backward = node.backward
+        else:
+            self.tail = node.backward
+        while self.level > 1 and self.header.forward[self.level - 1] is None:
+            self.level -= 1
+        self.length -= 1
+        return True
+
+    def update_score(self, member, score, new_score):
+        """
+        Change the score in place when the node keeps its position, else reinsert it
+        """
+        node = self.header
+        for level in range(self.level - 1, -1, -1):
+            forward = node.forward[level]
+            while forward is not None and (
+                    forward.score < score or (forward.score == score and forward.member < member)):
+                node = forward
+                forward = node.forward[level]
+        node = node.forward[0]
+
+        backward = node.backward
+        forward = node.forward[0]
+        if ((backward is None or backward.score < new_score or (backward.score == new_score and backward.member < member))
+                and (forward is None or new_score < forward.score or (forward.score == new_score and member < forward.member))):
+            node.score = new_score
+            return
+        self.delete(member, score)
+        self.insert(member, new_score)
+
+    def rank(self, member, score):
+        """
+        Number of nodes ordered before the node
+        """
+        rank = 0
+        node = self.header
+        for level in range(self.level - 1, -1, -1):
+            forward = node.forward[level]
+            while forward is not None and (
+                    forward.score < score or (forward.score == score and forward.member < member)):
+                rank += node.span[level]
+                node = forward
+                forward = node.forward[level]
+        return rank
+
+    def count_before(self, before):
+        """
+        Number of leading nodes the predicate is true for, it must hold for a prefix of the list
+        """
+        rank = 0
+        node = self.header
+        for level in range(self.level - 1, -1, -1):
+            forward = node.forward[level]
+            while forward is not None and before(forward):
+                rank += node.span[level]
+                node = forward
+                forward = node.forward[level]
+        return rank
+
+    def node_at(self, rank):
+        """
+        Node by 0-based rank
+        """
+        traversed = 0
+        rank += 1
+        node = self.header
+        for level in range(self.level - 1, -1, -1):
+            while node.forward[level] is not None and traversed + node.span[level] <= rank:
+                traversed += node.span[level]
+                node = node.forward[level]
+            if traversed == rank:
+                return node
+        return None
+
+    def __iter__(self):
+        node = self.header.forward[0]
+        while node is not None:
+            yield node
+            node = node.forward[0]
+
+
+class SortedSet:
+    """
+    Sorted set of bytes members with float scores, ranks are 0-based
+    """
+
+    def __init__(self, max_listpack_entries=ZSET_MAX_LISTPACK_ENTRIES, max_listpack_value=ZSET_MAX_LISTPACK_VALUE):
+        self.max_listpack_entries = max_listpack_entries
+        self.max_listpack_value = max_listpack_value
+        # listpack encoding
+        self.scores = array('d')
+        self.members = []
+        # skiplist encoding
+        self.dict = None
+        self.skiplist = None
+
+    @classmethod
+    def from_items(cls, items, **options):
+        zset = cls(**options)
+        for member, score in items:
+            zset.add(member, score)
+        return zset
+
+    @property
+    def encoding(self):
+        return ENCODING_LISTPACK if self.dict is None else ENCODING_SKIPLIST
+
+    def convert(self):
+        """
+        Switch to the skiplist encoding
+        """
+        self.dict = {}
+        self.skiplist = SkipList()
+        for member, score in zip(self.members, self.scores):
+            self.dict[member] = score
+            self.skiplist.insert(member, score)
+        self.scores = array('d')
+        self.members = []
+
+    def __len__(self):
+        if self.dict is not None:
+            return len(self.dict)
+        return len(self.members)
+
+    def __contains__(self, member):
+        if self.dict is not None:
+            return member in self.dict
+        return member in self.members
+
+    def __iter__(self):
+        if self.dict is not None:
+            return iter(self.dict)
+        return iter(list(self.members))
+
+    def items(self):
+        """
+        (member, score) pairs in ascending order
+        """
+        if self.dict is not None:
+            return [(node.member, node.score) for node in self.skiplist]
+        return list(zip(self.members, self.scores))
+
+    def score(self, member):
+        if self.dict is not None:
+            return self.dict.get(member)
+        try:
+            return self.scores[self.members.index(member)]
+        except ValueError:
+            return None
+
+    def add(self, member, score):
+        """
+        Insert the member or update its score
+        """
+        if self.dict is not None:
+            old_score = self.dict.get(member)
+            if old_score is None:
+                self.skiplist.insert(member, score)
+            elif old_score != score:
+                self.skiplist.update_score(member, old_score, score)
+            self.dict[member] = score
+            return
+
+        if member in self.members:
+            self.remove(member)
+        elif len(self.members) >= self.max_listpack_entries or len(member) > self.max_listpack_value:
+            self.convert()
+            self.add(member, score)
+            return
+
+        scores = self.scores
+        start = bisect_left(scores, score)
+        end = bisect_right(scores, score, start)
+        index = bisect_left(self.members, member, start, end)
+        scores.insert(index, score)
+        self.members.insert(index, member)
+
+    def remove(self, member):
+        if self.dict is not None:
+            score = self.dict.pop(member, None)
+            if score is None:
+                return False
+            self.skiplist.delete(member, score)
+            return True
+
+        try:
+            index = self.members.index(member)
+        except ValueError:
+            return False
+        del self.members[index]
+        del self.scores[index]
+        return True
+
+    def rank(self, member):
+        if self.dict is not None:
+            score = self.dict.get(member)
+            if score is None:
+                return None
+            return self.skiplist.rank(member, score)
+        try:
+            return self.members.index(member)
+        except ValueError:
+            return None
+
+    def score_rank(self, score, inclusive):
+        """
+        Number of members with a lower score, or with a lower or equal one when inclusive
+        """
+        if self.dict is not None:
+            if inclusive:
+                return self.skiplist.count_before(lambda node: node.score <= score)
+            return self.skiplist.count_before(lambda node: node.score < score)
+        if inclusive:
+            return bisect_right(self.scores, score)
+        return bisect_left(self.scores, score)
+
+    def lex_rank(self, member, inclusive):
+        """
+        Number of members lower than the member, or lower or equal when inclusive.
+        Valid when all the scores are equal
+        """
+        if self.dict is not None:
+            if inclusive:
+                return self.skiplist.count_before(lambda node: node.member <= member)
+            return self.skiplist.count_before(lambda node: node.member < member)
+        if inclusive:
+            return bisect_right(self.members, member)
+        return bisect_left(self.members, member)
+
+    def slice(self, start, stop):
+        """
+        (member, score) pairs of the ranks from start up to stop
+        """
+        start = max(start, 0)
+        stop = min(stop, len(self))
+        if start >= stop:
+            return []
+        if self.dict is None:
+            return list(zip(self.members[start:stop], self.scores[start:stop]))
+
+        result = []
+        node = self.skiplist.node_at(start)
+        for _ in range(stop - start):
+            result.append((node.member, node.score))
+            node = node.forward[0]
+        return result
+
+    def remove_slice(self, start, stop):
+        """
+        Remove the members of the ranks from start up to stop, returns the removed pairs
+        """
+        start = max(start, 0)
+        removed = self.slice(start, stop)
+        if self.dict is None:
+            del self.members[start:stop]
+            del self.scores[start:stop]
+            return removed
+
+        for member, score in removed:
+            del self.dict[member]
+            self.skiplist.delete(member, score)
+        return removed
+
+    def entry_size(self):
+        """
+        Approximate memory used by an entry besides the member
+        """
+        return LISTPACK_ENTRY_OVERHEAD if self.dict is None else SKIPLIST_ENTRY_OVERHEAD
+
+    def copy(self):
+        zset = SortedSet(self.max_listpack_entries, self.max_listpack_value)
+        if self.dict is None:
+            zset.scores = array('d', self.scores)
+            zset.members = list(self.members)
+        else:
+            zset.convert()
+            for member, score in self.items():
+                zset.add(member, score)
+        return zset
+
+    def __deepcopy__(self, memo):
+        return self.copy()
+
+    def __eq__(self, other):
+        if isinstance(other, SortedSet):
+            return self.items() == other.items()
+        if isinstance(other, dict):
+            return dict(self.items()) == other
+        return NotImplemented
+
+    def __repr__(self):
+        return 'SortedSet({!r})'.format(self.items())
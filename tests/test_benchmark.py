@@ -0,0 +1,53 @@
+import os
+import json
+
+from rediserver import benchmark
+
+
+def test_run_benchmark(redis):
+    results = benchmark.run_benchmark(redis.sock, tests=benchmark.TESTS, clients=(1, 3), pipelines=(4,),
+                                      sizes=(10,), requests=50, keyspace=10)
+    assert [(result['test'], result['clients']) for result in results] == [
+        (test, clients) for test in benchmark.TESTS for clients in (1, 3)]
+    for result in results:
+        assert result['errors'] == 0
+        assert result['ops_per_sec'] > 0
+        assert 0 < result['p50_ms'] <= result['p99_ms'] <= result['p999_ms']
+    # random keys of the keyspace
+    assert redis.ext.client.exists(*['key:{}'.format(index) for index in range(10)]) > 1
+
+
+def test_spop_alone_pops_members(redis):
+    result = benchmark.run_workload(redis.sock, 'spop', clients=2, pipeline=4, size=3, requests=50)
+    assert result['errors'] == 0
+    assert redis.ext.client.exists('myset') == 0
+    assert redis.instance.dirty >= 50
+
+
+def test_compare():
+    def result(test, ops, p99):
+        return {'test': test, 'clients': 1, 'pipeline': 1, 'size': 3, 'ops_per_sec': ops, 'p99_ms': p99}
+
+    baseline = [result('set', 1000, 1.0), result('get', 1000, 1.0), result('incr', 1000, 1.0)]
+    current = [result('set', 850, 1.0), result('get', 1000, 1.5), result('incr', 1200, 1.0),
+               result('sadd', 1000, 1.0)]
+    statuses = [status for _, _, status in benchmark.compare(current, baseline, threshold=0.1)]
+    assert statuses == ['regression', 'regression', 'improvement', 'new']
+    assert benchmark.compare(current[:1], baseline, threshold=0.2)[0][2] == 'ok'
+
+
+def test_main_writes_and_compares_results(tmpdir, capsys):
+    path = os.path.join(str(tmpdir), 'results.json')
+    assert benchmark.main(['-t', 'set,get', '-c', '2', '-P', '1,8', '-n', '100', '--json', path]) == 0
+    with open(path) as fileobj:
+        data = json.load(fileobj)
+    assert data['options']['tests'] == ['set', 'get']
+    assert len(data['results']) == 4
+
+    # a baseline ten times faster than this machine
+    for result in data['results']:
+        result['ops_per_sec'] *= 10
+    with open(path, 'w') as fileobj:
+        json.dump(data, fileobj)
+    assert benchmark.main(['-t', 'set', '-c', '2', '-n', '100', '--compare', path]) == 1
+    assert '1 regressions' in capsys.readouterr().out
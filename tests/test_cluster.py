@@ -0,0 +1,129 @@
+import pytest
+import redis as redis_client
+from redis.cluster import RedisCluster
+
+from rediserver.cluster import key_hash_slot, split_slots, CLUSTER_SLOTS
+from rediserver.test import local_cluster, local_redis
+
+
+@pytest.fixture(scope='module')
+def cluster():
+    with local_cluster(workers=3) as cluster:
+        yield cluster
+
+
+@pytest.fixture
+def client(cluster):
+    client = RedisCluster(host=cluster.host, port=cluster.port)
+    yield client
+    client.close()
+
+
+def node_client(host, port):
+    return redis_client.StrictRedis(host=host, port=port)
+
+
+def owner_index(slot):
+    return next(index for index, (first, last) in enumerate(split_slots(3)) if first <= slot <= last)
+
+
+def test_key_hash_slot():
+    # the reference values of the Redis Cluster specification
+    assert key_hash_slot(b'123456789') == 0x31C3
+    assert key_hash_slot(b'{user1000}.following') == key_hash_slot(b'user1000')
+    assert key_hash_slot(b'foo{}{bar}') == key_hash_slot(b'foo{}{bar}')
+    assert key_hash_slot(b'foo{{bar}}zap') == key_hash_slot(b'{bar')
+    assert key_hash_slot(b'foo{bar}{zap}') == key_hash_slot(b'bar')
+
+
+def test_split_slots():
+    assert split_slots(3) == [(0, 5460), (5461, 10921), (10922, 16383)]
+    assert split_slots(1) == [(0, CLUSTER_SLOTS - 1)]
+
+
+def test_cluster_slots(cluster):
+    client = node_client(*cluster.nodes[0])
+    slots = client.execute_command('CLUSTER SLOTS')
+    assert [(first, last, port) for first, last, (_, port, _) in slots] == [
+        (first, last, port) for (_, port), (first, last) in zip(cluster.nodes, split_slots(3))
+    ]
+
+    shards = client.execute_command('CLUSTER', 'SHARDS')
+    assert len(shards) == 3
+    assert client.cluster('info')['cluster_state'] == 'ok'
+    assert client.cluster('keyslot', '123456789') == 0x31C3
+
+
+def test_moved(cluster):
+    key = b'123456789'
+    slot = key_hash_slot(key)
+    wrong = node_client(*cluster.nodes[owner_index(slot) - 1])
+    # newer redis-py raise MovedError without the MOVED prefix, the message keeps the slot and the owner
+    with pytest.raises(redis_client.ResponseError, match='{} 127.0.0.1:{}'.format(slot, cluster.nodes[2][1])):
+        wrong.execute_command('GET', key)
+
+
+def test_cluster_client(client):
+    for index in range(100):
+        client.set('key:{}'.format(index), index)
+    assert [client.get('key:{}'.format(index)) for index in range(100)] == [str(index).encode() for index in range(100)]
+
+
+def test_hashtags(client, cluster):
+    client.set('{user}:name', 'name')
+    client.sadd('{user}:tags', 'tag')
+    assert client.mget('{user}:name', '{user}:missing') == [b'name', None]
+    assert client.delete('{user}:name', '{user}:tags') == 2
+
+    direct = node_client(*cluster.nodes[0])
+    with pytest.raises(redis_client.ResponseError, match="don't hash to the same slot"):
+        direct.execute_command('DEL', '{a}', '{b}')
+
+
+def test_scripts_route_by_keys(client):
+    client.set('{script}:key', 'value')
+    node = client.get_node_from_key('{script}:key')
+    direct = node_client(node.host, node.port)
+    sha = direct.script_load('return redis.call("GET", KEYS[1])')
+    assert direct.evalsha(sha, 1, '{script}:key') == b'value'
+
+
+def test_ask(cluster):
+    key = b'ask'
+    slot = key_hash_slot(key)
+    source_index = owner_index(slot)
+    target_index = (source_index + 1) % 3
+    source_port = cluster.nodes[source_index][1]
+    target_port = cluster.nodes[target_index][1]
+    source = node_client(*cluster.nodes[source_index])
+    target = node_client(*cluster.nodes[target_index])
+    target_id = target.execute_command('CLUSTER MYID')
+    source_id = source.execute_command('CLUSTER MYID')
+
+    source.set(key, 'old')
+    source.execute_command('CLUSTER SETSLOT', slot, 'MIGRATING', target_id)
+    target.execute_command('CLUSTER SETSLOT', slot, 'IMPORTING', source_id)
+    try:
+        # existing keys are still served by the source
+        assert source.get(key) == b'old'
+        source.delete(key)
+        with pytest.raises(redis_client.ResponseError, match='{} 127.0.0.1:{}'.format(slot, target_port)):
+            source.get(key)
+
+        with pytest.raises(redis_client.ResponseError, match='{} 127.0.0.1:{}'.format(slot, source_port)):
+            target.get(key)
+        with target.pipeline(transaction=False) as pipe:
+            pipe.execute_command('ASKING')
+            pipe.set(key, 'new')
+            assert pipe.execute() == [True, True]
+    finally:
+        for node in (source, target):
+            node.execute_command('CLUSTER SETSLOT', slot, 'STABLE')
+
+
+def test_cluster_disabled():
+    with local_redis() as redis:
+        client = redis_client.StrictRedis(unix_socket_path=redis.sock)
+        with pytest.raises(redis_client.ResponseError, match='cluster support disabled'):
+            client.execute_command('CLUSTER SLOTS')
+        assert client.execute_command('COMMAND GETKEYS', 'SET', 'key', 'value') == ['key']
@@ -0,0 +1,95 @@
+import pytest
+import redis as redis_client
+from redis.exceptions import ResponseError, NoScriptError, WatchError
+
+from rediserver.test import DirectRedis
+
+
+def test_commands(direct_redis):
+    client = direct_redis
+    assert client.set('key', 'value')
+    assert client.get('key') == b'value'
+    assert client.incr('counter') == 1
+    assert client.mget('key', 'counter', 'missing') == [b'value', b'1', None]
+    assert client.sadd('set', 1, 2) == 2
+    assert client.zadd('zset', {'a': 1.5}) == 1
+    assert client.zrange('zset', 0, -1, withscores=True) == [(b'a', 1.5)]
+    if int(redis_client.__version__.split('.')[0]) >= 5:
+        # RESP2 callbacks whatever the default protocol of redis-py
+        assert client.connection_pool.connection_kwargs['protocol'] == 2
+    assert client.hset('hash', mapping={'a': 1}) == 1
+    assert client.hgetall('hash') == {b'a': b'1'}
+    assert client.ttl('key') == -1
+    assert client.type('set') == b'set'
+    assert client.ping()
+    assert client.dict == {
+        b'key': b'value', b'counter': b'1', b'set': {b'1', b'2'}, b'zset': {b'a': 1.5}, b'hash': {b'a': b'1'},
+    }
+
+
+def test_errors(direct_redis):
+    client = direct_redis
+    client.set('key', 'value')
+    with pytest.raises(ResponseError, match='WRONGTYPE'):
+        client.sadd('key', 1)
+    with pytest.raises(ResponseError, match='not an integer'):
+        client.incr('key')
+    with pytest.raises(NoScriptError):
+        client.evalsha('0' * 40, 0)
+
+
+def test_pipeline(direct_redis):
+    client = direct_redis
+    pipeline = client.pipeline(transaction=False)
+    pipeline.set('key', 1).incr('key').sadd('key', 1)
+    result = pipeline.execute(raise_on_error=False)
+    assert result[:2] == [True, 2]
+    assert isinstance(result[2], ResponseError)
+
+    with client.pipeline() as pipeline:
+        pipeline.incr('key').rpush('list', 'a', 'b').lpop('list')
+        assert pipeline.execute() == [3, 2, b'a']
+
+
+def test_transaction(direct_redis):
+    client = direct_redis
+    client.set('counter', 1)
+
+    def increment(pipeline):
+        value = int(pipeline.get('counter'))
+        pipeline.multi()
+        pipeline.set('counter', value + 1)
+
+    assert client.transaction(increment, 'counter') == [True]
+    assert client.get('counter') == b'2'
+
+    with client.pipeline() as pipeline:
+        pipeline.watch('counter')
+        client.set('counter', 5)
+        pipeline.multi()
+        pipeline.set('counter', 3)
+        with pytest.raises(WatchError):
+            pipeline.execute()
+    assert client.get('counter') == b'5'
+
+
+def test_register_script(direct_redis):
+    client = direct_redis
+    script = client.register_script('return redis.call("INCRBY", KEYS[1], ARGV[1])')
+    assert script(keys=['counter'], args=[2]) == 2
+    client.script_flush()
+    assert script(keys=['counter'], args=[3]) == 5
+
+    with client.pipeline() as pipeline:
+        script(keys=['counter'], args=[1], client=pipeline)
+        assert pipeline.execute() == [6]
+
+
+def test_decode_responses():
+    client = DirectRedis(decode_responses=True)
+    client.rpush('list', 'a', 'b')
+    assert client.lrange('list', 0, -1) == ['a', 'b']
+    assert client.blpop(['list'], 0) == ('list', 'a')
+    # nothing can push while the caller waits, blocking commands do not block
+    assert client.blpop(['missing'], 0) is None
+    assert client.dict == {b'list': (b'b',)}
@@ -0,0 +1,105 @@
+import time
+
+import pytest
+import redis as redis_client
+from redis.exceptions import ResponseError
+
+from rediserver.test import local_redis
+
+VALUE = b'x' * 1000
+MAXMEMORY = 50 * 1024
+
+
+def fill(client, prefix, count, **kwargs):
+    for index in range(count):
+        client.set('{}{}'.format(prefix, index), VALUE, **kwargs)
+
+
+def test_memory_usage(redis):
+    client = redis.ext.client
+    client.set('test', VALUE)
+    client.sadd('set', *['member{}'.format(index) for index in range(100)])
+    client.sadd('intset', *range(100))
+    assert client.memory_usage('test') > len(VALUE)
+    assert client.memory_usage('set') > 100 * 28
+    assert 100 * 8 < client.memory_usage('intset') < client.memory_usage('set')
+    assert client.memory_usage('none') is None
+
+
+def test_noeviction():
+    with local_redis(maxmemory=MAXMEMORY) as redis:
+        client = redis_client.StrictRedis(unix_socket_path=redis.sock)
+        with pytest.raises(ResponseError, match='maxmemory'):
+            fill(client, 'key', 100)
+
+        assert 40 <= len(redis) < 100
+        assert client.get('key0') == VALUE
+        assert client.delete('key0')
+        client.set('key0', VALUE)
+
+
+def test_allkeys_random():
+    with local_redis(maxmemory=MAXMEMORY, maxmemory_policy='allkeys-random') as redis:
+        client = redis_client.StrictRedis(unix_socket_path=redis.sock)
+        fill(client, 'key', 500)
+        assert redis.instance.keys.used_memory <= MAXMEMORY + 2 * len(VALUE)
+        assert 30 <= len(redis) < 60
+
+
+def test_volatile_ttl():
+    with local_redis(maxmemory=MAXMEMORY, maxmemory_policy='volatile-ttl') as redis:
+        client = redis_client.StrictRedis(unix_socket_path=redis.sock)
+        fill(client, 'persistent', 10)
+        for index in range(200):
+            client.set('volatile{}'.format(index), VALUE, ex=1000 + index)
+
+        keys = set(redis.dict)
+        assert {'persistent{}'.format(index).encode() for index in range(10)} <= keys
+        assert b'volatile199' in keys
+        assert b'volatile0' not in keys
+
+
+def test_volatile_without_candidates():
+    with local_redis(maxmemory=MAXMEMORY, maxmemory_policy='volatile-lru') as redis:
+        client = redis_client.StrictRedis(unix_socket_path=redis.sock)
+        with pytest.raises(ResponseError, match='maxmemory'):
+            fill(client, 'key', 100)
+
+
+def test_allkeys_lru():
+    with local_redis(maxmemory=MAXMEMORY, maxmemory_policy='allkeys-lru', hz=100) as redis:
+        client = redis_client.StrictRedis(unix_socket_path=redis.sock)
+        fill(client, 'old', 20)
+        time.sleep(0.05)
+        fill(client, 'hot', 5)
+
+        for round_ in range(10):
+            time.sleep(0.02)
+            for index in range(5):
+                client.get('hot{}'.format(index))
+            fill(client, 'new{}_'.format(round_), 20)
+
+        keys = set(redis.dict)
+        assert {'hot{}'.format(index).encode() for index in range(5)} <= keys
+        # sampled approximation may keep a few of the old keys
+        assert len([key for key in keys if key.startswith(b'old')]) <= 5
+
+
+def test_allkeys_lfu():
+    with local_redis(maxmemory=MAXMEMORY, maxmemory_policy='allkeys-lfu') as redis:
+        client = redis_client.StrictRedis(unix_socket_path=redis.sock)
+        fill(client, 'hot', 5)
+        for _ in range(100):
+            for index in range(5):
+                client.get('hot{}'.format(index))
+
+        fill(client, 'cold', 200)
+
+        keys = set(redis.dict)
+        assert {'hot{}'.format(index).encode() for index in range(5)} <= keys
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        with local_redis(maxmemory_policy='unknown'):
+            pass
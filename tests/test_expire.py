@@ -0,0 +1,128 @@
+import time
+
+import pytest
+from redis.exceptions import ResponseError, WatchError
+
+
+def test_expire(redis):
+    client = redis.ext.client
+    client.set('test', 1)
+    assert client.expire('test', 100)
+    assert 99 <= client.ttl('test') <= 100
+    assert 99000 <= client.pttl('test') <= 100000
+
+
+def test_expire_unexistent(redis):
+    client = redis.ext.client
+    assert not client.expire('test', 100)
+    assert client.ttl('test') == -2
+
+
+def test_ttl_without_expire(redis):
+    client = redis.ext.client
+    client.set('test', 1)
+    assert client.ttl('test') == -1
+    assert client.pttl('test') == -1
+
+
+def test_lazy_expire(redis):
+    client = redis.ext.client
+    client.set('test', 1)
+    client.sadd('set', 1)
+    client.pexpire('test', 10)
+    client.pexpire('set', 10)
+    time.sleep(0.02)
+    assert client.get('test') is None
+    assert client.scard('set') == 0
+    assert client.ttl('test') == -2
+
+
+def test_active_expire(redis):
+    client = redis.ext.client
+    for index in range(100):
+        client.set('test{}'.format(index), index, px=10)
+    client.set('persistent', 1)
+
+    for _ in range(100):
+        if len(redis) == 1:
+            break
+        time.sleep(0.02)
+
+    assert redis.dict == {b'persistent': b'1'}
+
+
+def test_expire_in_the_past(redis):
+    client = redis.ext.client
+    client.set('test', 1)
+    assert client.expireat('test', 1)
+    assert redis.dict == {}
+
+
+def test_expire_options(redis):
+    client = redis.ext.client
+    client.set('test', 1)
+    assert not client.expire('test', 100, xx=True)
+    assert not client.expire('test', 100, gt=True)
+    assert client.expire('test', 100, nx=True)
+    assert not client.expire('test', 200, nx=True)
+    assert not client.expire('test', 50, gt=True)
+    assert client.expire('test', 50, lt=True)
+    assert client.ttl('test') == 50
+
+
+def test_persist(redis):
+    client = redis.ext.client
+    client.set('test', 1, ex=100)
+    assert client.persist('test')
+    assert not client.persist('test')
+    assert client.ttl('test') == -1
+
+
+def test_set_ex_px(redis):
+    client = redis.ext.client
+    client.set('test', 1, ex=100)
+    assert client.ttl('test') == 100
+    client.set('test', 1, px=5000)
+    assert 4900 <= client.pttl('test') <= 5000
+    client.set('test', 2, keepttl=True)
+    assert 4900 <= client.pttl('test') <= 5000
+    client.set('test', 3)
+    assert client.ttl('test') == -1
+
+
+def test_set_invalid_expire(redis):
+    client = redis.ext.client
+    with pytest.raises(ResponseError, match='invalid expire time'):
+        client.set('test', 1, ex=0)
+    with pytest.raises(ResponseError, match='syntax error'):
+        client.execute_command('SET', 'test', 1, 'EX', 10, 'PX', 10)
+
+
+def test_set_nx_xx(redis):
+    client = redis.ext.client
+    assert client.set('test', 1, xx=True) is None
+    assert client.set('test', 1, nx=True)
+    assert client.set('test', 2, nx=True) is None
+    assert client.set('test', 3, xx=True)
+    assert redis.dict == {b'test': b'3'}
+
+
+def test_incrby_keeps_ttl(redis):
+    client = redis.ext.client
+    client.set('test', 1, ex=100)
+    client.incrby('test', 1)
+    assert client.ttl('test') == 100
+
+
+def test_expire_invalidates_watch(redis):
+    client = redis.ext.client
+    client.set('watched', 1, px=10)
+
+    pipeline = client.pipeline()
+    pipeline.watch('watched')
+    time.sleep(0.2)
+    pipeline.multi()
+    pipeline.set('key', 1)
+
+    with pytest.raises(WatchError):
+        pipeline.execute()
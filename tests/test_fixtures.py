@@ -0,0 +1,203 @@
+import os
+import time
+
+import pytest
+import redis as redis_client
+from redis.exceptions import ResponseError
+
+from rediserver import aof, snapshot
+from rediserver.keyspace import Keyspace
+from rediserver.test import DirectRedis, local_redis, load_template
+
+
+def test_dump_restore(redis):
+    client = redis.ext.client
+    client.set('string', 'value')
+    client.set('counter', 10)
+    client.rpush('list', 'a', 'b')
+    client.sadd('set', '1', '2')
+    client.sadd('members', 'a', 'b')
+    client.hset('hash', 'field', 'value')
+    client.zadd('zset', {'a': 1, 'b': 2.5})
+    expected = redis.dict
+
+    for key in expected:
+        payload = client.dump(key)
+        client.delete(key)
+        assert client.restore(key, 0, payload) == b'OK'
+    assert redis.dict == expected
+    assert client.incr('counter') == 11
+    assert client.object('encoding', 'set') == b'intset'
+    assert client.dump('missing') is None
+
+
+def test_restore_options(redis):
+    client = redis.ext.client
+    client.set('key', 'value')
+    payload = client.dump('key')
+
+    with pytest.raises(ResponseError, match='BUSYKEY'):
+        client.restore('key', 0, payload)
+    client.set('key', 'other')
+    assert client.restore('key', 0, payload, replace=True) == b'OK'
+    assert client.get('key') == b'value'
+
+    client.restore('relative', 10000, payload)
+    assert 9000 < client.pttl('relative') <= 10000
+    client.restore('absolute', int(time.time() * 1000) + 10000, payload, absttl=True)
+    assert 9000 < client.pttl('absolute') <= 10000
+    # expired already
+    client.restore('key', 1, payload, replace=True, absttl=True)
+    assert client.exists('key') == 0
+
+    with pytest.raises(ResponseError, match='checksum'):
+        client.restore('broken', 0, payload[:-1] + bytes([payload[-1] ^ 1]))
+    with pytest.raises(ResponseError, match='TTL'):
+        client.restore('negative', -1, payload)
+
+
+def test_restored_encodings_follow_the_config(tmpdir):
+    options = dict(set_max_intset_entries=2, hash_max_listpack_entries=1, zset_max_listpack_entries=1)
+    client = DirectRedis(**options)
+    client.sadd('set', 1, 2, 3)
+    client.hset('hash', mapping={'a': 1, 'b': 2})
+    client.zadd('zset', {'a': 1, 'b': 2})
+    encodings = {key: client.object('encoding', key) for key in ('set', 'hash', 'zset')}
+    assert encodings == {'set': b'hashtable', 'hash': b'hashtable', 'zset': b'skiplist'}
+
+    for key in encodings:
+        client.restore(key, 0, client.dump(key), replace=True)
+    assert {key: client.object('encoding', key) for key in encodings} == encodings
+
+    path = os.path.join(str(tmpdir), 'fixture.rdb')
+    snapshot.save(path, client.server.keys)
+    loaded = DirectRedis(**options)
+    loaded.server.import_file(path)
+    assert {key: loaded.object('encoding', key) for key in encodings} == encodings
+
+
+def test_import_fixture_files(tmpdir):
+    source = DirectRedis()
+    source.set('string', 'value')
+    source.rpush('list', 'a')
+    source.set('volatile', 'value', ex=100)
+    snapshot_path = os.path.join(str(tmpdir), 'fixture.rdb')
+    snapshot.save(snapshot_path, source.server.keys)
+
+    commands = bytearray()
+    aof.encode_command(commands, b'SET', (b'string', b'from commands'))
+    aof.encode_command(commands, b'SADD', (b'set', b'a', b'b'))
+    commands_path = os.path.join(str(tmpdir), 'fixture.resp')
+    with open(commands_path, 'wb') as fileobj:
+        fileobj.write(commands)
+
+    with local_redis(fixture=snapshot_path) as redis:
+        client = redis_client.StrictRedis(unix_socket_path=redis.sock)
+        client.set('string', 'changed')
+        assert redis.dict == {b'string': b'changed', b'list': (b'a',), b'volatile': b'value'}
+        assert client.ttl('volatile') > 90
+
+        redis.import_file(commands_path)
+        assert redis.dict == {b'string': b'from commands', b'list': (b'a',), b'volatile': b'value',
+                              b'set': {b'a', b'b'}}
+
+        # the initial dataset is restored
+        redis.reset()
+        assert redis.dict == {b'string': b'value', b'list': (b'a',), b'volatile': b'value'}
+
+
+def test_corrupted_snapshot_loads_nothing(tmpdir):
+    keys = Keyspace()
+    for index in range(snapshot.LOAD_BATCH_SIZE + 1):
+        keys[b'key:%d' % index] = b'value'
+    path = os.path.join(str(tmpdir), 'fixture.rdb')
+    snapshot.save(path, keys)
+    with open(path, 'r+b') as fileobj:
+        # a value of the last batch
+        fileobj.seek(-20, os.SEEK_END)
+        fileobj.write(b'V')
+
+    client = DirectRedis()
+    client.set('existing', 'value')
+    with pytest.raises(snapshot.SnapshotError, match='checksum'):
+        client.server.import_file(path)
+    assert client.dict == {b'existing': b'value'}
+
+
+def test_snapshot_strings_are_encoded(tmpdir):
+    keys = Keyspace()
+    keys[b'counter'] = b'10'
+    keys[b'string'] = b'010'
+    path = os.path.join(str(tmpdir), 'fixture.rdb')
+    snapshot.save(path, keys)
+
+    client = DirectRedis()
+    client.server.import_file(path)
+    assert client.object('encoding', 'counter') == b'int'
+    assert client.object('encoding', 'string') != b'int'
+    assert client.incr('counter') == 11
+
+
+def test_truncated_command_stream(tmpdir):
+    path = os.path.join(str(tmpdir), 'fixture.resp')
+    with open(path, 'wb') as fileobj:
+        fileobj.write(b'*3\r\n$3\r\nSET\r\n$3\r\nkey\r\n$5\r\nval')
+    client = DirectRedis()
+    with pytest.raises(aof.AofError):
+        client.server.import_file(path)
+
+
+def test_template_clones_are_copy_on_write():
+    source = DirectRedis()
+    source.rpush('list', 'a')
+    source.hset('hash', 'field', 'value')
+    source.set('string', 'value')
+    template = source.server.create_template()
+
+    first = DirectRedis()
+    first.server.load_template(template)
+    second = DirectRedis()
+    second.server.load_template(template)
+    assert first.server.keys[b'list'] is second.server.keys[b'list']
+
+    first.rpush('list', 'b')
+    first.hset('hash', 'field', 'changed')
+    source.rpush('list', 'c')
+    assert first.dict == {b'list': (b'a', b'b'), b'hash': {b'field': b'changed'}, b'string': b'value'}
+    assert second.dict == {b'list': (b'a',), b'hash': {b'field': b'value'}, b'string': b'value'}
+    assert source.lrange('list', 0, -1) == [b'a', b'c']
+    assert list(template.values[b'list']) == [b'a']
+
+
+def test_local_redis_template(tmpdir):
+    path = os.path.join(str(tmpdir), 'fixture.resp')
+    commands = bytearray()
+    aof.encode_command(commands, b'RPUSH', (b'jobs', b'a', b'b'))
+    with open(path, 'wb') as fileobj:
+        fileobj.write(commands)
+    template = load_template(path)
+
+    with local_redis(template=template) as first, local_redis(template=template) as second:
+        client = redis_client.StrictRedis(unix_socket_path=first.sock)
+        assert client.lpop('jobs') == b'a'
+        assert first.dict == {b'jobs': (b'b',)}
+        assert second.dict == {b'jobs': (b'a', b'b')}
+        first.reset()
+        assert first.dict == {b'jobs': (b'a', b'b')}
+
+
+def test_import_is_logged(tmpdir):
+    source = DirectRedis()
+    source.set('key', 'value', ex=100)
+    path = os.path.join(str(tmpdir), 'fixture.rdb')
+    snapshot.save(path, source.server.keys)
+
+    directory = os.path.join(str(tmpdir), 'data')
+    os.mkdir(directory)
+    with local_redis(appendonly=True, dir=directory, fixture=path):
+        pass
+    # the imported key is replayed from the append only file
+    with local_redis(appendonly=True, dir=directory) as redis:
+        client = redis_client.StrictRedis(unix_socket_path=redis.sock)
+        assert client.get('key') == b'value'
+        assert 90 < client.ttl('key') <= 100
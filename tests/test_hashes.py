@@ -0,0 +1,91 @@
+import pytest
+from redis.exceptions import ResponseError
+
+
+def test_set_get(redis):
+    client = redis.ext.client
+    assert client.hset('hash', mapping={'a': 1, 'b': 2}) == 2
+    assert client.hset('hash', mapping={'b': 3, 'c': 4}) == 1
+    assert client.hget('hash', 'b') == b'3'
+    assert client.hget('hash', 'missing') is None
+    assert client.hmget('hash', 'a', 'missing', 'c') == [b'1', None, b'4']
+    assert client.hlen('hash') == 3
+    assert client.type('hash') == b'hash'
+    assert redis.dict == {b'hash': {b'a': b'1', b'b': b'3', b'c': b'4'}}
+
+
+def test_field_equal_to_value(redis):
+    client = redis.ext.client
+    client.hset('hash', mapping={'a': 'b', 'b': 'c'})
+    assert client.hget('hash', 'b') == b'c'
+    assert client.hget('hash', 'c') is None
+    assert client.hsetnx('hash', 'c', 'x') == 1
+    assert client.hsetnx('hash', 'c', 'y') == 0
+    assert client.hgetall('hash') == {b'a': b'b', b'b': b'c', b'c': b'x'}
+
+
+def test_delete(redis):
+    client = redis.ext.client
+    client.hset('hash', mapping={'a': 1, 'b': 2})
+    assert client.hdel('hash', 'a', 'missing') == 1
+    assert client.hexists('hash', 'b')
+    assert not client.hexists('hash', 'a')
+    assert client.hdel('hash', 'b') == 1
+    assert redis.dict == {}
+
+
+def test_incrby(redis):
+    client = redis.ext.client
+    assert client.hincrby('hash', 'counter', 5) == 5
+    assert client.hincrby('hash', 'counter', -2) == 3
+    assert client.hincrbyfloat('hash', 'float', 1.5) == 1.5
+    client.hset('hash', 'text', 'abc')
+    with pytest.raises(ResponseError, match='not an integer'):
+        client.hincrby('hash', 'text', 1)
+    client.hset('hash', 'large', 2 ** 63 - 2)
+    assert client.hincrby('hash', 'large', 1) == 2 ** 63 - 1
+    with pytest.raises(ResponseError, match='would overflow'):
+        client.hincrby('hash', 'large', 1)
+    with pytest.raises(ResponseError, match='not an integer'):
+        client.hincrby('hash', 'counter', 2 ** 63)
+    client.hdel('hash', 'large')
+    assert redis.dict == {b'hash': {b'counter': b'3', b'float': b'1.5', b'text': b'abc'}}
+
+
+def test_scan(redis):
+    client = redis.ext.client
+    fields = {'field:%d' % index: index for index in range(300)}
+    client.hset('hash', mapping=fields)
+    assert dict(client.hscan_iter('hash', count=50)) == {key.encode(): b'%d' % value for key, value in fields.items()}
+    assert sorted(client.hkeys('hash')) == sorted(field.encode() for field in fields)
+
+
+def test_scan_with_deletes(redis):
+    client = redis.ext.client
+    client.hset('hash', mapping={'field:%d' % index: index for index in range(300)})
+    cursor, data = client.hscan('hash', count=30)
+    client.hdel('hash', *['field:%d' % index for index in range(0, 300, 3)])
+    while cursor:
+        cursor, more = client.hscan('hash', cursor=cursor, count=30)
+        data.update(more)
+    assert {'field:%d' % index for index in range(300) if index % 3}.issubset(key.decode() for key in data)
+
+
+def test_encoding_conversion(redis):
+    client = redis.ext.client
+    client.hset('small', mapping={'a': 1})
+    assert client.object('encoding', 'small') == b'listpack'
+
+    client.hset('many', mapping={'field:%d' % index: index for index in range(129)})
+    assert client.object('encoding', 'many') == b'hashtable'
+
+    client.hset('long', 'field', 'x' * 65)
+    assert client.object('encoding', 'long') == b'hashtable'
+    assert client.hget('long', 'field') == b'x' * 65
+
+
+def test_wrongtype(redis):
+    client = redis.ext.client
+    client.sadd('set', 1)
+    with pytest.raises(ResponseError, match='WRONGTYPE'):
+        client.hset('set', 'a', 1)
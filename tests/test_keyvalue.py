@@ -114,6 +114,64 @@ def test_decrby_notint_value(redis):
     assert redis.dict == {b'test': b'1'}
 
 
+def test_incr_decr(redis):
+    client = redis.ext.client
+    assert client.incr('counter') == 1
+    assert client.decr('counter') == 0
+    assert client.decr('counter') == -1
+    assert client.get('counter') == b'-1'
+    assert client.object('encoding', 'counter') == b'int'
+    assert client.append('counter', '5') == 3
+    assert client.object('encoding', 'counter') == b'embstr'
+    assert client.incr('counter') == -14
+
+
+def test_integer_strings(redis):
+    client = redis.ext.client
+    client.mset({'int': 123, 'zero': '0123', 'big': '9223372036854775808'})
+    assert client.object('encoding', 'int') == b'int'
+    assert client.object('encoding', 'zero') == b'embstr'
+    assert client.object('encoding', 'big') == b'embstr'
+    assert client.mget('int', 'zero', 'big') == [b'123', b'0123', b'9223372036854775808']
+    assert client.strlen('int') == 3
+    with pytest.raises(ResponseError, match='not an integer'):
+        client.incr('zero')
+
+
+def test_incr_overflow(redis):
+    client = redis.ext.client
+    client.set('counter', 2 ** 63 - 2)
+    assert client.incr('counter') == 2 ** 63 - 1
+    with pytest.raises(ResponseError, match='would overflow'):
+        client.incr('counter')
+    with pytest.raises(ResponseError, match='not an integer'):
+        client.incrby('counter', 2 ** 63)
+    client.set('counter', -2 ** 63)
+    with pytest.raises(ResponseError, match='would overflow'):
+        client.decr('counter')
+    assert client.get('counter') == b'-9223372036854775808'
+
+
+def test_incrbyfloat(redis):
+    client = redis.ext.client
+    client.set('value', 10)
+    assert client.incrbyfloat('value', 0.5) == 10.5
+    assert client.incrbyfloat('value', 1.5) == 12
+    assert client.get('value') == b'12'
+    client.set('text', 'abc')
+    with pytest.raises(ResponseError, match='not a valid float'):
+        client.incrbyfloat('text', 1)
+
+
+def test_getset(redis):
+    client = redis.ext.client
+    assert client.getset('key', 1) is None
+    client.expire('key', 100)
+    assert client.getset('key', 'value') == b'1'
+    assert client.ttl('key') == -1
+    assert redis.dict == {b'key': b'value'}
+
+
 def test_scan(redis):
     client = redis.ext.client
     for key, value in KEYS_DATA.items():
@@ -147,3 +205,149 @@ def test_scan_add(redis):
 
     assert added
     assert result == set(KEYS_DATA.keys())
+
+
+def test_scan_readded_key(redis):
+    client = redis.ext.client
+    for _ in range(60):
+        client.set('key', 'value')
+        client.delete('key')
+    client.set('key', 'value')
+
+    cursor, keys = client.scan(0, count=1000)
+    assert cursor == 0
+    assert keys == [b'key']
+
+
+def test_command_case_insensitive(redis):
+    client = redis.ext.client
+    client.execute_command('set', 'test', 1)
+    assert client.execute_command('Get', 'test') == b'1'
+
+
+def test_wrong_number_of_arguments(redis):
+    client = redis.ext.client
+    with pytest.raises(ResponseError, match="wrong number of arguments for 'get' command"):
+        client.execute_command('GET', 'test', 'extra')
+    assert redis.dict == {}
+
+
+def test_scan_match(redis):
+    client = redis.ext.client
+    for key, value in KEYS_DATA.items():
+        client.set(key, value)
+
+    result = set(client.scan_iter(match='*key*'))
+    assert result == {b'key1', b'key3', b'some_key', b'a_key', b'the_key'}
+
+
+def test_scan_count(redis):
+    client = redis.ext.client
+    for index in range(100):
+        client.set('key{}'.format(index), index)
+
+    cursor, data = client.scan(cursor=0, count=30)
+    assert cursor != 0
+    assert len(data) == 30
+    assert len(set(client.scan_iter(count=7))) == 100
+
+
+def test_scan_type(redis):
+    client = redis.ext.client
+    client.set('string', 1)
+    client.sadd('set', 1)
+
+    assert set(client.scan_iter(_type='set')) == {b'set'}
+    assert set(client.scan_iter(_type='string')) == {b'string'}
+
+
+def test_scan_delete(redis):
+    client = redis.ext.client
+    for index in range(100):
+        client.set('key{}'.format(index), index)
+
+    result = set()
+    cursor, data = client.scan(cursor=0, count=20)
+    result.update(data)
+    for index in range(0, 100, 2):
+        client.delete('key{}'.format(index))
+    for index in range(200):
+        client.set('other{}'.format(index), index)
+        client.delete('other{}'.format(index))
+
+    while cursor != 0:
+        cursor, data = client.scan(cursor=cursor, count=20)
+        result.update(data)
+
+    assert {'key{}'.format(index).encode() for index in range(1, 100, 2)} <= result
+
+
+def test_type(redis):
+    client = redis.ext.client
+    client.set('string', 1)
+    client.sadd('set', 1)
+
+    assert client.type('string') == b'string'
+    assert client.type('set') == b'set'
+    assert client.type('none') == b'none'
+
+
+def test_mget(redis):
+    client = redis.ext.client
+    client.set('first', 1)
+    client.set('second', 2)
+    client.sadd('set', 1)
+    assert client.mget('first', 'missing', 'set', 'second') == [b'1', None, None, b'2']
+
+
+def test_mset(redis):
+    client = redis.ext.client
+    client.set('first', 0, ex=100)
+    client.sadd('set', 1)
+    assert client.mset({'first': 1, 'second': 2, 'set': 3})
+    assert redis.dict == {b'first': b'1', b'second': b'2', b'set': b'3'}
+    assert client.ttl('first') == -1
+
+    with pytest.raises(ResponseError, match='wrong number of arguments'):
+        client.execute_command('MSET', 'first', 1, 'second')
+
+
+def test_msetnx(redis):
+    client = redis.ext.client
+    assert client.msetnx({'first': 1, 'second': 2})
+    assert not client.msetnx({'second': 3, 'third': 3})
+    assert redis.dict == {b'first': b'1', b'second': b'2'}
+
+
+def test_del_count(redis):
+    client = redis.ext.client
+    client.mset({'first': 1, 'second': 2})
+    assert client.delete('first', 'missing', 'second') == 2
+    assert client.delete('first') == 0
+    assert redis.dict == {}
+
+
+def test_unlink(redis):
+    client = redis.ext.client
+    client.mset({'first': 1, 'second': 2})
+    assert client.unlink('first', 'missing') == 1
+    assert redis.dict == {b'second': b'2'}
+
+
+def test_exists(redis):
+    client = redis.ext.client
+    client.set('first', 1)
+    client.sadd('set', 1)
+    assert client.exists('first', 'set', 'missing', 'first') == 3
+    assert client.exists('missing') == 0
+
+
+def test_flushall(redis):
+    client = redis.ext.client
+    client.set('key', 'value')
+    client.sadd('set', 1)
+    assert client.flushall()
+    assert redis.dict == {}
+    client.set('key', 'value')
+    assert client.flushdb(asynchronous=True)
+    assert redis.dict == {}
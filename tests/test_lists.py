@@ -0,0 +1,153 @@
+import time
+import threading
+
+import pytest
+from redis.exceptions import ResponseError
+
+
+def test_push_and_range(redis):
+    client = redis.ext.client
+    assert client.rpush('test_key1', 'a', 'b') == 2
+    assert client.lpush('test_key1', 'c', 'd') == 4
+    assert redis.dict == {b'test_key1': (b'd', b'c', b'a', b'b')}
+    assert client.llen('test_key1') == 4
+    assert client.llen('missing') == 0
+
+    assert client.lrange('test_key1', 0, -1) == [b'd', b'c', b'a', b'b']
+    assert client.lrange('test_key1', 1, 2) == [b'c', b'a']
+    assert client.lrange('test_key1', -2, 100) == [b'a', b'b']
+    assert client.lrange('test_key1', -100, 0) == [b'd']
+    assert client.lrange('test_key1', 3, 1) == []
+    assert client.lrange('missing', 0, -1) == []
+
+
+def test_pop(redis):
+    client = redis.ext.client
+    client.rpush('test_key1', 'a', 'b', 'c', 'd')
+    assert client.lpop('test_key1') == b'a'
+    assert client.rpop('test_key1') == b'd'
+    assert client.lpop('test_key1', 5) == [b'b', b'c']
+    assert redis.dict == {}
+
+    assert client.lpop('test_key1') is None
+    assert client.rpop('test_key1', 2) is None
+    client.rpush('test_key1', 'a', 'b', 'c')
+    assert client.rpop('test_key1', 2) == [b'c', b'b']
+    with pytest.raises(ResponseError, match='must be positive'):
+        client.lpop('test_key1', -1)
+
+
+def test_trim(redis):
+    client = redis.ext.client
+    client.rpush('test_key1', *range(10))
+    assert client.ltrim('test_key1', 2, -3)
+    assert client.lrange('test_key1', 0, -1) == [b'2', b'3', b'4', b'5', b'6', b'7']
+    assert client.ltrim('test_key1', 4, 2)
+    assert redis.dict == {}
+
+
+def test_move(redis):
+    client = redis.ext.client
+    client.rpush('source', 'a', 'b', 'c')
+    assert client.lmove('source', 'destination', 'LEFT', 'RIGHT') == b'a'
+    assert client.lmove('source', 'destination', 'RIGHT', 'LEFT') == b'c'
+    assert client.lmove('source', 'source', 'LEFT', 'RIGHT') == b'b'
+    assert redis.dict == {b'source': (b'b',), b'destination': (b'c', b'a')}
+    assert client.lmove('missing', 'destination') is None
+
+    with pytest.raises(ResponseError, match='syntax'):
+        client.lmove('source', 'destination', 'UP', 'LEFT')
+
+
+def test_wrongtype(redis):
+    client = redis.ext.client
+    client.set('test_key1', 1)
+    client.rpush('test_key2', 'a')
+
+    for call in (lambda: client.lpush('test_key1', 'a'), lambda: client.lrange('test_key1', 0, -1),
+                 lambda: client.lmove('test_key2', 'test_key1'), lambda: client.blpop(['test_key1'], 1)):
+        with pytest.raises(ResponseError, match='WRONGTYPE'):
+            call()
+    assert client.type('test_key2') == b'list'
+    assert client.object('encoding', 'test_key2') == b'quicklist'
+    assert redis.dict == {b'test_key1': b'1', b'test_key2': (b'a',)}
+
+
+def test_blocking_pop_with_data(redis):
+    client = redis.ext.client
+    client.rpush('test_key2', 'a', 'b')
+    assert client.blpop(['test_key1', 'test_key2'], 1) == (b'test_key2', b'a')
+    assert client.brpop(['test_key2'], 1) == (b'test_key2', b'b')
+    assert redis.dict == {}
+
+    with pytest.raises(ResponseError, match='timeout is negative'):
+        client.blpop(['test_key1'], -1)
+
+
+def test_blocking_pop_timeout(redis):
+    client = redis.ext.client
+    start = time.time()
+    assert client.blpop(['test_key1'], 0.1) is None
+    assert 0.1 <= time.time() - start < 1
+    assert client.blmove('test_key1', 'test_key2', 0.1) is None
+    # the connection serves commands after the timeout
+    assert client.ping()
+
+
+def test_blocking_pop_woken_by_push(redis):
+    results = []
+    workers = []
+    for _ in range(2):
+        worker = threading.Thread(target=lambda client: results.append(client.blpop(['jobs'], 5)),
+                                  args=(redis.ext.new_client(),))
+        worker.start()
+        workers.append(worker)
+    while len(redis.instance.blocking.waiters.get(b'jobs', ())) < 2:
+        time.sleep(0.01)
+
+    start = time.time()
+    assert redis.ext.client.rpush('jobs', 'a', 'b', 'c') == 3
+    for worker in workers:
+        worker.join()
+    assert time.time() - start < 1
+    assert sorted(results) == [(b'jobs', b'a'), (b'jobs', b'b')]
+    assert redis.dict == {b'jobs': (b'c',)}
+    assert redis.instance.blocking.waiters == {}
+
+
+def test_blocking_move_woken_by_push(redis):
+    results = []
+    worker = threading.Thread(target=lambda client: results.append(client.blmove('jobs', 'processing', 5)),
+                              args=(redis.ext.new_client(),))
+    worker.start()
+    while b'jobs' not in redis.instance.blocking.waiters:
+        time.sleep(0.01)
+
+    redis.ext.client.lpush('jobs', 'a')
+    worker.join()
+    assert results == [b'a']
+    assert redis.dict == {b'processing': (b'a',)}
+
+
+def test_blocking_pop_in_transaction(redis):
+    client = redis.ext.client
+    pipeline = client.pipeline()
+    pipeline.blpop(['test_key1'], 0)
+    pipeline.rpush('test_key1', 'a')
+    pipeline.blpop(['test_key1'], 0)
+    assert pipeline.execute() == [None, 1, (b'test_key1', b'a')]
+    assert client.eval("return redis.call('BLPOP', KEYS[1], 0)", 1, 'test_key1') is None
+
+
+def test_disconnected_waiter_is_not_served(redis):
+    client = redis.ext.new_client()
+    connection = client.connection_pool.get_connection('BLPOP')
+    connection.send_command('BLPOP', 'jobs', 0)
+    while b'jobs' not in redis.instance.blocking.waiters:
+        time.sleep(0.01)
+    connection.disconnect()
+    while b'jobs' in redis.instance.blocking.waiters:
+        time.sleep(0.01)
+
+    redis.ext.client.rpush('jobs', 'a')
+    assert redis.dict == {b'jobs': (b'a',)}
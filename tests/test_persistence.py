@@ -0,0 +1,220 @@
+import os
+import time
+
+import pytest
+import redis as redis_client
+
+from rediserver import snapshot
+from rediserver.keyspace import Keyspace
+from rediserver.test import local_redis
+
+
+@pytest.fixture
+def persistent(tmpdir):
+    def start(**options):
+        return local_redis(dir=str(tmpdir), dbfilename='dump.rdb', **options)
+    return start
+
+
+def wait_for(predicate, timeout=5):
+    deadline = time.time() + timeout
+    while not predicate():
+        assert time.time() < deadline
+        time.sleep(0.01)
+
+
+def test_save_and_load(persistent):
+    with persistent() as redis:
+        client = redis_client.StrictRedis(unix_socket_path=redis.sock)
+        client.set('string', 'value')
+        client.set('volatile', 'value', ex=100)
+        client.sadd('set', 1, 2, 3)
+        client.zadd('zset', {'a': 1.5, 'b': -2})
+        client.hset('hash', mapping={'a': 1, 'b': 2})
+        client.rpush('list', 'a', 'b', 'a')
+        assert client.save()
+
+    with persistent() as redis:
+        client = redis_client.StrictRedis(unix_socket_path=redis.sock)
+        assert redis.dict == {
+            b'string': b'value', b'volatile': b'value', b'set': {b'1', b'2', b'3'}, b'zset': {b'a': 1.5, b'b': -2},
+            b'hash': {b'a': b'1', b'b': b'2'}, b'list': (b'a', b'b', b'a'),
+        }
+        assert 99 <= client.ttl('volatile') <= 100
+
+
+def test_load_skips_expired(persistent):
+    with persistent() as redis:
+        client = redis_client.StrictRedis(unix_socket_path=redis.sock)
+        client.set('volatile', 'value', px=50)
+        client.set('string', 'value')
+        assert client.save()
+
+    time.sleep(0.1)
+    with persistent() as redis:
+        assert redis.dict == {b'string': b'value'}
+
+
+def test_scripts_are_saved(persistent):
+    with persistent() as redis:
+        client = redis_client.StrictRedis(unix_socket_path=redis.sock)
+        sha = client.script_load('return redis.call("GET", KEYS[1])')
+        client.set('key', 'value')
+        assert client.save()
+
+    with persistent() as redis:
+        client = redis_client.StrictRedis(unix_socket_path=redis.sock)
+        assert client.evalsha(sha, 1, 'key') == b'value'
+
+
+def test_bgsave(persistent, tmpdir):
+    with persistent() as redis:
+        client = redis_client.StrictRedis(unix_socket_path=redis.sock)
+        client.set('string', 'value')
+        lastsave = client.lastsave()
+        time.sleep(1)
+
+        assert client.bgsave()
+        wait_for(lambda: client.lastsave() > lastsave)
+        assert os.path.exists(str(tmpdir.join('dump.rdb')))
+
+    with persistent() as redis:
+        assert redis.dict == {b'string': b'value'}
+
+
+def test_save_policy(persistent, tmpdir):
+    with persistent(save=[(0, 2)], hz=100) as redis:
+        client = redis_client.StrictRedis(unix_socket_path=redis.sock)
+        client.set('first', 1)
+        time.sleep(0.1)
+        assert not os.path.exists(str(tmpdir.join('dump.rdb')))
+
+        client.set('second', 2)
+        wait_for(lambda: os.path.exists(str(tmpdir.join('dump.rdb'))))
+
+    with persistent() as redis:
+        assert redis.dict == {b'first': b'1', b'second': b'2'}
+
+
+def test_save_without_file(redis):
+    client = redis.ext.client
+    with pytest.raises(redis_client.ResponseError, match='not configured'):
+        client.save()
+
+
+def test_snapshot_checksum(tmpdir):
+    keys = Keyspace()
+    keys[b'key'] = b'value'
+    path = str(tmpdir.join('dump.rdb'))
+    snapshot.save(path, keys)
+
+    with open(path, 'rb') as fileobj:
+        data = bytearray(fileobj.read())
+    assert list(snapshot.read_snapshot(data)) == [([b'key'], [b'value'], {}, [])]
+
+    data[-10] ^= 0xFF
+    with pytest.raises(snapshot.SnapshotError):
+        list(snapshot.read_snapshot(data))
+    with pytest.raises(snapshot.SnapshotError):
+        list(snapshot.read_snapshot(data[:-20]))
+
+
+@pytest.fixture
+def appendonly(tmpdir):
+    def start(**options):
+        return local_redis(dir=str(tmpdir), appendonly=True, **options)
+    return start
+
+
+def test_aof_replay(appendonly):
+    with appendonly(appendfsync='always') as redis:
+        client = redis_client.StrictRedis(unix_socket_path=redis.sock)
+        sha = client.script_load('return redis.call("INCRBY", KEYS[1], 2)')
+        client.set('string', 'value')
+        client.set('volatile', 'value', ex=100)
+        client.set('expired', 'value', px=1)
+        client.sadd('set', 1, 2, 3)
+        client.srem('set', 3)
+        popped = client.spop('set')
+        client.evalsha(sha, 1, 'counter')
+        client.delete('string')
+        client.rpush('list', 'a', 'b')
+        assert client.blpop('list', 1) == (b'list', b'a')
+
+    time.sleep(0.01)
+    with appendonly() as redis:
+        client = redis_client.StrictRedis(unix_socket_path=redis.sock)
+        assert redis.dict == {
+            b'volatile': b'value', b'set': {b'1', b'2'} - {popped}, b'counter': b'2', b'list': (b'b',),
+        }
+        assert 99 <= client.ttl('volatile') <= 100
+        assert client.evalsha(sha, 1, 'counter') == 4
+
+
+def test_aof_written_before_reply(appendonly, tmpdir):
+    with appendonly(appendfsync='always') as redis:
+        client = redis_client.StrictRedis(unix_socket_path=redis.sock)
+        with client.pipeline(transaction=False) as pipe:
+            for index in range(100):
+                pipe.set('key:{}'.format(index), index)
+            pipe.execute()
+
+        with open(str(tmpdir.join('appendonly.aof')), 'rb') as fileobj:
+            data = fileobj.read()
+        assert data.endswith(b'*3\r\n$3\r\nSET\r\n$6\r\nkey:99\r\n$2\r\n99\r\n')
+
+
+def test_aof_created_from_snapshot(appendonly, persistent):
+    with persistent() as redis:
+        client = redis_client.StrictRedis(unix_socket_path=redis.sock)
+        client.set('string', 'value')
+        client.save()
+
+    with appendonly(dbfilename='dump.rdb') as redis:
+        client = redis_client.StrictRedis(unix_socket_path=redis.sock)
+        client.set('other', 'value')
+
+    with appendonly() as redis:
+        assert redis.dict == {b'string': b'value', b'other': b'value'}
+
+
+def test_bgrewriteaof(appendonly, tmpdir):
+    path = str(tmpdir.join('appendonly.aof'))
+    with appendonly() as redis:
+        client = redis_client.StrictRedis(unix_socket_path=redis.sock)
+        for index in range(100):
+            client.set('key', index)
+        client.sadd('set', 1, 2)
+        size = os.path.getsize(path)
+
+        assert client.bgrewriteaof()
+        client.set('during', 'rewrite')
+        wait_for(lambda: redis.instance.aof_rewrite_child is None)
+        client.set('after', 'rewrite')
+
+        with open(path, 'rb') as fileobj:
+            assert fileobj.read(len(snapshot.MAGIC)) == snapshot.MAGIC
+        assert os.path.getsize(path) < size
+
+    with appendonly() as redis:
+        assert redis.dict == {b'key': b'99', b'set': {b'1', b'2'}, b'during': b'rewrite', b'after': b'rewrite'}
+
+
+def test_aof_truncated_command(appendonly, tmpdir):
+    path = str(tmpdir.join('appendonly.aof'))
+    with appendonly() as redis:
+        client = redis_client.StrictRedis(unix_socket_path=redis.sock)
+        client.set('key', 'value')
+
+    size = os.path.getsize(path)
+    with open(path, 'ab') as fileobj:
+        fileobj.write(b'*3\r\n$3\r\nSET\r\n$5\r\nother\r\n$5\r\nva')
+
+    with appendonly() as redis:
+        assert redis.dict == {b'key': b'value'}
+    assert os.path.getsize(path) == size
+
+
+def test_bgrewriteaof_disabled(redis):
+    with pytest.raises(redis_client.ResponseError, match='disabled'):
+        redis.ext.client.bgrewriteaof()
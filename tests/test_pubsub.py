@@ -0,0 +1,137 @@
+import time
+import socket
+
+import pytest
+import redis as redis_client
+from redis.exceptions import ResponseError
+
+from rediserver.test import local_redis
+
+
+def next_message(pubsub):
+    message = pubsub.get_message(timeout=1)
+    assert message is not None
+    return message
+
+
+def test_subscribe_publish(redis):
+    client = redis.ext.client
+    pubsub = client.pubsub()
+    pubsub.subscribe('news', 'sport')
+    assert next_message(pubsub) == {'type': 'subscribe', 'pattern': None, 'channel': b'news', 'data': 1}
+    assert next_message(pubsub) == {'type': 'subscribe', 'pattern': None, 'channel': b'sport', 'data': 2}
+
+    assert client.publish('news', 'hello') == 1
+    assert client.publish('weather', 'rain') == 0
+    assert next_message(pubsub) == {'type': 'message', 'pattern': None, 'channel': b'news', 'data': b'hello'}
+
+    pubsub.unsubscribe('news')
+    assert next_message(pubsub) == {'type': 'unsubscribe', 'pattern': None, 'channel': b'news', 'data': 1}
+    assert client.publish('news', 'hello') == 0
+    pubsub.close()
+
+
+def test_pattern_subscribe(redis):
+    client = redis.ext.client
+    pubsub = client.pubsub()
+    pubsub.psubscribe('user:*:events', 'user:1?:events', '*')
+    for _ in range(3):
+        assert next_message(pubsub)['type'] == 'psubscribe'
+
+    assert client.publish('user:12:events', 'login') == 3
+    patterns = {next_message(pubsub)['pattern'] for _ in range(3)}
+    assert patterns == {b'user:*:events', b'user:1?:events', b'*'}
+
+    assert client.publish('user:2:events', 'login') == 2
+    assert client.publish('other', 'value') == 1
+    assert client.pubsub_numpat() == 3
+    for _ in range(3):
+        assert next_message(pubsub)['type'] == 'pmessage'
+
+    pubsub.punsubscribe()
+    for _ in range(3):
+        assert next_message(pubsub)['type'] == 'punsubscribe'
+    assert client.pubsub_numpat() == 0
+    pubsub.close()
+
+
+def test_malformed_pattern_classes(redis):
+    client = redis.ext.client
+    pubsub = client.pubsub()
+    pubsub.psubscribe('news[^]', 'sport[a')
+    for _ in range(2):
+        assert next_message(pubsub)['type'] == 'psubscribe'
+
+    # empty and unterminated classes are matched literally
+    assert client.publish('newsx', 'value') == 0
+    assert client.publish('news[^]', 'value') == 1
+    assert client.publish('sport[a', 'value') == 1
+    client.set('key', 'value')
+    assert list(client.scan_iter(match='[^]')) == []
+    pubsub.close()
+
+
+def test_pubsub_introspection(redis):
+    client = redis.ext.client
+    first = client.pubsub()
+    second = client.pubsub()
+    first.subscribe('news', 'sport')
+    second.subscribe('news')
+    next_message(first)
+    next_message(second)
+
+    assert sorted(client.pubsub_channels()) == [b'news', b'sport']
+    assert client.pubsub_channels('n*') == [b'news']
+    assert client.pubsub_numsub('news', 'sport', 'other') == [(b'news', 2), (b'sport', 1), (b'other', 0)]
+
+    first.close()
+    time.sleep(0.1)
+    assert client.pubsub_numsub('news', 'sport') == [(b'news', 1), (b'sport', 0)]
+    second.close()
+
+
+def test_subscriber_mode(redis):
+    with socket.socket(socket.AF_UNIX) as connection:
+        connection.connect(redis.sock)
+        connection.sendall(b'SUBSCRIBE news\r\nGET key\r\nPING\r\n')
+        expected = (
+            b'*3\r\n$9\r\nsubscribe\r\n$4\r\nnews\r\n:1\r\n'
+            b"-ERR Can't execute 'get': only (P)SUBSCRIBE / (P)UNSUBSCRIBE / PING / QUIT / RESET "
+            b'are allowed in this context\r\n'
+            b'*2\r\n$4\r\npong\r\n$0\r\n\r\n'
+        )
+        data = b''
+        while len(data) < len(expected):
+            data += connection.recv(4096)
+        assert data == expected
+
+
+def test_lowercase_subscribe(redis):
+    with socket.socket(socket.AF_UNIX) as connection:
+        connection.connect(redis.sock)
+        connection.sendall(b'subscribe news\r\nping\r\n')
+        expected = b'*3\r\n$9\r\nsubscribe\r\n$4\r\nnews\r\n:1\r\n*2\r\n$4\r\npong\r\n$0\r\n\r\n'
+        data = b''
+        while len(data) < len(expected):
+            data += connection.recv(4096)
+        assert data == expected
+
+
+def test_subscribe_requires_channel(redis):
+    with pytest.raises(ResponseError, match='wrong number of arguments'):
+        redis.ext.client.execute_command('SUBSCRIBE')
+
+
+def test_slow_subscriber_is_disconnected():
+    with local_redis(client_output_buffer_limit_pubsub=64 * 1024) as redis, socket.socket(socket.AF_UNIX) as connection:
+        client = redis_client.StrictRedis(unix_socket_path=redis.sock)
+        connection.connect(redis.sock)
+        connection.sendall(b'SUBSCRIBE news\r\n')
+        connection.recv(1024)
+
+        # the subscriber never reads, the messages fill the socket buffers and then the output buffer
+        message = b'x' * 64 * 1024
+        for _ in range(200):
+            if client.publish('news', message) == 0:
+                break
+        assert client.pubsub_numsub('news') == [(b'news', 0)]
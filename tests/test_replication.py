@@ -0,0 +1,125 @@
+import time
+
+import pytest
+import redis as redis_client
+
+from rediserver.test import local_redis
+
+
+def wait_for(predicate, timeout=5):
+    deadline = time.time() + timeout
+    while not predicate():
+        assert time.time() < deadline
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def replica(redis):
+    with local_redis(replicaof=redis.sock) as replica:
+        replica.extend('client', redis_client.StrictRedis(unix_socket_path=replica.sock))
+        wait_for(lambda: replica.ext.client.execute_command('ROLE')[3] == b'connected')
+        yield replica
+
+
+def test_full_sync(redis):
+    client = redis.ext.client
+    client.set('string', 'value')
+    client.sadd('set', 1, 2)
+    sha = client.script_load('return redis.call("GET", KEYS[1])')
+
+    with local_redis(replicaof=redis.sock) as replica:
+        replica_client = redis_client.StrictRedis(unix_socket_path=replica.sock)
+        wait_for(lambda: replica.dict == redis.dict)
+        assert replica_client.evalsha(sha, 1, 'string') == b'value'
+
+
+def test_command_stream(redis, replica):
+    client = redis.ext.client
+    with client.pipeline(transaction=False) as pipe:
+        for index in range(100):
+            pipe.incrby('counter', index)
+        pipe.set('volatile', 'value', ex=100)
+        pipe.sadd('set', 1, 2, 3)
+        pipe.spop('set')
+        pipe.execute()
+
+    wait_for(lambda: replica.dict == redis.dict)
+    assert replica.ext.client.get('counter') == b'4950'
+    assert 99 <= replica.ext.client.ttl('volatile') <= 100
+
+
+def test_replica_is_read_only(redis, replica):
+    redis.ext.client.set('key', 'value')
+    wait_for(lambda: replica.ext.client.get('key') == b'value')
+
+    with pytest.raises(redis_client.ReadOnlyError):
+        replica.ext.client.set('key', 'other')
+    sha = replica.ext.client.script_load('return redis.call("SET", KEYS[1], "other")')
+    with pytest.raises(redis_client.ResponseError, match='read only replica'):
+        replica.ext.client.evalsha(sha, 1, 'key')
+    assert replica.ext.client.execute_command('READONLY')
+    assert replica.ext.client.get('key') == b'value'
+
+
+def test_partial_resync(redis, replica):
+    client = redis.ext.client
+    client.set('before', 'value')
+    wait_for(lambda: replica.dict == redis.dict)
+
+    replication = redis.instance.replication
+    offset = replication.offset
+
+    def disconnect():
+        for writer in list(replication.replicas):
+            writer.close()
+
+    replication.loop.call_soon_threadsafe(disconnect)
+    wait_for(lambda: replica.ext.client.execute_command('ROLE')[3] != b'connected')
+    client.set('during', 'disconnect')
+
+    wait_for(lambda: replica.dict == redis.dict)
+    assert replication.stat_sync_full == 1
+    assert replication.stat_sync_partial_ok == 1
+    assert replication.offset > offset
+
+
+def test_link_cut_in_the_middle_of_a_command(redis, replica):
+    client = redis.ext.client
+    client.set('before', 'value')
+    wait_for(lambda: replica.dict == redis.dict)
+
+    instance = redis.instance
+    replication = instance.replication
+
+    def cut():
+        instance.lookup_command(b'SET')(b'large', b'x' * 1000)
+        data = bytes(replication.pending)
+        replication.pending = bytearray()
+        replication.backlog.append(data)
+        replication.offset += len(data)
+        # the replica receives the arguments but not the end of the command
+        for writer in list(replication.replicas):
+            writer.write(data[:len(data) // 2])
+            writer.close()
+
+    replication.loop.call_soon_threadsafe(cut)
+    wait_for(lambda: replication.stat_sync_partial_ok == 1)
+    wait_for(lambda: replica.dict == redis.dict)
+    assert replica.ext.client.execute_command('ROLE')[4] == replication.offset
+    assert replication.stat_sync_full == 1
+
+
+def test_promote_replica(redis, replica):
+    redis.ext.client.set('key', 'value')
+    wait_for(lambda: replica.dict == redis.dict)
+
+    assert replica.ext.client.execute_command('REPLICAOF', 'NO', 'ONE')
+    assert replica.ext.client.execute_command('ROLE')[0] == b'master'
+    replica.ext.client.set('key', 'other')
+    assert redis.ext.client.get('key') == b'value'
+
+
+def test_role(redis, replica):
+    role, offset, replicas = redis.ext.client.execute_command('ROLE')
+    assert role == b'master'
+    assert len(replicas) == 1
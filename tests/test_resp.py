@@ -0,0 +1,98 @@
+import socket
+
+import pytest
+
+from rediserver import resp
+
+
+def pack(*args):
+    result = [b'*' + str(len(args)).encode()]
+    for arg in args:
+        result.extend([b'$' + str(len(arg)).encode(), arg])
+    return resp.SYM_CRLF.join(result) + resp.SYM_CRLF
+
+
+def test_parse_many():
+    parser = resp.RequestParser()
+    parser.feed(pack(b'SET', b'key', b'value') + pack(b'GET', b'key'))
+    assert parser.get_commands(10) == [[b'SET', b'key', b'value'], [b'GET', b'key']]
+    assert parser.get_commands(10) == []
+
+
+def test_parse_limit():
+    parser = resp.RequestParser()
+    parser.feed(pack(b'GET', b'a') + pack(b'GET', b'b'))
+    assert parser.get_commands(1) == [[b'GET', b'a']]
+    assert parser.get_commands(1) == [[b'GET', b'b']]
+
+
+def test_parse_byte_by_byte():
+    data = pack(b'SADD', b'key', *[str(i).encode() for i in range(100)]) + pack(b'GET', b'\r\n')
+    parser = resp.RequestParser()
+    commands = []
+    for index in range(len(data)):
+        parser.feed(data[index:index + 1])
+        commands.extend(parser.get_commands(10))
+    assert commands == [
+        [b'SADD', b'key'] + [str(i).encode() for i in range(100)],
+        [b'GET', b'\r\n'],
+    ]
+
+
+def test_parse_inline():
+    parser = resp.RequestParser()
+    parser.feed(b'SET key  value\r\n\r\nGET key\n')
+    assert parser.get_commands(10) == [[b'SET', b'key', b'value'], [b'GET', b'key']]
+
+
+def test_parse_invalid_bulk_length():
+    parser = resp.RequestParser(max_bulk_length=10)
+    parser.feed(b'*2\r\n$3\r\nGET\r\n$11\r\n')
+    with pytest.raises(resp.ProtocolError, match='invalid bulk length'):
+        parser.get_commands(10)
+
+
+def test_parse_invalid_multibulk_length():
+    parser = resp.RequestParser()
+    parser.feed(b'*99999999999\r\n')
+    with pytest.raises(resp.ProtocolError, match='invalid multibulk length'):
+        parser.get_commands(10)
+
+
+def test_inline_command(redis):
+    with socket.socket(socket.AF_UNIX) as sock:
+        sock.connect(redis.sock)
+        sock.sendall(b'SET test 1\r\nGET test\r\n')
+        data = b''
+        while data.count(b'\r\n') < 3:
+            data += sock.recv(1024)
+    assert data == b'+OK\r\n$1\r\n1\r\n'
+
+
+def test_encode_constants():
+    assert resp.dump_response(resp.OK) == b'+OK\r\n'
+    assert resp.dump_response(resp.QUEUED) == b'+QUEUED\r\n'
+    assert resp.dump_response(resp.NIL) == b'$-1\r\n'
+    assert resp.dump_response(resp.Errors.WRONGTYPE).startswith(b'-WRONGTYPE Operation')
+
+
+def test_encode_integers():
+    assert resp.dump_response(5) == b':5\r\n'
+    assert resp.dump_response(-5) == b':-5\r\n'
+    assert resp.dump_response(10 ** 10) == b':10000000000\r\n'
+
+
+def test_encode_nested():
+    value = [1, [b'a', [None, 'b']], [], b'x' * 2000]
+    assert resp.dump_response(value) == (
+        b'*4\r\n:1\r\n*2\r\n$1\r\na\r\n*2\r\n$-1\r\n$1\r\nb\r\n*0\r\n$2000\r\n' + b'x' * 2000 + b'\r\n'
+    )
+
+
+def test_encoder_reuse():
+    encoder = resp.ReplyEncoder()
+    encoder.write(resp.OK)
+    encoder.write([b'a'])
+    assert encoder.take() == b'+OK\r\n*1\r\n$1\r\na\r\n'
+    encoder.write(1)
+    assert encoder.take() == b':1\r\n'
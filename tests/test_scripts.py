@@ -20,3 +20,59 @@ def test_create_script(redis):
     result = fn(keys=['test1', 'test2'])
     assert result in (b'1', b'2')
     assert redis.dict == {b'test1': {b'1', b'2'} - {result}, b'test2': {b'3'} | {result}}
+
+
+def test_eval(redis):
+    client = redis.ext.client
+    assert client.eval("return redis.call('SET', KEYS[1], ARGV[1])", 1, 'key', 'value') == b'OK'
+    assert client.eval("return {KEYS[1], ARGV[1], ARGV[2]}", 1, 'a', 'b', 'c') == [b'a', b'b', b'c']
+    assert redis.dict == {b'key': b'value'}
+
+
+def test_eval_caches_script(redis):
+    client = redis.ext.client
+    script = 'return ARGV[1]'
+    sha = client.script_load(script)
+    assert client.script_exists(sha, '0' * 40) == [True, False]
+    assert client.evalsha(sha, 0, 'x') == b'x'
+
+    client.script_flush()
+    assert client.script_exists(sha) == [False]
+    with pytest.raises(ResponseError, match='No matching script'):
+        client.evalsha(sha, 0, 'x')
+
+    assert client.eval(script, 0, 'y') == b'y'
+    assert client.script_exists(sha) == [True]
+
+
+def test_reply_conversion(redis):
+    client = redis.ext.client
+    client.set('key', 'value')
+    assert client.eval("return redis.call('GET', 'missing') == false", 0) == 1
+    assert client.eval("return redis.call('SET', 'key', 'other').ok", 0) == b'OK'
+    assert client.eval("return redis.call('INCRBY', 'counter', 2) + 0.5", 0) == 2
+    assert client.eval("return {1, false, 2, nil, 3}", 0) == [1, None, 2]
+    assert client.eval("return redis.status_reply('DONE')", 0) == b'DONE'
+    assert client.eval("return redis.call('SET', 'number', 1.5)", 0) == b'OK'
+    assert client.get('number') == b'1.5'
+
+
+def test_pcall(redis):
+    client = redis.ext.client
+    client.sadd('set', 1)
+    script = "local reply = redis.pcall('GET', 'set'); return reply.err"
+    assert client.eval(script, 0).startswith(b'WRONGTYPE')
+    with pytest.raises(ResponseError, match='WRONGTYPE'):
+        client.eval("return redis.call('GET', 'set')", 0)
+    with pytest.raises(ResponseError, match='My error'):
+        client.eval("return redis.error_reply('My error')", 0)
+
+
+def test_eval_errors(redis):
+    client = redis.ext.client
+    with pytest.raises(ResponseError, match='Error compiling script'):
+        client.eval('return (', 0)
+    with pytest.raises(ResponseError, match='Error running script'):
+        client.eval('return nil + 1', 0)
+    with pytest.raises(ResponseError, match='greater than number of args'):
+        client.eval('return 1', 2, 'key')
@@ -68,4 +68,88 @@ def test_pop_empty(redis):
 def test_scard(redis):
     client = redis.ext.client
     client.sadd('test', 1)
-    assert client.scard('test') == 1
\ No newline at end of file
+    assert client.scard('test') == 1
+
+
+def test_sscan(redis):
+    client = redis.ext.client
+    members = {str(index).encode() for index in range(1000)}
+    client.sadd('test', *members)
+
+    cursor, data = client.sscan('test', count=100)
+    assert cursor != 0
+    assert set(client.sscan_iter('test', count=100)) == members
+    assert set(client.sscan_iter('test', match='1?')) == {str(index).encode() for index in range(10, 20)}
+
+
+def test_sscan_with_deletes(redis):
+    client = redis.ext.client
+    members = [str(index).encode() for index in range(1000)]
+    client.sadd('test', *members)
+    deleted = set(members[::20])
+    kept = set(members) - deleted
+
+    seen = set()
+    cursor, data = client.sscan('test', count=50)
+    seen.update(data)
+    client.srem('test', *deleted)
+    while cursor:
+        cursor, data = client.sscan('test', cursor=cursor, count=50)
+        seen.update(data)
+    assert kept <= seen
+
+
+def test_sscan_empty(redis):
+    client = redis.ext.client
+    assert client.sscan('test') == (0, [])
+
+
+def test_srem(redis):
+    client = redis.ext.client
+    client.sadd('test_key1', 10, 11, 12)
+    assert client.srem('test_key1', 10, 11, 13) == 2
+    assert redis.dict == {b'test_key1': {b'12'}}
+    assert client.srem('test_key1', 12) == 1
+    assert redis.dict == {}
+
+
+def test_smismember(redis):
+    client = redis.ext.client
+    client.sadd('test_key1', 10, 11)
+    assert client.smismember('test_key1', 10, 12, 11) == [1, 0, 1]
+    assert client.smismember('missing', 10) == [0]
+    assert client.sismember('test_key1', 10)
+
+
+def test_intset_encoding(redis):
+    client = redis.ext.client
+    assert client.sadd('ids', 3, 1, -2, 1) == 3
+    assert client.object('encoding', 'ids') == b'intset'
+    assert client.sismember('ids', -2)
+    assert not client.sismember('ids', '01')
+    assert client.smismember('ids', 1, 2, 3) == [1, 0, 1]
+    assert client.srem('ids', 1, 2) == 1
+    assert client.scard('ids') == 2
+    assert redis.dict == {b'ids': {b'3', b'-2'}}
+
+
+def test_intset_conversion(redis):
+    client = redis.ext.client
+    client.sadd('ids', 1, 2)
+    assert client.sadd('ids', 3, '04', 5) == 3
+    assert client.object('encoding', 'ids') == b'hashtable'
+    assert redis.dict == {b'ids': {b'1', b'2', b'3', b'04', b'5'}}
+
+    client.sadd('many', *range(512))
+    assert client.object('encoding', 'many') == b'intset'
+    client.sadd('many', 512)
+    assert client.object('encoding', 'many') == b'hashtable'
+    assert client.scard('many') == 513
+
+
+def test_intset_pop_and_scan(redis):
+    client = redis.ext.client
+    client.sadd('ids', *range(200))
+    members = {client.spop('ids') for _ in range(50)}
+    assert len(members) == 50
+    assert set(client.sscan_iter('ids', count=20)) == {b'%d' % value for value in range(200)} - members
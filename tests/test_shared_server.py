@@ -0,0 +1,73 @@
+import os
+import time
+
+import pytest
+import redis as redis_client
+
+from rediserver.server import run_threaded
+from rediserver.test import local_redis
+
+
+def test_reset_empties_the_server():
+    with local_redis() as redis:
+        client = redis_client.StrictRedis(unix_socket_path=redis.sock)
+        client.set('key', 'value')
+        client.rpush('list', 'a')
+        sha = client.script_load('return 1')
+        instance = redis.instance
+
+        redis.reset()
+        assert redis.dict == {}
+        assert instance.dirty == 0
+        # the pooled connection was closed and is reconnected
+        assert client.script_exists(sha) == [False]
+        assert client.dbsize() == 0
+
+
+def test_reset_keeps_scripts():
+    with local_redis() as redis:
+        client = redis_client.StrictRedis(unix_socket_path=redis.sock)
+        sha = client.script_load('return 1')
+        redis.reset(keep_scripts=True)
+        assert client.evalsha(sha, 0) == 1
+
+
+def test_reset_disconnects_clients():
+    with local_redis() as redis:
+        client = redis_client.StrictRedis(unix_socket_path=redis.sock)
+        watching = client.connection_pool.get_connection('WATCH')
+        watching.send_command('WATCH', 'key')
+        assert watching.read_response() == b'OK'
+        pubsub = client.pubsub()
+        pubsub.subscribe('channel')
+        assert pubsub.get_message(timeout=1)['type'] == 'subscribe'
+        blocking = client.connection_pool.get_connection('BLPOP')
+        blocking.send_command('BLPOP', 'list', 0)
+        while not redis.instance.blocking.waiters:
+            time.sleep(0.01)
+
+        redis.reset()
+        instance = redis.instance
+        assert instance.clients == set()
+        assert instance.watched_keys == {}
+        assert instance.pubsub.channels == {}
+        assert instance.blocking.waiters == {}
+        assert client.publish('channel', 'message') == 0
+
+
+def test_shared_fixture_starts_empty(shared_redis):
+    client = redis_client.StrictRedis(unix_socket_path=shared_redis.sock)
+    assert client.dbsize() == 0
+    client.set('key', 'value')
+
+
+def test_shared_fixture_reuses_the_server(shared_redis, shared_redis_server):
+    assert shared_redis is shared_redis_server
+    client = redis_client.StrictRedis(unix_socket_path=shared_redis.sock)
+    assert client.dbsize() == 0
+
+
+def test_startup_error_is_raised(tmpdir):
+    # the socket can't be bound in a missing directory
+    with pytest.raises(OSError):
+        run_threaded(os.path.join(str(tmpdir), 'missing', 'redis.sock'))
@@ -0,0 +1,110 @@
+import pytest
+
+from rediserver.redis import Redis
+from rediserver.test import DirectRedis
+
+
+def test_dict_is_a_frozen_snapshot(redis):
+    redis.ext.client.set('string', 'value')
+    redis.ext.client.incr('counter')
+    redis.ext.client.rpush('list', 'a', 'b')
+    redis.ext.client.sadd('set', '1', '2')
+    redis.ext.client.hset('hash', 'field', 'value')
+    redis.ext.client.zadd('zset', {'member': 1.5})
+
+    snapshot = redis.dict
+    assert snapshot == {
+        b'string': b'value',
+        b'counter': b'1',
+        b'list': (b'a', b'b'),
+        b'set': {b'1', b'2'},
+        b'hash': {b'field': b'value'},
+        b'zset': {b'member': 1.5},
+    }
+    with pytest.raises(TypeError):
+        snapshot[b'string'] = b'other'
+    with pytest.raises(TypeError):
+        snapshot[b'hash'][b'field'] = b'other'
+
+    redis.ext.client.rpush('list', 'c')
+    redis.ext.client.delete('string')
+    assert snapshot[b'list'] == (b'a', b'b')
+    assert b'string' in snapshot
+    assert redis[b'list'] == (b'a', b'b', b'c')
+    assert b'string' not in redis.dict
+
+
+def test_changes_since_mark(redis):
+    redis.ext.client.mset({'kept': '1', 'modified': '1', 'deleted': '1'})
+    redis.mark()
+    redis.ext.client.set('added', '1')
+    redis.ext.client.incr('modified')
+    redis.ext.client.delete('deleted')
+    # created and deleted again between the marks
+    redis.ext.client.set('temporary', '1')
+    redis.ext.client.delete('temporary')
+    # reads touch nothing
+    redis.ext.client.get('kept')
+
+    changes = redis.changes()
+    assert changes.added == {b'added'}
+    assert changes.modified == {b'modified'}
+    assert changes.deleted == {b'deleted'}
+
+    redis.mark()
+    assert redis.changes() == (set(), set(), set())
+    redis.ext.client.flushall()
+    assert redis.changes().deleted == {b'kept', b'modified', b'added'}
+
+
+def test_writes_changing_nothing(redis):
+    client = redis.ext.client
+    client.set('string', 'value')
+    client.sadd('set', 'a')
+    client.hset('hash', 'field', 'value')
+    redis.mark()
+    dirty = redis.instance.dirty
+
+    assert client.set('string', 'other', nx=True) is None
+    assert client.set('missing', 'value', xx=True) is None
+    assert client.msetnx({'string': 'other', 'new': 'value'}) is False
+    assert client.sadd('set', 'a') == 0
+    assert client.srem('set', 'b') == 0
+    assert client.hsetnx('hash', 'field', 'other') == 0
+    assert client.expire('missing', 10) is False
+    assert client.lpop('missing') is None
+
+    assert redis.changes() == (set(), set(), set())
+    assert redis.instance.dirty == dirty
+    assert client.sadd('set', 'b') == 1
+    assert redis.changes().modified == {b'set'}
+
+
+def test_expired_keys_are_deleted_changes(redis):
+    redis.ext.client.set('key', 'value', px=50)
+    redis.mark()
+    while redis.ext.client.get('key') is not None:
+        pass
+    assert redis.changes().deleted == {b'key'}
+
+
+def test_direct_client_changes():
+    client = DirectRedis()
+    client.set('key', 'value')
+    snapshot = client.dict
+    client.mark()
+    client.rpush('list', 'a')
+    client.set('key', 'other')
+    assert client.changes() == ({b'list'}, {b'key'}, set())
+    assert snapshot == {b'key': b'value'}
+    assert client.dict == {b'key': b'other', b'list': (b'a',)}
+
+
+def test_untrack_changes():
+    redis = Redis()
+    tracker = redis.track_changes()
+    redis.lookup_command(b'SET')(b'key', b'value')
+    redis.untrack_changes(tracker)
+    redis.lookup_command(b'SET')(b'other', b'value')
+    assert tracker.changes(redis.keys).added == {b'key'}
+    assert redis.trackers == []
@@ -0,0 +1,129 @@
+import random
+
+import pytest
+from redis.exceptions import ResponseError
+
+from rediserver.zset import SortedSet
+
+
+def test_add(redis):
+    client = redis.ext.client
+    assert client.zadd('zset', {'a': 1, 'b': 2.5}) == 2
+    assert client.zadd('zset', {'a': 3, 'c': 0}) == 1
+    assert redis.dict == {b'zset': {b'a': 3, b'b': 2.5, b'c': 0}}
+    assert client.zcard('zset') == 3
+    assert client.type('zset') == b'zset'
+
+
+def test_add_options(redis):
+    client = redis.ext.client
+    client.zadd('zset', {'a': 1, 'b': 2})
+    assert client.zadd('zset', {'a': 5, 'c': 3}, nx=True) == 1
+    assert client.zadd('zset', {'a': 5, 'd': 3}, xx=True, ch=True) == 1
+    assert client.zadd('zset', {'a': 4, 'b': 3}, gt=True, ch=True) == 1
+    assert client.zadd('zset', {'a': 4, 'b': 1}, lt=True, ch=True) == 2
+    assert client.zadd('zset', {'a': 2}, incr=True) == 6.0
+    assert client.zadd('zset', {'a': 1}, nx=True, incr=True) is None
+    assert redis.dict == {b'zset': {b'a': 6, b'b': 1, b'c': 3}}
+
+    with pytest.raises(ResponseError, match='not compatible'):
+        client.execute_command('ZADD', 'zset', 'NX', 'XX', 1, 'a')
+    with pytest.raises(ResponseError, match='not a valid float'):
+        client.execute_command('ZADD', 'zset', 'nan', 'a')
+
+
+def test_incrby_score(redis):
+    client = redis.ext.client
+    assert client.zincrby('zset', 1.5, 'a') == 1.5
+    assert client.zincrby('zset', 2, 'a') == 3.5
+    assert client.zscore('zset', 'a') == 3.5
+    assert client.zscore('zset', 'missing') is None
+
+
+def test_rank(redis):
+    client = redis.ext.client
+    client.zadd('zset', {'a': 1, 'b': 2, 'c': 2, 'd': 3})
+    assert client.zrank('zset', 'c') == 2
+    assert client.zrevrank('zset', 'c') == 1
+    assert client.zrank('zset', 'missing') is None
+    assert client.execute_command('ZRANK', 'zset', 'd', 'WITHSCORE') == [3, b'3']
+
+
+def test_range(redis):
+    client = redis.ext.client
+    client.zadd('zset', {'a': 1, 'b': 2, 'c': 3, 'd': 4})
+    assert client.zrange('zset', 0, -1) == [b'a', b'b', b'c', b'd']
+    assert client.zrange('zset', 1, 2, withscores=True) == [(b'b', 2.0), (b'c', 3.0)]
+    assert client.zrange('zset', 0, 1, desc=True) == [b'd', b'c']
+    assert client.zrange('zset', 2, '(4', byscore=True) == [b'b', b'c']
+    assert client.zrange('zset', '+inf', '-inf', byscore=True, desc=True, offset=1, num=2) == [b'c', b'b']
+    assert client.zcount('zset', '(1', 3) == 2
+
+
+def test_range_by_lex(redis):
+    client = redis.ext.client
+    client.zadd('zset', {'a': 0, 'b': 0, 'c': 0, 'd': 0})
+    assert client.zrange('zset', '[b', '(d', bylex=True) == [b'b', b'c']
+    assert client.zrange('zset', '-', '+', bylex=True, offset=1, num=2) == [b'b', b'c']
+    assert client.zrange('zset', '+', '(b', bylex=True, desc=True) == [b'd', b'c']
+
+    with pytest.raises(ResponseError, match='not valid string range'):
+        client.zrange('zset', 'a', 'b', bylex=True)
+
+
+def test_remove(redis):
+    client = redis.ext.client
+    client.zadd('zset', {'a': 1, 'b': 2, 'c': 3, 'd': 4})
+    assert client.zrem('zset', 'a', 'missing') == 1
+    assert client.zremrangebyscore('zset', 2, '(4') == 2
+    assert redis.dict == {b'zset': {b'd': 4}}
+    assert client.zrem('zset', 'd') == 1
+    assert redis.dict == {}
+
+
+def test_pop(redis):
+    client = redis.ext.client
+    client.zadd('zset', {'a': 1, 'b': 2, 'c': 3, 'd': 4})
+    assert client.zpopmin('zset') == [(b'a', 1.0)]
+    assert client.zpopmax('zset', 2) == [(b'd', 4.0), (b'c', 3.0)]
+    assert client.zpopmin('zset', 5) == [(b'b', 2.0)]
+    assert redis.dict == {}
+
+
+def test_wrongtype(redis):
+    client = redis.ext.client
+    client.set('key', 'value')
+    with pytest.raises(ResponseError, match='WRONGTYPE'):
+        client.zadd('key', {'a': 1})
+
+
+def test_encoding_conversion(redis):
+    client = redis.ext.client
+    client.zadd('zset', {'member:%d' % index: index for index in range(100)})
+    assert redis.instance.keys[b'zset'].encoding == b'listpack'
+    client.zadd('zset', {'member:%d' % index: index for index in range(100, 200)})
+    assert redis.instance.keys[b'zset'].encoding == b'skiplist'
+    assert client.zrange('zset', 150, 151) == [b'member:150', b'member:151']
+    assert client.zrank('zset', 'member:199') == 199
+
+
+@pytest.mark.parametrize('max_entries', [0, 128])
+def test_sorted_set_matches_sorted_list(max_entries):
+    rng = random.Random(max_entries)
+    zset = SortedSet(max_listpack_entries=max_entries)
+    scores = {}
+    for _ in range(2000):
+        member = b'%d' % rng.randrange(300)
+        if rng.random() < 0.3:
+            assert zset.remove(member) == (scores.pop(member, None) is not None)
+        else:
+            scores[member] = float(rng.randrange(50))
+            zset.add(member, scores[member])
+
+    expected = sorted(scores.items(), key=lambda item: (item[1], item[0]))
+    assert zset.items() == expected
+    assert zset.slice(10, 20) == expected[10:20]
+    for rank, (member, score) in enumerate(expected):
+        assert zset.rank(member) == rank
+    assert zset.score_rank(10.0, False) == sum(1 for _, score in expected if score < 10)
+    assert zset.score_rank(10.0, True) == sum(1 for _, score in expected if score <= 10)
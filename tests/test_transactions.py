@@ -1,6 +1,12 @@
+import time
+import socket
+
 import pytest
+import redis as redis_client
 from redis.exceptions import WatchError
 
+from rediserver.test import local_redis
+
 
 def test_ok(redis):
     client = redis.ext.client
@@ -25,6 +31,28 @@ def test_ok_lowlevel(redis):
     assert redis.dict == {b'test': b'1'}
 
 
+def send(redis, data, expected):
+    with socket.socket(socket.AF_UNIX) as connection:
+        connection.connect(redis.sock)
+        connection.sendall(data)
+        received = b''
+        while len(received) < len(expected):
+            received += connection.recv(4096)
+    assert received == expected
+
+
+def test_lowercase_commands(redis):
+    send(redis, b'watch test\r\nmulti\r\nset test 1\r\nexec\r\nunwatch\r\n',
+         b'+OK\r\n+OK\r\n+QUEUED\r\n*1\r\n+OK\r\n+OK\r\n')
+    assert redis.dict == {b'test': b'1'}
+
+
+def test_discard(redis):
+    send(redis, b'MULTI\r\nSET test 1\r\ndiscard\r\nDISCARD\r\nEXEC\r\n',
+         b'+OK\r\n+QUEUED\r\n+OK\r\n-ERR DISCARD without MULTI\r\n-ERR EXEC without MULTI\r\n')
+    assert redis.dict == {}
+
+
 def test_ok_response(redis):
     client = redis.ext.client
     client.sadd('test', 1, 2)
@@ -58,3 +86,89 @@ def test_watch(redis):
         pipeline.execute()
 
     assert redis.dict == {b'watched': b'2'}
+
+
+def test_pipeline_without_transaction(redis):
+    client = redis.ext.client
+
+    pipeline = client.pipeline(transaction=False)
+    for index in range(3000):
+        pipeline.incrby('counter', 1)
+        pipeline.sadd('test', index)
+    result = pipeline.execute()
+
+    assert result[-2:] == [3000, 1]
+    assert client.scard('test') == 3000
+    assert client.get('counter') == b'3000'
+
+
+def test_pipeline_batch_limit():
+    with local_redis(pipeline_max_batch=2) as redis:
+        client = redis_client.StrictRedis(unix_socket_path=redis.sock)
+        pipeline = client.pipeline(transaction=False)
+        for _ in range(5):
+            pipeline.incrby('counter', 2)
+        assert pipeline.execute() == [2, 4, 6, 8, 10]
+
+
+def test_watch_multiple_keys(redis):
+    client = redis.ext.client
+    client2 = redis.ext.new_client()
+
+    pipeline = client.pipeline()
+    assert pipeline.watch('watched1', 'watched2')
+    pipeline.multi()
+    pipeline.set('key', 1)
+
+    assert client2.set('watched2', 2)
+
+    with pytest.raises(WatchError, match='Watched variable changed'):
+        pipeline.execute()
+
+    assert redis.dict == {b'watched2': b'2'}
+
+
+def test_watch_other_key(redis):
+    client = redis.ext.client
+    client2 = redis.ext.new_client()
+
+    pipeline = client.pipeline()
+    assert pipeline.watch('watched')
+    pipeline.multi()
+    pipeline.set('key', 1)
+
+    assert client2.set('other', 2)
+
+    assert pipeline.execute() == [True]
+    assert redis.dict == {b'key': b'1', b'other': b'2'}
+
+
+def test_unwatch(redis):
+    client = redis.ext.client
+    client2 = redis.ext.new_client()
+
+    pipeline = client.pipeline()
+    assert pipeline.watch('watched')
+    assert pipeline.unwatch()
+    pipeline.multi()
+    pipeline.set('key', 1)
+
+    assert client2.set('watched', 2)
+
+    assert pipeline.execute() == [True]
+
+
+def test_watch_released_on_disconnect():
+    with local_redis() as redis:
+        client = redis_client.StrictRedis(unix_socket_path=redis.sock)
+        connection = client.connection_pool.get_connection('WATCH')
+        connection.send_command('WATCH', 'watched')
+        assert connection.read_response() == b'OK'
+        assert redis.instance.watched_keys
+        connection.disconnect()
+
+        for _ in range(100):
+            if not redis.instance.watched_keys:
+                break
+            time.sleep(0.01)
+        assert redis.instance.watched_keys == {}